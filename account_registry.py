@@ -0,0 +1,202 @@
+import json
+import os
+import threading
+import time
+import bankfrick_client
+import telemetry
+
+# Account registry: one place that knows every account's name, number, currency and legal entity,
+# loaded once per run from accounts.json and/or the /accounts response and cached on disk between runs
+ACCOUNTS_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "accounts.json")
+REGISTRY_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "account_registry_cache.json")
+REGISTRY_CACHE_MAX_AGE = 24 * 60 * 60  # Seconds before the cached /accounts response is fetched again
+UNKNOWN_NAME = "Unknown"
+LEGAL_ENTITIES = ("A/S", "Limited")  # Recognised from the account name when accounts.json doesn't say
+
+_registry = None
+_registry_lock = threading.Lock()
+
+logger = telemetry.get_logger(__name__)
+
+def normalize_number(number):
+    """
+    Strip spaces and case from an account number or IBAN so lookups don't depend on formatting.
+    """
+    return "".join(str(number).split()).upper() if number else ""
+
+def entity_from_name(name):
+    """
+    Work out the legal entity from an account name, or "" if it doesn't say.
+    """
+    for entity in LEGAL_ENTITIES:
+        if entity in (name or ""):
+            return entity
+    return ""
+
+class AccountRegistry:
+    """
+    Accounts indexed by ID, account number / IBAN, currency and legal entity for O(1) lookups.
+    Each account is a dict with at least "account", "name", "currency" and "legal_entity";
+    accounts set up for posting also carry "bank_account" and "code".
+    """
+    def __init__(self, accounts=()):
+        self.by_id = {}
+        self.by_number = {}
+        self.by_name = {}
+        self.by_currency = {}
+        self.by_entity = {}
+        self.names_by_number = {}  # Account ID / number / IBAN -> name, handy as a plain mapping for CSV rows
+        for account in accounts:
+            self.add(account)
+
+    def add(self, account):
+        """
+        Add or update an account and refresh its index entries.
+        """
+        account_id = str(account["account"])
+        previous = self.by_id.get(account_id)
+        merged = dict(previous or {}, **{key: value for key, value in account.items() if value not in (None, "")})
+        merged["account"] = account_id
+        merged.setdefault("name", merged.get("customer") or UNKNOWN_NAME)
+        merged["legal_entity"] = account.get("legal_entity") or entity_from_name(merged["name"]) or (previous or {}).get("legal_entity", "")
+        self.by_id[account_id] = merged
+
+        if previous:
+            # Take the old entry out of the secondary indexes before adding the updated one
+            self.by_currency[previous.get("currency") or ""].remove(previous)
+            self.by_entity[previous["legal_entity"]].remove(previous)
+            if self.by_name.get(previous["name"]) is previous:
+                del self.by_name[previous["name"]]
+        self.by_currency.setdefault(merged.get("currency") or "", []).append(merged)
+        self.by_entity.setdefault(merged["legal_entity"], []).append(merged)
+        self.by_name[merged["name"]] = merged
+        for number in (account_id, merged.get("accountNumber"), merged.get("iban"), merged.get("bank_account")):
+            if number:
+                self.by_number[normalize_number(number)] = merged
+                self.names_by_number[number] = merged["name"]
+                self.names_by_number[normalize_number(number)] = merged["name"]
+
+    def get(self, account_id):
+        return self.by_id.get(str(account_id))
+
+    def lookup_number(self, number):
+        """
+        Find an account by ID, account number or IBAN.
+        """
+        return self.by_number.get(normalize_number(number))
+
+    def name_of(self, account_id_or_number, default=UNKNOWN_NAME):
+        account = self.by_id.get(str(account_id_or_number)) or self.lookup_number(account_id_or_number)
+        return account["name"] if account else default
+
+    def entity_of(self, account_id_or_name):
+        """
+        Legal entity of an account given its ID or its name.
+        """
+        account = self.by_id.get(str(account_id_or_name)) or self.by_name.get(account_id_or_name)
+        return account["legal_entity"] if account else entity_from_name(account_id_or_name)
+
+    def accounts_in_currency(self, currency):
+        return list(self.by_currency.get(currency, []))
+
+    def accounts_for_entity(self, entity):
+        return list(self.by_entity.get(entity, []))
+
+    def postable_accounts(self):
+        """
+        Accounts with the Iplicit bank account and code needed to post their transactions.
+        """
+        return [account for account in self.by_id.values() if account.get("bank_account") and account.get("code")]
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def __iter__(self):
+        return iter(self.by_id.values())
+
+def load_config(path=None):
+    """
+    Read accounts.json, which is either a list of account dicts or a dict keyed by account ID.
+    """
+    path = path or ACCOUNTS_CONFIG_PATH
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as config_file:
+        config = json.load(config_file)
+    if isinstance(config, dict):
+        config = config.get("accounts", config)
+    if isinstance(config, dict):
+        return [dict(details, account=account_id) for account_id, details in config.items()]
+    return list(config)
+
+def load_cached_accounts(path=None, max_age=REGISTRY_CACHE_MAX_AGE):
+    """
+    Return the /accounts response saved by an earlier run, or None if there isn't a fresh one.
+    """
+    path = path or REGISTRY_CACHE_PATH
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as cache_file:
+            cache = json.load(cache_file)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable account registry cache {path}: {e}")
+        return None
+    if time.time() - cache.get("saved_at", 0) > max_age:
+        return None
+    return cache.get("accounts")
+
+def save_cached_accounts(accounts, path=None):
+    path = path or REGISTRY_CACHE_PATH
+    if not path:
+        return
+    try:
+        with open(path, "w", encoding="utf-8") as cache_file:
+            json.dump({"saved_at": time.time(), "accounts": accounts}, cache_file)
+    except OSError as e:
+        logger.warning(f"Could not write account registry cache {path}: {e}")
+
+def build_registry(api_accounts, config_accounts):
+    """
+    Combine the /accounts response with accounts.json, letting the config override names and add posting details.
+    """
+    registry = AccountRegistry()
+    for account in api_accounts or []:
+        if account.get("account"):
+            registry.add(account)
+    for account in config_accounts:
+        if account.get("account"):
+            registry.add(account)
+    return registry
+
+def get_registry(jwt_token=None, refresh=False):
+    """
+    Return the account registry, loading it the first time it's needed in this run.
+    With a JWT token the /accounts list is fetched when there's no fresh on-disk copy.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is not None and not refresh:
+            return _registry
+
+        api_accounts = None if refresh else load_cached_accounts()
+        if api_accounts is None and jwt_token:
+            api_accounts = bankfrick_client.fetch_accounts(jwt_token)
+            if api_accounts is not None:
+                save_cached_accounts(api_accounts)
+        _registry = build_registry(api_accounts, load_config())
+        return _registry
+
+def set_registry(registry):
+    """
+    Replace the registry for this run, e.g. with one built in a test or benchmark.
+    """
+    global _registry
+    with _registry_lock:
+        _registry = registry
+
+def clear_registry():
+    """
+    Forget the loaded registry so the next get_registry() loads it again.
+    """
+    set_registry(None)
@@ -0,0 +1,248 @@
+import logging
+import threading
+import requests
+import http_client
+import bankfrick_connect
+import fast_json
+import response_cache
+import telemetry
+from transaction_record import TransactionRecord, normalize_all
+
+# One place for every Bank Frick read, with an in-run cache so several jobs in one process share fetches
+ACCOUNTS_ENDPOINT = "/accounts"
+TRANSACTIONS_ENDPOINT = "/transactions"
+PAGE_SIZE = 500  # Transactions requested per page when the API pages its results
+ARCHIVE_TRANSACTIONS = False  # Also append everything fetched to the columnar archive (needs pandas + pyarrow)
+
+_accounts_cache = None
+_transactions_cache = {}  # account_id -> {(start_date, end_date): list of TransactionRecords}
+_cache_lock = threading.Lock()
+_key_locks = {}  # One lock per cache key so two threads never fetch the same thing twice
+
+logger = telemetry.get_logger(__name__)
+
+class FetchError(Exception):
+    """
+    Raised when Bank Frick data couldn't be fetched.
+    failed_windows lists the (account_id, start_date, end_date) windows that are missing.
+    """
+    def __init__(self, message, failed_windows=()):
+        super().__init__(message)
+        self.failed_windows = list(failed_windows)
+
+def auth_headers(jwt_token):
+    """
+    Headers needed on every authenticated Bank Frick request.
+    """
+    return {
+        "Authorization": f"Bearer {jwt_token}",
+        "Accept": "application/json",
+    }
+
+def fetch_accounts(jwt_token, use_cache=True):
+    """
+    Fetch the list of accounts available from the API, only calling it once per run
+    and not at all while the response cache holds a valid copy. Returns None if the list couldn't be fetched.
+    """
+    global _accounts_cache
+    if use_cache and _accounts_cache is not None:
+        return _accounts_cache
+
+    if use_cache or response_cache.REPLAY:
+        accounts = response_cache.get_accounts(allow_expired=response_cache.REPLAY)
+        if accounts is not None:
+            _accounts_cache = accounts
+            return accounts
+    if response_cache.REPLAY:
+        logger.error("No cached account list to replay from.")
+        return None
+
+    logger.info("Fetching account list...")
+    with telemetry.stage("accounts"):
+        response = http_client.get(f"{bankfrick_connect.BASE_URL}{ACCOUNTS_ENDPOINT}", headers=auth_headers(jwt_token))
+    if response.status_code != 200:
+        logger.error(f"Failed to fetch accounts: {response.status_code}")
+        logger.debug(f"Response body: {response.text}")
+        return None
+
+    accounts = fast_json.decode_response(response).get("accounts", [])
+    _accounts_cache = accounts
+    response_cache.put_accounts(accounts)
+    return accounts
+
+def request_transactions(jwt_token, account_id, start_date, end_date, page_size=PAGE_SIZE):
+    """
+    Fetch every transaction for one account and date range, from the response cache if it covers the range
+    and otherwise from the API, following its paging if it says there are more results. The transactions are parsed
+    into TransactionRecords here, once, for everything downstream. Raises FetchError on failure,
+    or in replay mode when the cache doesn't cover the range.
+    """
+    cached = response_cache.get_transactions(account_id, start_date, end_date, allow_expired=response_cache.REPLAY)
+    if cached is not None:
+        telemetry.metrics.increment("response_cache_hits")
+        return normalize_all(cached)
+    if response_cache.REPLAY:
+        raise FetchError(f"Transactions for account {account_id} from {start_date} to {end_date} aren't in the response cache",
+                         [(account_id, start_date, end_date)])
+
+    url = f"{bankfrick_connect.BASE_URL}{TRANSACTIONS_ENDPOINT}"
+    headers = auth_headers(jwt_token)
+
+    transactions = []
+    first_position = 0
+    with telemetry.stage("fetch"):
+        while True:
+            params = {"accountId": account_id, "fromDate": start_date, "toDate": end_date,
+                      "firstPosition": first_position, "maxResults": page_size}
+            response = http_client.get(url, headers=headers, params=params)
+            if response.status_code != 200:
+                raise FetchError(f"Failed to fetch transactions for account {account_id} from {start_date} to {end_date}: {response.status_code} - {response.text}",
+                                 [(account_id, start_date, end_date)])
+
+            response_json = fast_json.decode_response(response)
+            if isinstance(response_json, list):
+                transactions.extend(response_json)  # No paging information, so this is everything
+                break
+            if not isinstance(response_json, dict):
+                raise FetchError(f"Unexpected response format: {response_json}", [(account_id, start_date, end_date)])
+
+            page = response_json.get("transactions", [])
+            transactions.extend(page)
+            if not response_json.get("moreResults") or not page:
+                break
+            first_position += len(page)
+    telemetry.metrics.increment("transactions_fetched", len(transactions))
+    response_cache.put_transactions(account_id, start_date, end_date, transactions)
+
+    records = normalize_all(transactions)
+    if ARCHIVE_TRANSACTIONS:
+        archive_transactions(account_id, records)
+    return records
+
+def probe_transactions(jwt_token, account_id, start_date, end_date):
+    """
+    Ask the API for at most one transaction in the range, to learn whether there are any without downloading them.
+    Returns (count, valuta of the transaction sent back or None), or None if the request failed.
+    count is the API's resultSetSize, or without one a lower bound that is still 0 only for an empty range.
+    Never cached, since the answer has to be current.
+    """
+    params = {"accountId": account_id, "fromDate": start_date, "toDate": end_date, "firstPosition": 0, "maxResults": 1}
+    response = http_client.get(f"{bankfrick_connect.BASE_URL}{TRANSACTIONS_ENDPOINT}", headers=auth_headers(jwt_token), params=params)
+    if response.status_code != 200:
+        logger.warning(f"Could not check account {account_id} for new transactions: {response.status_code}")
+        return None
+
+    response_json = fast_json.decode_response(response)
+    page = response_json if isinstance(response_json, list) else response_json.get("transactions", [])
+    count = response_json.get("resultSetSize") if isinstance(response_json, dict) else None
+    if count is None:
+        count = len(page) + (1 if isinstance(response_json, dict) and response_json.get("moreResults") else 0)
+    return count, (page[0].get("valuta") if page else None)
+
+def iter_transactions(jwt_token, account_id, start_date, end_date, page_size=PAGE_SIZE):
+    """
+    Yield every transaction for one account and date range as a TransactionRecord straight from the API as each one is parsed,
+    streaming the responses so neither a whole page's body nor its full object tree is held at once.
+    Raises FetchError on failure. Nothing is cached or archived, and in replay mode the response cache is read instead.
+    """
+    if response_cache.REPLAY:
+        yield from request_transactions(jwt_token, account_id, start_date, end_date, page_size)
+        return
+
+    url = f"{bankfrick_connect.BASE_URL}{TRANSACTIONS_ENDPOINT}"
+    headers = auth_headers(jwt_token)
+
+    first_position = 0
+    while True:
+        params = {"accountId": account_id, "fromDate": start_date, "toDate": end_date,
+                  "firstPosition": first_position, "maxResults": page_size}
+        response = http_client.get(url, headers=headers, params=params, stream=True)
+        with response:
+            if response.status_code != 200:
+                raise FetchError(f"Failed to fetch transactions for account {account_id} from {start_date} to {end_date}: {response.status_code} - {response.text}",
+                                 [(account_id, start_date, end_date)])
+
+            meta = {}
+            page_count = 0
+            try:
+                for transaction in fast_json.iter_json_array(response, "transactions", meta):
+                    page_count += 1
+                    yield TransactionRecord(transaction)
+            except (ValueError, requests.exceptions.RequestException) as e:
+                # The connection can drop or the body turn out malformed part way through a page
+                raise FetchError(f"Failed to read transactions for account {account_id} from {start_date} to {end_date}: {e}",
+                                 [(account_id, start_date, end_date)])
+
+        if not meta.get("moreResults") or not page_count:
+            return  # A plain list carries no paging information, so it is everything
+        first_position += page_count
+
+def archive_transactions(account_id, transactions):
+    """
+    Append fetched transactions to the columnar archive, without letting an archive problem fail the fetch.
+    """
+    import transaction_archive  # Imported here so pandas is only loaded when archiving is switched on
+    try:
+        transaction_archive.append_to_archive(account_id, transactions)
+    except Exception as e:
+        logger.warning(f"Could not archive transactions for account {account_id}: {e}")
+
+def get_cached_transactions(account_id, start_date, end_date):
+    """
+    Return cached transactions for the range if this run has already fetched it (or a range covering it), else None.
+    """
+    with _cache_lock:
+        ranges = _transactions_cache.get(account_id)
+        if not ranges:
+            return None
+        exact = ranges.get((start_date, end_date))
+        if exact is not None:
+            return exact
+        for (cached_start, cached_end), transactions in ranges.items():
+            if cached_start <= start_date and cached_end >= end_date:
+                # A wider range was fetched earlier, so cut this one out of it by valuta date
+                return [record for record in transactions if start_date <= record.day <= end_date]
+    return None
+
+def fetch_transactions(jwt_token, account_id, start_date, end_date, use_cache=True):
+    """
+    Fetch transactions for a specific account and date range as TransactionRecords, reusing anything already fetched this run.
+    Returns None if they couldn't be fetched.
+    """
+    if use_cache:
+        cached = get_cached_transactions(account_id, start_date, end_date)
+        if cached is not None:
+            return cached
+
+    key = (account_id, start_date, end_date)
+    with _cache_lock:
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+
+    with key_lock:
+        if use_cache:
+            cached = get_cached_transactions(account_id, start_date, end_date)  # Another thread may have just fetched it
+            if cached is not None:
+                return cached
+
+        logger.info(f"Fetching transactions for account {account_id} from {start_date} to {end_date}...")
+        try:
+            transactions = request_transactions(jwt_token, account_id, start_date, end_date)
+        except FetchError as e:
+            logger.error(str(e))
+            return None
+        telemetry.log_event(logger, logging.INFO, f"Transactions fetched successfully for account {account_id}.",
+                            event="fetched", account_id=account_id, start_date=start_date, end_date=end_date, transactions=len(transactions))
+
+        with _cache_lock:
+            _transactions_cache.setdefault(account_id, {})[(start_date, end_date)] = transactions
+        return transactions
+
+def clear_cache():
+    """
+    Forget everything fetched so far, e.g. between scheduled runs.
+    """
+    global _accounts_cache
+    with _cache_lock:
+        _accounts_cache = None
+        _transactions_cache.clear()
+        _key_locks.clear()
@@ -1,6 +1,13 @@
 import requests
+import http_client
+import response_cache
+import telemetry
 import json
 import base64
+import hashlib
+import os
+import threading
+import time
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.primitives import serialization
@@ -11,17 +18,39 @@ AUTH_ENDPOINT = "/authorize" # Bank Frick Endpoint to obtain the JWT token
 API_KEY = "Placheolder"  # Will make this connect to a 2nd file to make it privat
 PRIVATE_KEY_PATH = "Placheolder"  # Path to private key
 
-def generate_signature(payload: str, private_key_path: str) -> str:
+# Token caching settings
+TOKEN_CACHE_PATH = None  # Set to a file path to keep the JWT between script runs, None keeps it in memory only
+TOKEN_REFRESH_MARGIN = 60  # Seconds before expiry that a token is treated as expired and renewed
+TOKEN_DEFAULT_LIFETIME = 15 * 60  # Lifetime assumed when the token doesn't carry an "exp" claim
+REPLAY_TOKEN = "replay"  # Stands in for the JWT in replay mode, where nothing is sent to Bank Frick
+
+_private_keys = {}  # Loaded private keys keyed by path so the PEM is only parsed once
+_token_cache = {}  # API key -> {"token": ..., "expires_at": ...}
+_token_lock = threading.Lock()
+
+logger = telemetry.get_logger(__name__)
+
+def load_private_key(private_key_path: str):
     """
-    Generate a signature for the given payload using my private key.
+    Load my private key from disk, only reading and parsing the PEM file the first time.
     """
-    try:
-        # Load up my private key
+    private_key = _private_keys.get(private_key_path)
+    if private_key is None:
         with open(private_key_path, "rb") as key_file:
             private_key = serialization.load_pem_private_key(
                 key_file.read(),
                 password=None  # Should really make it have a password for securty but do that in future
             )
+        _private_keys[private_key_path] = private_key
+    return private_key
+
+def generate_signature(payload: str, private_key_path: str) -> str:
+    """
+    Generate a signature for the given payload using my private key.
+    """
+    try:
+        # Load up my private key
+        private_key = load_private_key(private_key_path)
 
         # Generate the RSA signature
         signature = private_key.sign(
@@ -34,10 +63,84 @@ def generate_signature(payload: str, private_key_path: str) -> str:
         return base64.b64encode(signature).decode("utf-8")
     except Exception as e:
         # Log the error and exit if the signing process fails
-        print(f"Error during signature generation: {e}")
+        logger.error(f"Error during signature generation: {e}")
         exit(1)
 
-def get_jwt_token():
+def get_token_expiry(token: str) -> float:
+    """
+    Work out when a JWT expires from its "exp" claim, falling back to the default lifetime.
+    """
+    try:
+        claims_segment = token.split(".")[1]
+        claims_segment += "=" * (-len(claims_segment) % 4)  # JWTs strip the base64 padding
+        claims = json.loads(base64.urlsafe_b64decode(claims_segment))
+        return float(claims["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return time.time() + TOKEN_DEFAULT_LIFETIME
+
+def _cache_key(api_key: str) -> str:
+    # Hash the API key so it never gets written to disk in plain text
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+def _is_fresh(entry) -> bool:
+    return bool(entry) and entry.get("expires_at", 0) - TOKEN_REFRESH_MARGIN > time.time()
+
+def _load_cached_token(api_key: str):
+    """
+    Look for a still valid token in memory first and then in the on-disk cache if one is configured.
+    """
+    key = _cache_key(api_key)
+    entry = _token_cache.get(key)
+    if _is_fresh(entry):
+        return entry["token"]
+
+    if TOKEN_CACHE_PATH and os.path.exists(TOKEN_CACHE_PATH):
+        try:
+            with open(TOKEN_CACHE_PATH, "r", encoding="utf-8") as cache_file:
+                entry = json.load(cache_file).get(key)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable token cache {TOKEN_CACHE_PATH}: {e}")
+            entry = None
+        if _is_fresh(entry):
+            _token_cache[key] = entry
+            return entry["token"]
+    return None
+
+def _store_cached_token(api_key: str, token: str):
+    """
+    Remember a new token in memory and, if configured, in the on-disk cache.
+    """
+    key = _cache_key(api_key)
+    entry = {"token": token, "expires_at": get_token_expiry(token)}
+    _token_cache[key] = entry
+
+    if TOKEN_CACHE_PATH:
+        cache = {}
+        if os.path.exists(TOKEN_CACHE_PATH):
+            try:
+                with open(TOKEN_CACHE_PATH, "r", encoding="utf-8") as cache_file:
+                    cache = json.load(cache_file)
+            except (OSError, ValueError):
+                cache = {}
+        cache[key] = entry
+        try:
+            # Only the owner should be able to read the token file
+            fd = os.open(TOKEN_CACHE_PATH, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as cache_file:
+                json.dump(cache, cache_file)
+        except OSError as e:
+            logger.warning(f"Could not write token cache {TOKEN_CACHE_PATH}: {e}")
+
+def clear_token_cache():
+    """
+    Forget every cached token, both in memory and on disk.
+    """
+    with _token_lock:
+        _token_cache.clear()
+        if TOKEN_CACHE_PATH and os.path.exists(TOKEN_CACHE_PATH):
+            os.remove(TOKEN_CACHE_PATH)
+
+def request_jwt_token():
     """
     Request a JWT token from the server using the API-Key and RSA signature from my private key.
     """
@@ -56,20 +159,55 @@ def get_jwt_token():
     headers["Signature"] = signature
     headers["algorithm"] = "rsa-sha512"
 
-    print(f"Payload JSON: {payload_json}")
-    print("Requesting JWT token...")
+    logger.debug(f"Payload JSON: {payload_json}")
+    logger.info("Requesting JWT token...")
     try:
-        response = requests.post(url, headers=headers, data=payload_json)
+        with telemetry.stage("auth"):
+            response = http_client.post(url, headers=headers, data=payload_json)
 
         if response.status_code == 200: # working
-            print("JWT token received successfully.")
+            logger.info("JWT token received successfully.")
             return response.json().get("token")
         else: # problem
-            print(f"Failed to fetch JWT token: {response.status_code} - {response.text}")
+            logger.error(f"Failed to fetch JWT token: {response.status_code}")
+            logger.debug(f"Response body: {response.text}")
             return None
     except requests.exceptions.RequestException as e:
-        print(f"Request failed: {e}")
-        exit(1)
+        # http_client has already retried, so report it and let the caller decide rather than killing the process
+        logger.error(f"Request failed: {e}")
+        return None
+
+def get_jwt_token(force_refresh=False):
+    """
+    Return a valid JWT token, reusing the cached one until shortly before it expires.
+    """
+    if response_cache.REPLAY:
+        return REPLAY_TOKEN
+    with _token_lock:  # Stops several worker threads all re-authorizing at the same time
+        if not force_refresh:
+            token = _load_cached_token(API_KEY)
+            if token:
+                return token
+
+        token = request_jwt_token()
+        if token:
+            _store_cached_token(API_KEY, token)
+        return token
+
+def refresh_jwt_token(stale_token):
+    """
+    Swap a token the API rejected for a fresh one, only re-authorizing if nobody else already has.
+    """
+    with _token_lock:
+        entry = _token_cache.get(_cache_key(API_KEY))
+        if entry and entry["token"] != stale_token and _is_fresh(entry):
+            return entry["token"]
+        _token_cache.pop(_cache_key(API_KEY), None)
+    logger.info("JWT token was rejected, re-authorizing...")
+    return get_jwt_token(force_refresh=True)
+
+# Let the HTTP layer re-authorize transparently when Bank Frick answers 401
+http_client.register_token_refresher(BASE_URL, refresh_jwt_token)
 
 if __name__ == "__main__":
     # Main entry point to request and display the JWT token
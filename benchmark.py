@@ -0,0 +1,240 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from urllib.parse import urlsplit
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+import account_registry
+import bankfrick_client
+import bankfrick_connect
+import fetch_daily
+import fetch_daily_summary
+import fetch_post_transactions
+import fetch_transactions
+import http_client
+import iplicit_connector
+import mock_server
+import response_cache
+import sync_state
+import telemetry
+
+# Load benchmark: runs each entry point against the local mock APIs and reports throughput, latency and memory
+ENTRY_POINTS = {
+    "fetch_daily": fetch_daily.main,
+    "fetch_daily_summary": fetch_daily_summary.main,
+    "fetch_transactions": fetch_transactions.main,
+    "fetch_post_transactions": fetch_post_transactions.main,
+}
+REGRESSION_TOLERANCE = 0.2  # Fail if throughput drops (or p99 / memory grow) by more than this fraction against the baseline
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of a list of numbers, 0 for an empty list.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+def write_private_key(path):
+    """
+    Generate a throwaway RSA key for signing /authorize requests to the mock.
+    """
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    with open(path, "wb") as key_file:
+        key_file.write(private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        ))
+
+def point_at_mock(server, work_dir, set_value=setattr):
+    """
+    Point every module at the mock server and at scratch files, and set every mock account up in a scratch accounts.json.
+    Module settings are changed with set_value(module, name, value), e.g. a pytest monkeypatch's setattr so they're put back afterwards.
+    """
+    key_path = os.path.join(work_dir, "mock_key.pem")
+    write_private_key(key_path)
+
+    set_value(bankfrick_connect, "BASE_URL", server.url)
+    set_value(bankfrick_connect, "PRIVATE_KEY_PATH", key_path)
+    set_value(bankfrick_connect, "TOKEN_CACHE_PATH", None)
+    http_client.register_token_refresher(server.url, bankfrick_connect.refresh_jwt_token)
+    set_value(iplicit_connector, "IPLICIT_BASE_URL", server.url)
+    set_value(fetch_post_transactions, "IPLICIT_API_URL", f"{server.url}/transactions")
+    set_value(fetch_transactions, "OUTPUT_DIR", os.path.join(work_dir, "output"))
+    set_value(fetch_daily, "OUTPUT_DIR", os.path.join(work_dir, "output"))
+    set_value(telemetry, "LOG_SUMMARY", False)  # The benchmark prints its own report
+    set_value(telemetry, "LOG_JSON_PATH", os.path.join(work_dir, "run_log.jsonl"))
+    telemetry.configure()
+
+    # Set every mock account up for posting; names and currencies come from the mock's /accounts
+    config = []
+    for number in range(server.state.accounts):
+        account = server.state.account(number)
+        config.append({"account": account["account"], "bank_account": account["iban"], "code": account["account"]})
+    set_value(account_registry, "ACCOUNTS_CONFIG_PATH", os.path.join(work_dir, "accounts.json"))
+    set_value(account_registry, "REGISTRY_CACHE_PATH", None)  # Every run should load the accounts cold
+    set_value(response_cache, "RESPONSE_CACHE_DIR", None)  # and fetch every transaction from the mock
+    with open(account_registry.ACCOUNTS_CONFIG_PATH, "w", encoding="utf-8") as config_file:
+        json.dump(config, config_file)
+
+def reset_between_runs(server, work_dir, name):
+    """
+    Give each entry point a cold start: no cached token, accounts, transactions or sync state.
+    """
+    bankfrick_client.clear_cache()
+    account_registry.clear_registry()
+    bankfrick_connect.clear_token_cache()
+    sync_state.STATE_DB_PATH = os.path.join(work_dir, f"{name}_state.db")
+    server.state.reset_stats()
+    telemetry.metrics.reset()
+
+@contextlib.contextmanager
+def timed_requests(latencies):
+    """
+    Record the wall time of every HTTP request made through http_client while the block runs.
+    """
+    original = http_client.send_with_retries
+
+    def timed(method, url, timeout, **kwargs):
+        started = time.perf_counter()
+        try:
+            return original(method, url, timeout, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    http_client.send_with_retries = timed
+    try:
+        yield
+    finally:
+        http_client.send_with_retries = original
+
+def run_entry_point(name, entry_point, server, work_dir, verbose=False):
+    """
+    Run one entry point and return its measurements as a dict.
+    """
+    reset_between_runs(server, work_dir, name)
+    latencies = []
+    output = io.StringIO()
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    with timed_requests(latencies), contextlib.redirect_stdout(sys.stdout if verbose else output):
+        entry_point()
+    elapsed = time.perf_counter() - started
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    state = server.state
+    transactions = state.transactions_served + len(state.posted)
+    run_metrics = telemetry.metrics.summary()
+    return {
+        "entry_point": name,
+        "seconds": round(elapsed, 3),
+        "requests": len(latencies),
+        "transactions": transactions,
+        "transactions_per_second": round(transactions / elapsed, 1) if elapsed else 0.0,
+        "requests_per_second": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "peak_memory_mb": round(peak_memory / (1024 * 1024), 2),
+        "bytes_received": state.bytes_sent,
+        "retries": sum(endpoint["retries"] for endpoint in run_metrics["endpoints"].values()),
+        "stages": run_metrics["stages"],
+    }
+
+def compare_to_baseline(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """
+    Return a list of human readable regressions against a previous run's results.
+    """
+    regressions = []
+    previous = {result["entry_point"]: result for result in baseline}
+    for result in results:
+        before = previous.get(result["entry_point"])
+        if not before:
+            continue
+        name = result["entry_point"]
+        if before["transactions_per_second"] and result["transactions_per_second"] < before["transactions_per_second"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {result['transactions_per_second']}/s vs {before['transactions_per_second']}/s")
+        if before["p99_ms"] and result["p99_ms"] > before["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {result['p99_ms']}ms vs {before['p99_ms']}ms")
+        if before["peak_memory_mb"] and result["peak_memory_mb"] > before["peak_memory_mb"] * (1 + tolerance):
+            regressions.append(f"{name}: peak memory {result['peak_memory_mb']}MB vs {before['peak_memory_mb']}MB")
+    return regressions
+
+def print_report(results):
+    """
+    Print the measurements as a table.
+    """
+    columns = ["entry_point", "seconds", "requests", "retries", "transactions", "transactions_per_second", "p50_ms", "p99_ms", "peak_memory_mb"]
+    widths = {column: max(len(column), *(len(str(result[column])) for result in results)) for column in columns}
+    print("  ".join(column.ljust(widths[column]) for column in columns))
+    for result in results:
+        print("  ".join(str(result[column]).ljust(widths[column]) for column in columns))
+
+def main(argv=None):
+    """
+    Benchmark the entry points against the mock APIs with a synthetic workload.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the Bank Frick / Iplicit scripts against local mock APIs.")
+    parser.add_argument("--accounts", type=int, default=20, help="Number of synthetic accounts")
+    parser.add_argument("--transactions", type=int, default=1000, help="Transactions per account")
+    parser.add_argument("--days", type=int, default=31, help="Days of history the transactions are spread over")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds the mock waits before answering")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests the mock fails with a 503")
+    parser.add_argument("--bank-rate-limit", action="store_true",
+                        help="Hold requests to the mock to Bank Frick's RATE_LIMITS entry, as in production (Iplicit posts too, the mock serves both)")
+    parser.add_argument("--only", nargs="*", choices=sorted(ENTRY_POINTS), help="Only run these entry points")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against a previous --output file and exit non-zero on regressions")
+    parser.add_argument("--verbose", action="store_true", help="Show the scripts' own output")
+    args = parser.parse_args(argv)
+
+    server = mock_server.start_mock_server(
+        latency=args.latency, error_rate=args.error_rate, seed=1,
+        accounts=args.accounts, transactions_per_account=args.transactions, history_days=args.days,
+    )
+    bank_rate_limit = http_client.RATE_LIMITS.get(urlsplit(bankfrick_connect.BASE_URL).netloc)
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            point_at_mock(server, work_dir)
+            if args.bank_rate_limit:
+                http_client.RATE_LIMITS[urlsplit(server.url).netloc] = bank_rate_limit
+            for name in args.only or ENTRY_POINTS:
+                print(f"Running {name}...")
+                results.append(run_entry_point(name, ENTRY_POINTS[name], server, work_dir, args.verbose))
+    finally:
+        mock_server.stop_mock_server(server)
+        http_client.close()
+
+    print(f"\n{args.accounts} accounts x {args.transactions} transactions over {args.days} days, "
+          f"{args.latency * 1000:.0f}ms latency, {args.error_rate:.0%} errors ({datetime.now():%Y-%m-%d %H:%M})")
+    print_report(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            regressions = compare_to_baseline(results, json.load(baseline_file))
+        if regressions:
+            print("\nRegressions against the baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions against the baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
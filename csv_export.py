@@ -0,0 +1,128 @@
+import csv
+import gzip
+import hashlib
+import json
+import os
+from transaction_record import normalize, normalize_all
+
+# Column layout shared by every CSV export
+CSV_HEADER = ["Date", "Description", "Amount", "Currency", "Debitor Account", "Creditor Name", "Merchant Name"]
+CONSOLIDATED_HEADER = CSV_HEADER + ["Account"]  # Consolidated files mix accounts so say which one each row came from
+
+def transaction_to_row(transaction, account_names):
+    """
+    Turn a Bank Frick transaction (a TransactionRecord or the API dict) into a CSV row, with the amount signed by direction.
+    account_names maps account numbers to names, e.g. the account registry's names_by_number index.
+    """
+    record = normalize(transaction)
+    merchant_name = record.creditor_name
+    debitor_name = account_names.get(record.debitor_account, "Unknown")
+
+    if record.direction == "outgoing":
+        description = f"Payment to {merchant_name}"
+    elif record.direction == "incoming":
+        description = f"Received from {debitor_name}"
+    else:
+        description = "Unknown transaction"
+
+    return [
+        record.valuta,
+        description,
+        record.signed_amount,
+        record.currency,
+        debitor_name,
+        record.creditor_name,
+        merchant_name
+    ]
+
+def open_csv_file(path, compress=False, overwrite=True):
+    """
+    Open a CSV file for writing, gzip-compressed if asked. Without overwrite an existing file raises FileExistsError.
+    """
+    mode = "w" if overwrite else "x"
+    if compress:
+        return gzip.open(path, mode=f"{mode}t", newline="", encoding="utf-8")
+    return open(path, mode=mode, newline="", encoding="utf-8")
+
+def create_csv_file(output_dir, name, extension, compress=False, overwrite=False):
+    """
+    Create output_dir/name + extension, or name_2, name_3... if an earlier run already wrote that file,
+    so a rerun never truncates rows whose accounts were checkpointed. Returns (file, path).
+    """
+    if overwrite:
+        path = os.path.join(output_dir, f"{name}{extension}")
+        return open_csv_file(path, compress), path
+    number = 1
+    while True:
+        path = os.path.join(output_dir, f"{name}{extension}" if number == 1 else f"{name}_{number}{extension}")
+        try:
+            return open_csv_file(path, compress, overwrite=False), path
+        except FileExistsError:
+            number += 1
+
+def write_rows_streaming(rows, output_dir, file_stem, compress=False, partition_by_currency=False, overwrite=False):
+    """
+    Write (currency, row) pairs to CSV as they arrive, never holding more than one row at a time.
+    Everything goes into one file unless partition_by_currency is set, in which case each currency gets its own.
+    Existing files are kept and the new ones numbered (see create_csv_file) unless overwrite is set.
+    Returns a dict of output file path -> rows written.
+    """
+    os.makedirs(output_dir, exist_ok=True)  # Checked once per export rather than once per account
+    extension = ".csv.gz" if compress else ".csv"
+
+    files = {}  # partition key -> (file, writer, path)
+    counts = {}
+    try:
+        for currency, row in rows:
+            key = (currency or "UNKNOWN") if partition_by_currency else None
+            if key not in files:
+                name = f"{file_stem}_{key}" if partition_by_currency else file_stem
+                output_file, path = create_csv_file(output_dir, name, extension, compress, overwrite)
+                writer = csv.writer(output_file)
+                writer.writerow(CONSOLIDATED_HEADER)
+                files[key] = (output_file, writer, path)
+                counts[path] = 0
+            _, writer, path = files[key]
+            writer.writerow(row)
+            counts[path] += 1
+    finally:
+        for output_file, _, _ in files.values():
+            output_file.close()
+    return counts
+
+def write_account_csv(path, transactions, account_id, account_names):
+    """
+    Write the transactions an account sent (the same filter as the per-account export) to path.
+    Runs in a worker process for the parallel export, so everything it needs is passed in.
+    Returns the file's manifest entry, or None when there was nothing to write.
+    """
+    rows = [transaction_to_row(record, account_names) for record in normalize_all(transactions) if record.debitor_account == account_id]
+    if not rows:
+        return None
+
+    with open(path, mode="w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(CSV_HEADER)
+        writer.writerows(rows)
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return {"file": os.path.basename(path), "rows": len(rows), "bytes": os.path.getsize(path), "sha256": digest.hexdigest()}
+
+def update_manifest(path, entries):
+    """
+    Merge file entries into the JSON manifest at path, replacing any earlier entry for the same file,
+    and write it back sorted by file name so it comes out the same whatever order the files finished in.
+    """
+    manifest = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as manifest_file:
+            manifest = {entry["file"]: entry for entry in json.load(manifest_file).get("files", [])}
+    manifest.update((entry["file"], entry) for entry in entries)
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as manifest_file:
+        json.dump({"files": [manifest[name] for name in sorted(manifest)]}, manifest_file, indent=2)
+    os.replace(temp_path, path)
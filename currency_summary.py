@@ -0,0 +1,136 @@
+import csv
+import json
+import os
+import telemetry
+from transaction_record import normalize
+
+# Money totals for the summary reports: per legal entity and currency, plus an optional total in one base currency
+# converted with a locally supplied FX table, all built in a single pass over the fetched transactions
+FX_RATES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fx_rates.json")  # No file means no base-currency totals
+NO_ENTITY = "Other"  # Shown for accounts whose legal entity isn't known
+
+logger = telemetry.get_logger(__name__)
+
+class Totals:
+    """
+    Running count and money in/out for one group of transactions. Amounts are positive; net is incoming minus outgoing.
+    """
+    __slots__ = ("count", "incoming", "outgoing")
+
+    def __init__(self):
+        self.count = 0
+        self.incoming = 0.0
+        self.outgoing = 0.0
+
+    def add(self, signed_amount):
+        self.count += 1
+        if signed_amount < 0:
+            self.outgoing -= signed_amount
+        else:
+            self.incoming += signed_amount
+
+    @property
+    def gross(self):
+        return self.incoming + self.outgoing
+
+    @property
+    def net(self):
+        return self.incoming - self.outgoing
+
+class FxTable:
+    """
+    Conversion rates into one base currency: rates maps each currency to the value of one unit of it in the base currency.
+    """
+    def __init__(self, base, rates):
+        self.base = base.upper()
+        self.rates = {currency.upper(): float(rate) for currency, rate in rates.items()}
+        self.rates[self.base] = 1.0
+
+    def rate(self, currency):
+        return self.rates.get((currency or "").upper())
+
+def load_fx_table(path=None):
+    """
+    Read an FX table like {"base": "EUR", "rates": {"USD": 0.92, "CHF": 1.05}}. Returns None if there isn't one.
+    """
+    path = path or FX_RATES_PATH
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as rates_file:
+            table = json.load(rates_file)
+        return FxTable(table["base"], table.get("rates", {}))
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+        logger.warning(f"Ignoring unreadable FX table {path}: {e}")
+        return None
+
+class CurrencySummary:
+    """
+    Per-entity, per-currency totals, plus per-entity totals in the FX table's base currency when one is given.
+    Currencies the table has no rate for are left out of the base totals and listed in missing_rates.
+    """
+    def __init__(self, fx=None):
+        self.fx = fx
+        self.by_currency = {}  # (entity, currency) -> Totals
+        self.in_base = {}  # entity -> Totals in the base currency
+        self.missing_rates = set()
+
+    def add_account(self, entity, account_currency, transactions):
+        """
+        Add an account's transactions, in one pass with each currency's totals and rate looked up once per account.
+        """
+        entity = entity or NO_ENTITY
+        base_totals = self.in_base.setdefault(entity, Totals()) if self.fx else None
+        lookups = {}  # currency -> (Totals, rate)
+        for transaction in transactions:
+            record = normalize(transaction)
+            if record.signed_amount is None:
+                continue
+            currency = record.currency or account_currency
+            lookup = lookups.get(currency)
+            if lookup is None:
+                rate = self.fx.rate(currency) if self.fx else None
+                if self.fx and rate is None:
+                    self.missing_rates.add(currency)
+                lookup = lookups[currency] = (self.by_currency.setdefault((entity, currency), Totals()), rate)
+            totals, rate = lookup
+            totals.add(record.signed_amount)
+            if rate is not None:
+                base_totals.add(record.signed_amount * rate)
+
+    def rows(self):
+        """
+        (entity, currency, totals) rows sorted by entity then currency, each entity followed by its base-currency total.
+        """
+        rows = []
+        for entity in sorted({entity for entity, _ in self.by_currency} | set(self.in_base)):
+            rows.extend((entity, currency, self.by_currency[(entity, currency)])
+                        for currency in sorted(currency for row_entity, currency in self.by_currency if row_entity == entity))
+            if self.fx and entity in self.in_base:
+                rows.append((entity, f"Total in {self.fx.base}", self.in_base[entity]))
+        return rows
+
+    def log(self, period):
+        logger.info(f"\nTotals by entity and currency, {period}:")
+        for entity, currency, totals in self.rows():
+            logger.info(f"{entity} {currency}: {totals.count} transactions, {totals.incoming:,.2f} in, {totals.outgoing:,.2f} out, net {totals.net:,.2f}.")
+        if self.missing_rates:
+            logger.warning(f"No FX rate for {', '.join(sorted(self.missing_rates))}, left out of the base-currency totals.")
+
+    def write_csv(self, output_file_path):
+        with telemetry.stage("write"), open(output_file_path, mode='w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(["Company", "Currency", "Transactions", "Incoming", "Outgoing", "Gross", "Net"])
+            for entity, currency, totals in self.rows():
+                writer.writerow([entity, currency, totals.count, round(totals.incoming, 2), round(totals.outgoing, 2), round(totals.gross, 2), round(totals.net, 2)])
+        logger.info(f"Saved totals to {output_file_path}")
+
+def summarize_accounts(transactions_by_account, accounts, registry, fx=None):
+    """
+    Build a CurrencySummary from {account_id: transactions} for (account_id, currency) pairs, with entities from the registry.
+    """
+    summary = CurrencySummary(fx)
+    with telemetry.stage("totals"):
+        for account_id, currency in accounts:
+            summary.add_account(registry.entity_of(account_id), currency, transactions_by_account.get(account_id) or [])
+    return summary
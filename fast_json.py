@@ -0,0 +1,201 @@
+import codecs
+import json
+
+try:
+    import orjson
+except ImportError:  # Optional, only makes decoding faster
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # Optional, used when orjson isn't installed
+    ujson = None
+
+try:
+    import ijson
+    from ijson.common import ObjectBuilder
+except ImportError:  # Optional, the streaming parser falls back to an incremental stdlib decoder
+    ijson = None
+
+# JSON encoding/decoding for large Bank Frick responses: orjson or ujson when installed, the stdlib otherwise,
+# plus a streaming mode that yields the items of one array (e.g. "transactions") without building the whole document
+STREAM_CHUNK_SIZE = 64 * 1024  # Bytes read from the response at a time when streaming
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = _WHITESPACE + ",:]}"
+
+def backend():
+    """
+    Name of the library used for whole-document decoding.
+    """
+    return "orjson" if orjson else "ujson" if ujson else "json"
+
+def loads(data):
+    """
+    Decode a JSON document from bytes or str with the fastest library available.
+    """
+    if orjson:
+        return orjson.loads(data)
+    if ujson:
+        return ujson.loads(data)
+    return json.loads(data)
+
+def dumps(obj):
+    """
+    Encode an object as a compact JSON string with the fastest library available.
+    """
+    if orjson:
+        return orjson.dumps(obj).decode("utf-8")
+    if ujson:
+        return ujson.dumps(obj, ensure_ascii=False)
+    return json.dumps(obj, separators=(",", ":"))
+
+def decode_response(response):
+    """
+    Drop-in for response.json() that decodes the raw bytes directly, skipping requests' text decoding step.
+    """
+    return loads(response.content)
+
+class _ChunkReader:
+    """
+    File-like read() over a response's decoded body chunks, for ijson.
+    """
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.buffer = b""
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            self.buffer += chunk
+        if size < 0:
+            data, self.buffer = self.buffer, b""
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+def iter_json_array(response, array_key, meta=None):
+    """
+    Stream a JSON response, yielding the items of the top-level array_key one at a time as they're parsed.
+    Other top-level scalar values (e.g. "moreResults") are stored in meta once they've been read.
+    If the document itself is a list its items are yielded instead. The response must be sent with stream=True.
+    """
+    meta = {} if meta is None else meta
+    chunks = response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+    if ijson:
+        return _iter_with_ijson(_ChunkReader(chunks), array_key, meta)
+    return _iter_incremental(chunks, array_key, meta, response.encoding or "utf-8")
+
+def _iter_with_ijson(reader, array_key, meta):
+    item_prefix = None
+    builder = None
+    top_level = None
+    for prefix, event, value in ijson.parse(reader, use_float=True):
+        if top_level is None:
+            top_level = event
+            item_prefix = "item" if event == "start_array" else f"{array_key}.item"
+            continue
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == item_prefix and event in ("end_map", "end_array"):
+                yield builder.value
+                builder = None
+            continue
+        if prefix == item_prefix:
+            if event in ("start_map", "start_array"):
+                builder = ObjectBuilder()
+                builder.event(event, value)
+            else:
+                yield value
+        elif top_level == "start_map" and prefix and "." not in prefix and event in ("boolean", "number", "string", "null"):
+            meta[prefix] = value
+
+def _iter_incremental(chunks, array_key, meta, encoding):
+    """
+    Stdlib fallback: walk the top-level object with JSONDecoder.raw_decode, decoding one value at a time
+    from a buffer that is topped up from the response as needed.
+    """
+    text_decoder = codecs.getincrementaldecoder(encoding)()
+    state = {"buffer": "", "position": 0, "eof": False}
+
+    def fill():
+        if state["eof"]:
+            return False
+        chunk = next(chunks, None)
+        if chunk is None:
+            state["buffer"] += text_decoder.decode(b"", final=True)
+            state["eof"] = True
+            return True
+        # Drop what has been consumed so the buffer only ever holds about one chunk plus one item
+        state["buffer"] = state["buffer"][state["position"]:] + text_decoder.decode(chunk)
+        state["position"] = 0
+        return True
+
+    def peek():
+        # Skip whitespace and return the next character, or "" at the end of the document
+        while True:
+            buffer, position = state["buffer"], state["position"]
+            while position < len(buffer) and buffer[position] in _WHITESPACE:
+                position += 1
+            state["position"] = position
+            if position < len(buffer):
+                return buffer[position]
+            if not fill():
+                return ""
+
+    def expect(character):
+        if peek() != character:
+            raise ValueError(f"Expected {character!r} at position {state['position']} of the JSON stream")
+        state["position"] += 1
+
+    def value():
+        # Only accept a value once a delimiter follows it, so a number split across chunks (e.g. "12" + ".5") isn't cut short
+        while True:
+            peek()
+            try:
+                decoded, end = _decoder.raw_decode(state["buffer"], state["position"])
+                if state["eof"] or (end < len(state["buffer"]) and state["buffer"][end] in _DELIMITERS):
+                    state["position"] = end
+                    return decoded
+            except json.JSONDecodeError:
+                if state["eof"]:
+                    raise
+            fill()
+
+    def array_items():
+        expect("[")
+        if peek() == "]":
+            state["position"] += 1
+            return
+        while True:
+            yield value()
+            if peek() == ",":
+                state["position"] += 1
+                continue
+            expect("]")
+            return
+
+    first = peek()
+    if first == "[":
+        yield from array_items()
+        return
+    expect("{")
+    if peek() == "}":
+        return
+    while True:
+        key = value()
+        expect(":")
+        if key == array_key and peek() == "[":
+            yield from array_items()
+        else:
+            item = value()
+            if not isinstance(item, (dict, list)):
+                meta[key] = item
+        if peek() == ",":
+            state["position"] += 1
+            continue
+        expect("}")
+        return
@@ -1,116 +1,99 @@
-import requests
 import csv
 import os
+import telemetry
 from datetime import datetime, timedelta
+from account_registry import get_registry
 from bankfrick_connect import get_jwt_token
+from fetch_daily_summary import bucket_by_valuta, check_range, days_in_range, fetch_valid_accounts, parse_args, report_totals, write_daily_counts_csv
 
-# Configuration settings for connecting to the Bank Frick API
-BASE_URL = "https://olb.bankfrick.li/webapi/v2"
-TRANSACTIONS_ENDPOINT = "/transactions"
+# Configuration settings
 OUTPUT_DIR = "/workspaces/15932103/Project/output/" # Output directory for CSV files
 
-# Account mapping: Links account IDs to their human-readable names and currencies
-account_mapping = {
-
-}
-
-def fetch_transactions(jwt_token, account_id, date):
-    """
-    Fetch transactions for a specific account and date.
-    """
-    url = f"{BASE_URL}{TRANSACTIONS_ENDPOINT}?accountId={account_id}&fromDate={date}&toDate={date}"
-    headers = {
-        "Authorization": f"Bearer {jwt_token}",
-        "Accept": "application/json",
-    }
-
-    print(f"Fetching transactions for account {account_id} on {date}...")
-    response = requests.get(url, headers=headers)
-
-    if response.status_code == 200:
-        print(f"Transactions fetched successfully for account {account_id}.")
-        response_json = response.json()
-        if isinstance(response_json, dict) and "transactions" in response_json:
-            return response_json.get("transactions", [])
-        elif isinstance(response_json, list):
-            return response_json
-        else:
-            print(f"Unexpected response format: {response_json}")
-            return []
-    else:
-        print(f"Failed to fetch transactions for account {account_id}: {response.status_code} - {response.text}")
-        return []
+logger = telemetry.get_logger(__name__)
 
 def process_transactions(transactions, account_name, currency, date):
     """
-    Process transactions and generate summary.
+    Process transactions and generate summary, with the day's net movement in the account's currency.
     """
     count = len(transactions)
     formatted_date = datetime.strptime(date, '%Y-%m-%d').strftime('%d/%m/%Y')
     if count > 0:
-        print(f"{account_name} had {count} transactions on {formatted_date}.")
+        net = sum(record.signed_amount or 0 for record in transactions)
+        logger.info(f"{account_name} had {count} transactions on {formatted_date}, net {net:,.2f} {currency}.")
         return count
     else:
-        print(f"{account_name} had no movements on {formatted_date}.")
+        logger.info(f"{account_name} had no movements on {formatted_date}.")
         return 0
 
-def main():
+def main(start_date=None, end_date=None, csv_path=None, totals_path=None):
     """
-    Main script to fetch transactions from yesterday for all accounts and generate a summary.
+    Main script to fetch transactions for all accounts and generate a summary, for yesterday by default
+    or for every day from start_date to end_date.
+    Returns None if every account was summarized, otherwise what failed, for the scheduler's health check.
     """
     # Get the JWT token
     jwt_token = get_jwt_token()
     if not jwt_token:
-        print("Failed to retrieve JWT token. Exiting.")
-        return
-
-    # Get yesterday's date
-    date = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-
-    accounts_endpoint = f"{BASE_URL}/accounts" # Fetch the list of accounts available from the API
-    headers = {
-        "Authorization": f"Bearer {jwt_token}",
-        "Accept": "application/json",
-    }
-    print("Fetching account list...")
-    response = requests.get(accounts_endpoint, headers=headers)
-
-    if response.status_code != 200:
-        print(f"Failed to fetch accounts: {response.status_code} - {response.text}")
-        return
-
-    # Extract accounts from the API response
-    response_json = response.json()
-    accounts = response_json.get("accounts", [])
-
-    # Initialize summary list to store results for all accounts
-    summary = []
-
-    # Iterate over each account and fetch transactions
-    for account in accounts:
+        logger.error("Failed to retrieve JWT token. Exiting.")
+        return "Failed to retrieve JWT token"
+
+    # Default to yesterday's date
+    yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+    start_date = start_date or end_date or yesterday
+    end_date = end_date or start_date
+    if not check_range(start_date, end_date):
+        return f"The start date {start_date} is after the end date {end_date}"
+
+    registry = get_registry(jwt_token) # Accounts with their names, from accounts.json and the API
+    if not registry:
+        logger.error("No accounts found. Exiting.")
+        return "No accounts found"
+
+    # Work out which accounts have complete data before fetching anything
+    valid_accounts = []
+    for account in registry:
         account_id = account.get("account")
         currency = account.get("currency")
-        account_name = account_mapping.get(account_id, "Unknown")
+        account_name = account.get("name")
 
         if not account_id or not account_name or not currency:
             continue # Skip accounts with incomplete data
 
-        # Fetch transactions for the account
-        transactions = fetch_transactions(jwt_token, account_id, date)
-
-        # Process transactions and generate summary
-        transaction_count = process_transactions(transactions, account_name, currency, date)
-        summary.append((account_name, currency, transaction_count))
-
-    # Print the daily summary for all accounts
-    print("\nDaily Transaction Summary:")
-    formatted_date = datetime.strptime(date, '%Y-%m-%d').strftime('%d/%m/%Y')
-    for entry in summary:
-        account_name, currency, transaction_count = entry
-        if transaction_count > 0:
-            print(f"{account_name} had {transaction_count} transactions on {formatted_date}.")
-        else:
-            print(f"{account_name} had no movements on {formatted_date}.")
+        valid_accounts.append((account_id, account_name, currency))
+
+    # Fetch the whole range for all accounts at once, then split each account's transactions into days in one pass
+    total = len(valid_accounts)
+    transactions_by_account, valid_accounts = fetch_valid_accounts(jwt_token, valid_accounts, start_date, end_date)
+    buckets_by_account = {account_id: bucket_by_valuta(transactions_by_account[account_id]) for account_id, _, _ in valid_accounts}
+
+    csv_rows = []
+    for date in days_in_range(start_date, end_date):
+        # Initialize summary list to store results for all accounts
+        summary = []
+        for account_id, account_name, currency in valid_accounts:
+            transactions = buckets_by_account[account_id].get(date, [])
+
+            # Process transactions and generate summary
+            transaction_count = process_transactions(transactions, account_name, currency, date)
+            summary.append((account_name, currency, transaction_count))
+            csv_rows.append((date, account_name, currency, transaction_count))
+
+        # Print the daily summary for all accounts
+        logger.info("\nDaily Transaction Summary:")
+        formatted_date = datetime.strptime(date, '%Y-%m-%d').strftime('%d/%m/%Y')
+        for entry in summary:
+            account_name, currency, transaction_count = entry
+            if transaction_count > 0:
+                logger.info(f"{account_name} had {transaction_count} transactions on {formatted_date}.")
+            else:
+                logger.info(f"{account_name} had no movements on {formatted_date}.")
+
+    report_totals(transactions_by_account, valid_accounts, start_date, end_date, totals_path)
+    if csv_path:
+        write_daily_counts_csv(csv_rows, csv_path)
+    if len(valid_accounts) < total:
+        return f"{total - len(valid_accounts)} of {total} accounts failed"
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    main(args.start_date, args.end_date, args.csv_path, args.totals_path)
@@ -1,42 +1,88 @@
-import requests
+import argparse
+import bankfrick_client
+import csv
+import currency_summary
+import logging
+import telemetry
 from datetime import datetime, timedelta
+from account_registry import get_registry
 from bankfrick_connect import get_jwt_token
+from fetch_engine import fetch_accounts_concurrently
+from transaction_record import normalize_all
 
-# Configuration settings for connecting to the Bank Frick API
-BASE_URL = "https://olb.bankfrick.li/webapi/v2"
-TRANSACTIONS_ENDPOINT = "/transactions"
+logger = telemetry.get_logger(__name__)
 
-# Account mapping: Links account IDs to their human-readable names and currencies
-account_mapping = {
+def fetch_transactions_range(jwt_token, account_id, start_date, end_date):
+    """
+    Fetch transactions for a specific account over a whole date range in one request.
+    Returns None if they couldn't be fetched, so a failure isn't mistaken for a quiet account.
+    """
+    return bankfrick_client.fetch_transactions(jwt_token, account_id, start_date, end_date)
 
-}
+def fetch_valid_accounts(jwt_token, valid_accounts, start_date, end_date):
+    """
+    Fetch the whole range for every (account_id, account_name, currency) in valid_accounts, one request per account
+    however many days it covers.
+    Returns ({account_id: TransactionRecords}, the valid_accounts that were fetched); the rest are reported as failed.
+    """
+    transactions_by_account = fetch_accounts_concurrently(
+        fetch_transactions_range, jwt_token, [account_id for account_id, _, _ in valid_accounts], start_date, end_date
+    )
+    fetched_accounts = []
+    for account_id, account_name, currency in valid_accounts:
+        if transactions_by_account.get(account_id) is None:
+            telemetry.log_event(logger, logging.ERROR, f"Could not fetch transactions for {account_name}, it is left out of the summary.",
+                                event="fetch_failed", account_id=account_id, start_date=start_date, end_date=end_date)
+        else:
+            fetched_accounts.append((account_id, account_name, currency))
+    return {account_id: transactions_by_account[account_id] for account_id, _, _ in fetched_accounts}, fetched_accounts
 
-def fetch_transactions(jwt_token, account_id, date):
+def check_range(start_date, end_date):
     """
-    Fetch transactions for a specific account and date.
+    Log an error and return False if the range is backwards.
     """
-    url = f"{BASE_URL}{TRANSACTIONS_ENDPOINT}?accountId={account_id}&fromDate={date}&toDate={date}"
-    headers = {
-        "Authorization": f"Bearer {jwt_token}",
-        "Accept": "application/json",
-    }
+    if start_date > end_date:
+        logger.error(f"The start date {start_date} is after the end date {end_date}. Exiting.")
+        return False
+    return True
 
-    print(f"Fetching transactions for account {account_id} on {date}...")
-    response = requests.get(url, headers=headers)
+def days_in_range(start_date, end_date):
+    """
+    List every YYYY-MM-DD date from start_date to end_date inclusive.
+    """
+    day = datetime.strptime(start_date, '%Y-%m-%d')
+    last_day = datetime.strptime(end_date, '%Y-%m-%d')
+    days = []
+    while day <= last_day:
+        days.append(day.strftime('%Y-%m-%d'))
+        day += timedelta(days=1)
+    return days
+
+def bucket_by_valuta(transactions):
+    """
+    Group transactions by valuta date in a single pass, as TransactionRecords.
+    """
+    buckets = {}
+    for record in normalize_all(transactions):
+        buckets.setdefault(record.day, []).append(record)
+    return buckets
 
-    if response.status_code == 200:
-        print(f"Transactions fetched successfully for account {account_id}.")
-        response_json = response.json()
-        if isinstance(response_json, dict) and "transactions" in response_json:
-            return response_json.get("transactions", [])
-        elif isinstance(response_json, list):
-            return response_json
-        else:
-            print(f"Unexpected response format: {response_json}")
-            return []
-    else:
-        print(f"Failed to fetch transactions for account {account_id}: {response.status_code} - {response.text}")
-        return []
+def company_of(account_name):
+    """
+    Work out which company an account belongs to, using the registry's precomputed legal entity.
+    """
+    return get_registry().entity_of(account_name)
+
+def write_daily_counts_csv(rows, output_file_path):
+    """
+    Save (date, account_name, currency, count) rows as a CSV with one line per account per day.
+    """
+    with telemetry.stage("write"), open(output_file_path, mode='w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(["Date", "Company", "Account", "Currency", "Transactions"])
+        for date, account_name, currency, count in rows:
+            writer.writerow([date, company_of(account_name), account_name, currency, count])
+    logger.info(f"Saved daily summary to {output_file_path}")
 
 def process_transactions(transactions, account_name, date):
     """
@@ -45,7 +91,7 @@ def process_transactions(transactions, account_name, date):
     count = len(transactions)
     formatted_date = datetime.strptime(date, '%Y-%m-%d').strftime('%d/%m/%Y')
     if count > 0:
-        print(f"{account_name} had {count} transactions on {formatted_date}.")
+        logger.info(f"{account_name} had {count} transactions on {formatted_date}.")
         return count
     else:
         return 0
@@ -54,91 +100,129 @@ def summarize_transactions(summary, date):
     """
     Summarize the daily transaction report for all accounts.
     """
-    # Group accounts by company so it can be read easier
+    # Group accounts by company so it can be read easier, looking each one up once
     company_summary = {
         "A/S": [],
         "Limited": []
     }
 
     for account_name, transaction_count in summary.items():
-        if "A/S" in account_name:
-            company_summary["A/S"].append(transaction_count)
-        elif "Limited" in account_name:
-            company_summary["Limited"].append(transaction_count)
+        company = company_of(account_name)
+        if company in company_summary:
+            company_summary[company].append((account_name, transaction_count))
 
     # Prepare and ouput the summary output
-    print("\nDaily Transaction Summary:")
+    logger.info("\nDaily Transaction Summary:")
 
     formatted_date = datetime.strptime(date, '%Y-%m-%d').strftime('%d/%m/%Y')
-    as_no_movements = all(count == 0 for count in company_summary["A/S"])
-    limited_no_movements = all(count == 0 for count in company_summary["Limited"])
+    as_no_movements = all(count == 0 for _, count in company_summary["A/S"])
+    limited_no_movements = all(count == 0 for _, count in company_summary["Limited"])
 
     if as_no_movements and limited_no_movements:
-        print(f"A/S and Limited both had no movements on {formatted_date}.")
+        logger.info(f"A/S and Limited both had no movements on {formatted_date}.")
     else:
         if as_no_movements:
-            print(f"A/S had no movements on {formatted_date}.")
+            logger.info(f"A/S had no movements on {formatted_date}.")
         else:
-            for account_name, transaction_count in summary.items():
-                if "A/S" in account_name and transaction_count > 0:
-                    print(f"{account_name} had {transaction_count} transactions on {formatted_date}.")
+            for account_name, transaction_count in company_summary["A/S"]:
+                if transaction_count > 0:
+                    logger.info(f"{account_name} had {transaction_count} transactions on {formatted_date}.")
 
         if limited_no_movements:
-            print(f"Limited had no movements on {formatted_date}.")
+            logger.info(f"Limited had no movements on {formatted_date}.")
         else:
-            for account_name, transaction_count in summary.items():
-                if "Limited" in account_name and transaction_count > 0:
-                    print(f"{account_name} had {transaction_count} transactions on {formatted_date}.")
+            for account_name, transaction_count in company_summary["Limited"]:
+                if transaction_count > 0:
+                    logger.info(f"{account_name} had {transaction_count} transactions on {formatted_date}.")
 
-def main():
+def report_totals(transactions_by_account, valid_accounts, start_date, end_date, totals_path=None):
+    """
+    Log per-entity, per-currency totals for the whole range (plus base-currency totals if there's an FX table)
+    and optionally save them as a CSV.
+    """
+    summary = currency_summary.summarize_accounts(
+        transactions_by_account, [(account_id, currency) for account_id, _, currency in valid_accounts], get_registry(), currency_summary.load_fx_table()
+    )
+    summary.log(start_date if start_date == end_date else f"{start_date} to {end_date}")
+    if totals_path:
+        summary.write_csv(totals_path)
+    return summary
+
+def main(start_date=None, end_date=None, csv_path=None, totals_path=None):
     """
-    Main script to fetch transactions from yesterday for all accounts and generate summary.
+    Main script to fetch transactions for all accounts and generate summary, for yesterday by default
+    or for every day from start_date to end_date.
+    Returns None if every account was summarized, otherwise what failed, for the scheduler's health check.
     """
     # Get the JWT token
     jwt_token = get_jwt_token()
     if not jwt_token:
-        print("Failed to retrieve JWT token. Exiting.")
-        return
-
-    # Get yesterday's date
-    date = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-
-    accounts_endpoint = f"{BASE_URL}/accounts" # Fetch the list of accounts available from the API
-    headers = {
-        "Authorization": f"Bearer {jwt_token}",
-        "Accept": "application/json",
-    }
-    print("Fetching account list...")
-    response = requests.get(accounts_endpoint, headers=headers)
+        logger.error("Failed to retrieve JWT token. Exiting.")
+        return "Failed to retrieve JWT token"
+
+    # Default to yesterday's date
+    yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+    start_date = start_date or end_date or yesterday
+    end_date = end_date or start_date
+    if not check_range(start_date, end_date):
+        return f"The start date {start_date} is after the end date {end_date}"
+
+    registry = get_registry(jwt_token) # Accounts with their names, from accounts.json and the API
+    if not registry:
+        logger.error("No accounts found. Exiting.")
+        return "No accounts found"
+
+    # Work out which accounts have complete data before fetching anything
+    valid_accounts = []
+    for account in registry:
+        account_id = account.get("account")
+        account_name = account.get("name")
 
-    if response.status_code != 200:
-        print(f"Failed to fetch accounts: {response.status_code} - {response.text}")
-        return
+        if not account_id or not account_name:
+            continue # Skip accounts with incomplete data
 
-    # Extract accounts from API response
-    response_json = response.json()
-    accounts = response_json.get("accounts", [])
+        valid_accounts.append((account_id, account_name, account.get("currency")))
 
-    # Initialize summary dictionary to store transaction counts per account
-    summary = {}
+    # Fetch the whole range for all accounts at once, then split each account's transactions into days in one pass
+    total = len(valid_accounts)
+    transactions_by_account, valid_accounts = fetch_valid_accounts(jwt_token, valid_accounts, start_date, end_date)
+    buckets_by_account = {account_id: bucket_by_valuta(transactions_by_account[account_id]) for account_id, _, _ in valid_accounts}
 
-    # Iterate over each account and fetch transactions for all
-    for account in accounts:
-        account_id = account.get("account")
-        account_name = account_mapping.get(account_id, "Unknown")
+    csv_rows = []
+    for date in days_in_range(start_date, end_date):
+        # Initialize summary dictionary to store transaction counts per account
+        summary = {}
+        for account_id, account_name, currency in valid_accounts:
+            transactions = buckets_by_account[account_id].get(date, [])
 
-        if not account_id or not account_name:
-            continue # Skip accounts with incomplete data
+            # Process transactions and generate summary
+            transaction_count = process_transactions(transactions, account_name, date)
+            summary[account_name] = transaction_count
+            csv_rows.append((date, account_name, currency, transaction_count))
 
-        # Fetch transactions for the account
-        transactions = fetch_transactions(jwt_token, account_id, date)
+        # Print the summarized transaction data output
+        summarize_transactions(summary, date)
 
-        # Process transactions and generate summary
-        transaction_count = process_transactions(transactions, account_name, date)
-        summary[account_name] = transaction_count
+    report_totals(transactions_by_account, valid_accounts, start_date, end_date, totals_path)
+    if csv_path:
+        write_daily_counts_csv(csv_rows, csv_path)
+    if len(valid_accounts) < total:
+        return f"{total - len(valid_accounts)} of {total} accounts failed"
 
-    # Print the summarized transaction data output
-    summarize_transactions(summary, date)
+def parse_args(argv=None):
+    """
+    Optional --from / --to range and --csv / --totals-csv output; with no arguments the summary covers yesterday.
+    """
+    parser = argparse.ArgumentParser(description="Summarize Bank Frick transactions per day.")
+    parser.add_argument("--from", dest="start_date", help="First day to summarize, YYYY-MM-DD (defaults to yesterday)")
+    parser.add_argument("--to", dest="end_date", help="Last day to summarize, YYYY-MM-DD (defaults to --from)")
+    parser.add_argument("--csv", dest="csv_path", help="Also save the per-day, per-account counts to this CSV file")
+    parser.add_argument("--totals-csv", dest="totals_path", help="Also save the per-entity, per-currency totals to this CSV file")
+    args = parser.parse_args(argv)
+    if args.start_date and args.end_date and args.start_date > args.end_date:
+        parser.error("--from can't be later than --to")
+    return args
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    main(args.start_date, args.end_date, args.csv_path, args.totals_path)
@@ -0,0 +1,143 @@
+import bankfrick_client
+import telemetry
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from datetime import datetime, timedelta
+from sync_state import load_fetched_windows, save_fetched_window
+
+# Configuration settings for the concurrent fetch engine
+MAX_CONCURRENT_FETCHES = 8  # Upper limit on requests in flight to the Bank Frick API at once
+WINDOW_DAYS = 7  # Long ranges are split into windows of this many days for backfills
+WINDOW_RETRIES = 2  # Times a failed window is tried again before giving up on it
+STAGE_AFTER_WINDOWS = 5  # Resumable syncs longer than this many windows are fetched and staged window by window, shorter ones in one request
+
+logger = telemetry.get_logger(__name__)
+
+def iter_accounts_concurrently(fetch_fn, jwt_token, account_ids, *fetch_args, max_workers=MAX_CONCURRENT_FETCHES):
+    """
+    Run fetch_fn(jwt_token, account_id, *fetch_args) for every account using a bounded worker pool,
+    yielding (account_id, result) as soon as each account finishes. Failed accounts yield None.
+    """
+    account_ids = [account_id for account_id in dict.fromkeys(account_ids) if account_id]  # Drop blanks and duplicates but keep order
+    if not account_ids:
+        return
+
+    workers = max(1, min(max_workers, len(account_ids)))  # No point spinning up more threads than accounts
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(fetch_fn, jwt_token, account_id, *fetch_args): account_id
+            for account_id in account_ids
+        }
+        for future in as_completed(futures):
+            account_id = futures.pop(future)  # Drop our reference so the result can be freed once the caller is done with it
+            try:
+                result = future.result()
+            except Exception as e:
+                # One bad account shouldn't sink the whole run, so log it and carry on with the rest
+                logger.error(f"Error fetching transactions for account {account_id}: {e}")
+                result = None
+            yield account_id, result
+
+def fetch_accounts_concurrently(fetch_fn, jwt_token, account_ids, *fetch_args, max_workers=MAX_CONCURRENT_FETCHES):
+    """
+    Run fetch_fn(jwt_token, account_id, *fetch_args) for every account using a bounded worker pool.
+    Returns a dict keyed by account ID holding exactly what fetch_fn returned for that account.
+    """
+    results = dict(iter_accounts_concurrently(fetch_fn, jwt_token, account_ids, *fetch_args, max_workers=max_workers))
+
+    # Hand results back in the same order the accounts were given so output stays predictable
+    return {account_id: results[account_id] for account_id in dict.fromkeys(account_ids) if account_id in results}
+
+def split_date_range(start_date, end_date, window_days=WINDOW_DAYS):
+    """
+    Split an inclusive YYYY-MM-DD range into consecutive windows of at most window_days days.
+    """
+    window_start = datetime.strptime(start_date, '%Y-%m-%d')
+    last_day = datetime.strptime(end_date, '%Y-%m-%d')
+    windows = []
+    while window_start <= last_day:
+        window_end = min(window_start + timedelta(days=window_days - 1), last_day)
+        windows.append((window_start.strftime('%Y-%m-%d'), window_end.strftime('%Y-%m-%d')))
+        window_start = window_end + timedelta(days=1)
+    return windows
+
+def iter_transaction_windows(jwt_token, date_ranges, window_days=WINDOW_DAYS, max_workers=MAX_CONCURRENT_FETCHES, retries=WINDOW_RETRIES,
+                             job=None, closed_through=None):
+    """
+    Fetch many accounts' date ranges as small windows in parallel, yielding (account_id, (start, end), TransactionRecords)
+    as each window arrives. date_ranges maps account ID -> (start_date, end_date).
+    A window that keeps failing after its retries is yielded with transactions set to None.
+    Only max_workers windows are in flight at once, so memory stays flat however long the backfill is.
+    With a sync job name, windows ending on or before closed_through are kept in the state database as they arrive
+    and reused by the next run if this one doesn't finish.
+    """
+    staged = {account_id: load_fetched_windows(job, account_id) for account_id in date_ranges} if job else {}
+    pending = [
+        (account_id, window)
+        for account_id, (start_date, end_date) in date_ranges.items()
+        for window in split_date_range(start_date, end_date, window_days)
+    ]
+    pending.reverse()  # Pop from the end so windows go out oldest first
+    attempts = {}
+
+    # Anything this run, or an unfinished earlier one, has already fetched doesn't need to go back to the API
+    uncached = []
+    for account_id, window in reversed(pending):
+        cached = staged.get(account_id, {}).get(window)
+        if cached is None:
+            cached = bankfrick_client.get_cached_transactions(account_id, *window)
+        if cached is not None:
+            yield account_id, window, cached
+        else:
+            uncached.append((account_id, window))
+    pending = uncached[::-1]
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        in_flight = {}
+
+        def submit_next():
+            account_id, window = pending.pop()
+            future = executor.submit(bankfrick_client.request_transactions, jwt_token, account_id, *window)
+            in_flight[future] = (account_id, window)
+
+        while pending and len(in_flight) < max_workers:
+            submit_next()
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                account_id, window = in_flight.pop(future)
+                try:
+                    transactions = future.result()
+                except Exception as e:
+                    attempts[(account_id, window)] = attempts.get((account_id, window), 0) + 1
+                    if attempts[(account_id, window)] <= retries:
+                        logger.warning(f"Retrying window {window[0]} to {window[1]} for account {account_id}: {e}")
+                        pending.append((account_id, window))
+                    else:
+                        logger.error(f"Giving up on window {window[0]} to {window[1]} for account {account_id}: {e}")
+                        yield account_id, window, None
+                else:
+                    if job and closed_through and window[1] <= closed_through:
+                        save_fetched_window(job, account_id, *window, transactions)
+                    yield account_id, window, transactions
+
+                if pending:
+                    submit_next()
+
+def fetch_resumable(jwt_token, account_id, start_date, end_date, job, closed_through, window_days=WINDOW_DAYS, max_workers=MAX_CONCURRENT_FETCHES):
+    """
+    Fetch one account's range for a sync job. Ranges up to STAGE_AFTER_WINDOWS windows (a normal month-to-date run)
+    are fetched in one request. Longer backfills are fetched as parallel windows, keeping each window of closed days
+    in the state database as it arrives so a rerun after a crash only fetches the windows still missing.
+    Returns None if the range, or any window of it, couldn't be fetched.
+    """
+    if len(split_date_range(start_date, end_date, window_days)) <= STAGE_AFTER_WINDOWS:
+        return bankfrick_client.fetch_transactions(jwt_token, account_id, start_date, end_date)
+
+    windows = {}
+    for _, window, transactions in iter_transaction_windows(jwt_token, {account_id: (start_date, end_date)}, window_days, max_workers,
+                                                            job=job, closed_through=closed_through):
+        if transactions is None:
+            return None  # The windows that did arrive stay staged for the next run
+        windows[window] = transactions
+    return [transaction for window in sorted(windows) for transaction in windows[window]]
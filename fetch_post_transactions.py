@@ -1,96 +1,248 @@
-import requests
-import json
-from datetime import datetime
+import queue
+import threading
+import bankfrick_client
+import telemetry
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from bankfrick_connect import get_jwt_token
-
-
-BASE_URL = "https://olb.bankfrick.li/webapi/v2" # Configuration settings for connecting to the Bank Frick API
-TRANSACTIONS_ENDPOINT = "/transactions"
-IPLICIT_API_URL = "https://api.iplicit.com/transactions"
+from account_registry import get_registry
+from fetch_engine import fetch_resumable
+from iplicit_connector import BATCH_SIZE, MAX_IN_FLIGHT, build_transaction_payload, send_transaction, summarize_post_results
+from sync_state import incremental_start_date, record_synced
+from posting_ledger import filter_unposted, mark_posted
+from preflight import run_preflight
+from transaction_record import normalize
+
+IPLICIT_API_URL = "https://api.iplicit.com/transactions" # Configuration settings for connecting to the Iplicit API
 IPLICIT_API_KEY = "Placeholder"
+SYNC_JOB = "post"  # Name this script's checkpoints are stored under in the sync state database
+FETCH_WORKERS = 4  # Accounts fetched from Bank Frick at once
+POST_WORKERS = MAX_IN_FLIGHT  # Batches being posted at once; their payloads share one pool of MAX_IN_FLIGHT POSTs
+QUEUE_SIZE = 8  # Items allowed to wait between stages before the stage feeding them is held back
 
-# Account mapping: Links account IDs to their human-readable names and currencies
-account_mapping = {
+_DONE = object()  # Tells a pipeline stage there's nothing more coming
 
-}
+logger = telemetry.get_logger(__name__)
 
 def fetch_transactions(jwt_token, account_id, start_date, end_date):
     """
     Fetch transactions for a specific account and date range.
+    Returns None rather than [] on failure so a failed fetch isn't mistaken for a quiet account.
     """
-    url = f"{BASE_URL}{TRANSACTIONS_ENDPOINT}?accountId={account_id}&fromDate={start_date}&toDate={end_date}"
-    headers = {
-        "Authorization": f"Bearer {jwt_token}",
-        "Accept": "application/json",
-    }
-
-    print(f"Fetching transactions for account {account_id}...")
-    response = requests.get(url, headers=headers)
+    return bankfrick_client.fetch_transactions(jwt_token, account_id, start_date, end_date)
 
-    if response.status_code == 200:
-        print("Transactions fetched successfully.")
-        response_json = response.json()
-        return response_json.get("transactions", []) if isinstance(response_json, dict) else response_json
-    else:
-        print(f"Failed to fetch transactions for {account_id}: {response.status_code} - {response.text}")
-        return []
-
-def post_transaction_to_iplicit(api_key, payload):
+class AccountProgress:
+    """
+    Posting progress for one account while its batches are spread over the post workers.
+    """
+    def __init__(self, account_info, transactions, skipped, batches):
+        self.account_info = account_info
+        self.transactions = transactions
+        self.skipped = skipped
+        self.batches_left = batches
+        self.results = []
+        self.lock = threading.Lock()
+
+    def add_results(self, batch_results):
+        """
+        Collect a finished batch's results. Returns True for the account's last batch.
+        """
+        with self.lock:
+            self.results.extend(batch_results)
+            self.batches_left -= 1
+            return self.batches_left == 0
+
+def build_payloads(account_info, pending):
+    """
+    Turn (fingerprint, transaction) pairs into Iplicit payloads for an account.
+    """
+    legal_entity = account_info.get("iplicit_legal_entity", "")
+    payloads = []
+    for _, transaction in pending:
+        record = normalize(transaction)
+        payloads.append(build_transaction_payload( # Build payload for Iplicit API
+            legal_entity,
+            account_info["bank_account"],
+            account_info["code"],
+            record.valuta,
+            record.signed_amount or 0,
+            record.creditor_name or "N/A",
+            reference=record.type or "N/A",
+        ))
+    return payloads
+
+def finish_account(progress, closed_through, failed_accounts):
+    """
+    Report an account's posting results and move its checkpoint on. Accounts with failed posts go in failed_accounts.
+    """
+    account_info = progress.account_info
+    totals = summarize_post_results(progress.results)
+    logger.info(f"{account_info['name']}: posted {totals['succeeded']} of {totals['total']} new transactions, {totals['failed']} failed, {progress.skipped} skipped as already posted.")
+
+    # Only move the checkpoint up to the day before the earliest failure so failed posts get retried
+    synced_through = closed_through
+    failed_dates = [result["payload"]["TransactionDate"] for result in progress.results if not result["success"] and result["payload"].get("TransactionDate")]
+    if failed_dates:
+        failed_accounts.add(account_info["account"])
+        earliest_failure = datetime.strptime(min(failed_dates)[:10], '%Y-%m-%d')
+        synced_through = min(synced_through, (earliest_failure - timedelta(days=1)).strftime('%Y-%m-%d'))
+    record_synced(SYNC_JOB, account_info["account"], progress.transactions, synced_through)
+
+def fetch_worker(jwt_token, account_queue, fetched_queue, month_start, end_date, closed_through, stop):
+    """
+    Fetch stage: take accounts off account_queue and hand (account_info, transactions) to the transform stage.
+    Blocks when the transform stage is behind, so fetched transactions never pile up.
+    Stops taking accounts once the stop event is set.
     """
-    Post a single transaction to the Iplicit API.
+    while True:
+        account_info = account_queue.get()
+        if account_info is _DONE or stop.is_set():
+            fetched_queue.put(_DONE)
+            return
+        account_id = account_info["account"]
+        try:
+            start_date = incremental_start_date(SYNC_JOB, account_id, month_start) # Pick up from where the last run stopped
+            transactions = fetch_resumable(jwt_token, account_id, start_date, end_date, SYNC_JOB, closed_through) # Reuses windows an interrupted run already fetched
+        except Exception as e:
+            logger.error(f"Error fetching transactions for account {account_id}: {e}")
+            transactions = None
+        fetched_queue.put((account_info, transactions))
+
+def transform_stage(fetched_queue, post_queue, fetch_workers, closed_through, stop, failed_accounts):
     """
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
+    Transform stage: drop already posted transactions, build payloads and queue them for posting in batches.
+    If it fails, the fetch workers are stopped and drained so none is left blocked on the full queue.
+    """
+    fetchers_left = fetch_workers
+    try:
+        while fetchers_left:
+            item = fetched_queue.get()
+            if item is _DONE:
+                fetchers_left -= 1
+                continue
+            transform_account(*item, post_queue, closed_through, failed_accounts)
+    finally:
+        stop.set()
+        while fetchers_left:
+            if fetched_queue.get() is _DONE:
+                fetchers_left -= 1
+
+def transform_account(account_info, transactions, post_queue, closed_through, failed_accounts):
+    """
+    Filter one fetched account against the ledger and queue its payloads for posting in batches.
+    """
+    account_id = account_info["account"]
 
-    print(f"Posting payload: {json.dumps(payload, indent=4)}")
-    response = requests.post(IPLICIT_API_URL, headers=headers, json=payload)
+    if transactions is None:
+        logger.warning(f"Skipping {account_info['name']} as its transactions could not be fetched.")
+        failed_accounts.add(account_id)
+        return
 
-    print(f"Response Status Code: {response.status_code}")
-    print(f"Response Body: {response.text}")
+    if not transactions:
+        logger.info(f"No transactions found for {account_info['name']}.")
+        record_synced(SYNC_JOB, account_id, transactions, closed_through)
+        return
 
-    if response.status_code in (200, 201):
-        print(f"Successfully posted transaction: {payload.get('Description', 'N/A')}")
-    else:
-        print(f"Error posting transaction: {response.text}")
+    # Drop anything an earlier run already posted so Iplicit doesn't get duplicates
+    with telemetry.stage("filter"):
+        pending, skipped = filter_unposted(account_id, transactions)
+    if skipped:
+        logger.info(f"Skipping {skipped} transactions for {account_info['name']} that were already posted.")
+
+    payloads = build_payloads(account_info, pending)
+    batches = [(pending[first:first + BATCH_SIZE], payloads[first:first + BATCH_SIZE]) for first in range(0, len(pending), BATCH_SIZE)]
+    progress = AccountProgress(account_info, transactions, skipped, len(batches))
+    if not batches:
+        finish_account(progress, closed_through, failed_accounts)
+        return
+    for entries, batch_payloads in batches:
+        post_queue.put((progress, entries, batch_payloads))  # Blocks while the post workers are behind
+
+def post_worker(post_queue, post_pool, closed_through, failed_accounts):
+    """
+    Post stage: send queued batches to Iplicit, recording each batch in the ledger as soon as it's done
+    so a crash part way through doesn't re-post it, and checkpoint an account after its last batch.
+    A batch's payloads are posted through post_pool, so up to MAX_IN_FLIGHT POSTs are in flight
+    within one batch or spread over several accounts' batches.
+    """
+    while True:
+        item = post_queue.get()
+        if item is _DONE:
+            return
+        progress, entries, payloads = item
+        try:
+            with telemetry.stage("post"):
+                results = list(post_pool.map(lambda payload: send_transaction(IPLICIT_API_KEY, payload, IPLICIT_API_URL), payloads))
+            succeeded = [entry for entry, result in zip(entries, results) if result["success"]]
+            mark_posted(progress.account_info["account"], succeeded)
+            telemetry.metrics.increment("transactions_posted", len(succeeded))
+            telemetry.metrics.increment("transactions_failed", len(results) - len(succeeded))
+            for result in results:
+                if not result["success"]:
+                    logger.error(f"Failed to post transaction {result['payload'].get('Reference')}: {result['status']} - {result['error']}")
+            if progress.add_results(results):
+                finish_account(progress, closed_through, failed_accounts)
+        except Exception as e:
+            # Keep the worker alive so the queue keeps draining; the account's checkpoint stays put and the next run retries it
+            logger.error(f"Error posting a batch for {progress.account_info['name']}: {e}")
+            failed_accounts.add(progress.account_info["account"])
 
 def process_and_post_transactions(jwt_token):
     """
     Fetch, process, and post transactions to Iplicit for the current month.
+    Fetching, building payloads and posting run as a pipeline with bounded queues between the stages,
+    so Bank Frick and Iplicit are both kept busy and a slow side holds the other back instead of memory filling up.
+    Returns (accounts that failed, accounts processed).
     """
-    start_date = datetime.now().replace(day=1).strftime('%Y-%m-%d') # Start of Month
+    month_start = datetime.now().replace(day=1).strftime('%Y-%m-%d') # Start of Month, used on the first run
     end_date = datetime.now().strftime('%Y-%m-%d')
-
-    for account_id, account_info in account_mapping.items():   # Iterate through each account and process thier  transactions
-        transactions = fetch_transactions(jwt_token, account_id, start_date, end_date)
-
-        if not transactions:
-            print(f"No transactions found for {account_info['name']}.")
-            continue
-
-        for transaction in transactions:
-            payload = { # Build payload for Iplicit API
-                "LegalEntity": "",
-                "BankAccount": account_info["bank_account"],
-                "Code": account_info["code"],
-                "TransactionDate": transaction.get("valuta"),
-                "Amount": -abs(transaction.get("amount", 0)) if transaction.get("direction") == "outgoing" else abs(transaction.get("amount", 0)),
-                "Reference": transaction.get("type", "N/A"),
-                "Description": transaction.get("creditor", {}).get("name", "N/A")
-            }
-            post_transaction_to_iplicit(IPLICIT_API_KEY, payload)
+    closed_through = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d') # Today can still change so only yesterday counts as done
+
+    accounts = get_registry(jwt_token).postable_accounts() # Each account set up for Iplicit
+    changed = set(run_preflight(SYNC_JOB, jwt_token).changed_accounts([account_info["account"] for account_info in accounts], closed_through))
+    accounts = [account_info for account_info in accounts if account_info["account"] in changed] # Quiet accounts have nothing new to post
+    fetch_workers = max(1, min(FETCH_WORKERS, len(accounts)))
+    account_queue = queue.Queue()
+    for account_info in accounts:
+        account_queue.put(account_info)
+    for _ in range(fetch_workers):
+        account_queue.put(_DONE)
+    fetched_queue = queue.Queue(maxsize=QUEUE_SIZE)
+    post_queue = queue.Queue(maxsize=QUEUE_SIZE)
+    stop = threading.Event()
+    failed_accounts = set()  # Added to from every stage; set.add is atomic so the workers can share it
+
+    fetchers = [threading.Thread(target=fetch_worker, args=(jwt_token, account_queue, fetched_queue, month_start, end_date, closed_through, stop), daemon=True)
+                for _ in range(fetch_workers)]
+    post_pool = ThreadPoolExecutor(max_workers=max(1, MAX_IN_FLIGHT))
+    posters = [threading.Thread(target=post_worker, args=(post_queue, post_pool, closed_through, failed_accounts), daemon=True)
+               for _ in range(max(1, POST_WORKERS))]
+    for thread in fetchers + posters:
+        thread.start()
+    try:
+        transform_stage(fetched_queue, post_queue, fetch_workers, closed_through, stop, failed_accounts)
+    finally:
+        # Let the post workers drain what's queued and stop; the fetchers have all finished by now
+        for _ in posters:
+            post_queue.put(_DONE)
+        for thread in fetchers + posters:
+            thread.join()
+        post_pool.shutdown()
+    return len(failed_accounts), len(accounts)
 
 def main():
     """
     Main function to fetch transactions and post to Iplicit.
+    Returns None if every account was posted, otherwise what failed, for the scheduler's health check.
     """
     jwt_token = get_jwt_token() # Retrieve JWT token for Bank Frick API from bankfrick_connect
     if not jwt_token:
-        print("Failed to retrieve JWT token. Exiting.")
-        return
+        logger.error("Failed to retrieve JWT token. Exiting.")
+        return "Failed to retrieve JWT token"
 
-    process_and_post_transactions(jwt_token)
+    failed, total = process_and_post_transactions(jwt_token)
+    if failed:
+        return f"{failed} of {total} accounts failed"
 
 if __name__ == "__main__":
     main()
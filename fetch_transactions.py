@@ -1,54 +1,51 @@
-import requests
+import bankfrick_client
 import csv
 import json
+import multiprocessing
 import os
+import telemetry
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
 from datetime import datetime, timedelta
 from bankfrick_connect import get_jwt_token  # This pulls in from 1st file so Dependency remains intact
+from account_registry import get_registry
+from fetch_engine import fetch_resumable, iter_accounts_concurrently, iter_transaction_windows, split_date_range
+from csv_export import CSV_HEADER, create_csv_file, transaction_to_row, update_manifest, write_account_csv, write_rows_streaming
+from preflight import run_preflight
+from sync_state import incremental_start_date, later_of, latest_transaction, record_synced, record_synced_latest
+from transaction_record import normalize_all
 
-# Configuration settings for connecting to the Bank Frick API
-BASE_URL = "https://olb.bankfrick.li/webapi/v2"
-TRANSACTIONS_ENDPOINT = "/transactions"
+# Configuration settings
 OUTPUT_DIR = "/workspaces/15932103/Project/output/"  # Output directory for CSV files
+SYNC_JOB = "export"  # Name this script's checkpoints are stored under in the sync state database
+EXPORT_MODE = "per_account"  # "per_account" (one file per account), "single" (one file per run), "per_currency" or "parallel"
+EXPORT_PROCESSES = None  # Worker processes for the "parallel" export, None uses one per CPU
+PARALLEL_PARTITION = "account"  # "parallel" export batches: "account" (one file per account) or "month" (one per account per month, spreading big accounts over more cores)
+COMPRESS_OUTPUT = False  # Gzip the "single" / "per_currency" exports
+BACKFILL_START_DATE = None  # Set to YYYY-MM-DD to backfill accounts with no checkpoint from this date instead of the last week
+STREAM_JSON = False  # For "single" / "per_currency" exports: write rows as each response is parsed, one account at a time, keeping memory flat on huge backfills
 
-# Account mapping: Links account IDs to their human-readable names and currencies
-account_mapping = {
-
-}
+logger = telemetry.get_logger(__name__)
 
 def fetch_transactions(jwt_token, account_id, start_date, end_date):
     """
     Fetch transactions for a specific account and date range.
     """
-    url = f"{BASE_URL}{TRANSACTIONS_ENDPOINT}?accountId={account_id}&fromDate={start_date}&toDate={end_date}"
-    headers = {
-        "Authorization": f"Bearer {jwt_token}",
-        "Accept": "application/json",
-    }
-
-    print(f"Fetching transactions for account {account_id} from {start_date} to {end_date}...")
-    response = requests.get(url, headers=headers)
-
-    if response.status_code == 200:
-        print(f"Transactions fetched successfully for account {account_id}.")
-        response_json = response.json()
-        if isinstance(response_json, dict) and "transactions" in response_json:
-            return response_json
-        elif isinstance(response_json, list):
-            return {"transactions": response_json}
-        else:
-            print(f"Unexpected response format: {response_json}")
-            return {"transactions": []}
-    else:
-        print(f"Failed to fetch transactions for account {account_id}: {response.status_code} - {response.text}")
-        return {"transactions": []}
+    transactions = bankfrick_client.fetch_transactions(jwt_token, account_id, start_date, end_date)
+    if transactions is None:
+        return {"transactions": [], "error": True}  # Flag the failure so the sync checkpoint isn't moved on
+    return {"transactions": transactions}
 
 
-def save_transactions_to_csv(filtered_transactions, account_name, currency):
+def sanitize_file_name(account_name):
+    return account_name.replace("/", "_").replace(" ", "_")
+
+def save_transactions_to_csv(filtered_transactions, account_name, currency, overwrite=False):
     """
     Save the filtered transactions into a CSV file for the given account and currency.
+    An earlier file from the same day is kept and this one numbered after it, unless overwrite is set.
     """
     if not filtered_transactions:
-        print(f"No transactions to save for {account_name} in {currency}.")
+        logger.info(f"No transactions to save for {account_name} in {currency}.")
         return
 
     # Make sures OUTPUT_DIR exists so it can actually output, otherwise it'll  spit out can't find error
@@ -56,96 +53,281 @@ def save_transactions_to_csv(filtered_transactions, account_name, currency):
         os.makedirs(OUTPUT_DIR)
 
     # Make file name sanitized and create file path so it can output correctly
-    sanitized_account_name = account_name.replace("/", "_").replace(" ", "_")
-    output_file_name = f"{sanitized_account_name}_{datetime.now().strftime('%Y-%m-%d')}.csv"
-    output_file_path = os.path.join(OUTPUT_DIR, output_file_name)
+    sanitized_account_name = sanitize_file_name(account_name)
+    output_file, output_file_path = create_csv_file(OUTPUT_DIR, f"{sanitized_account_name}_{datetime.now().strftime('%Y-%m-%d')}", ".csv", overwrite=overwrite)
 
     # Write the transactions to CSV file
-    with open(output_file_path, mode='w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        writer.writerow(["Date", "Description", "Amount", "Currency", "Debitor Account", "Creditor Name", "Merchant Name"])
+    names_by_number = get_registry().names_by_number
+    with output_file:
+        writer = csv.writer(output_file)
+        writer.writerow(CSV_HEADER)
 
         for transaction in filtered_transactions:
-            merchant_name = transaction.get("creditor", {}).get("name")
-            debitor_account = transaction.get("debitor", {}).get("accountNumber")
-            debitor_name = account_mapping.get(debitor_account, "Unknown")
-
-            # Adjust the amount for incoming and outgoing transactions
-            direction = transaction.get("direction")
-            amount = transaction.get("amount")
-            if direction == "outgoing":
-                amount = -abs(amount)  # Ensure it's negative for debits
-                description = f"Payment to {merchant_name}"
-            elif direction == "incoming":
-                amount = abs(amount)  # Ensure it's positive for credits
-                description = f"Received from {debitor_name}"
-            else:
-                description = "Unknown transaction"
-
             # Write the transaction details to the CSV
-            writer.writerow([
-                transaction.get("valuta"),
-                description,
-                amount,
-                transaction.get("currency"),
-                debitor_name,
-                transaction.get("creditor", {}).get("name"),
-                merchant_name
-            ])
+            writer.writerow(transaction_to_row(transaction, names_by_number))
 
-    print(f"Saved transactions to {output_file_path}")
+    logger.info(f"Saved transactions to {output_file_path}")
 
 
 def filter_transactions(transactions, account_id):
     """
     Filter transactions to only include those associated with the given account ID.
+    Returns TransactionRecords, parsing the API dicts on the way through if needed.
+    """
+    return [record for record in normalize_all(transactions) if record.debitor_account == account_id]
+
+def iter_export_rows(jwt_token, accounts, end_date, completed_accounts):
+    """
+    Yield (currency, row) pairs for every account as its transactions arrive from the fetcher.
+    accounts is a list of (account_id, currency, start_date). Long ranges are fetched as parallel windows,
+    and accounts whose windows all came back are appended to completed_accounts as (account_id, latest),
+    with latest as from latest_transaction.
     """
-    return [
-        transaction for transaction in transactions
-        if transaction.get("debitor", {}).get("accountNumber") == account_id
-    ]
+    registry = get_registry()
+    date_ranges = {account_id: (start_date, end_date) for account_id, _, start_date in accounts}
+    currencies = {account_id: currency for account_id, currency, _ in accounts}
+    windows_left = {account_id: len(split_date_range(start_date, end_date)) for account_id, (start_date, end_date) in date_ranges.items()}
+    failed_accounts = set()
+    synced = {}  # account_id -> latest; only the newest transaction is kept, for the checkpoint's transaction ID
+
+    for account_id, window, transactions in iter_transaction_windows(jwt_token, date_ranges, job=SYNC_JOB, closed_through=end_date):
+        windows_left[account_id] -= 1
+        if transactions is None:
+            failed_accounts.add(account_id)  # Leave the checkpoint alone so the next run tries these days again
+        else:
+            account_name = registry.name_of(account_id, account_id)
+            for record in filter_transactions(transactions, account_id):
+                yield record.currency or currencies[account_id], transaction_to_row(record, registry.names_by_number) + [account_name]
+            synced[account_id] = later_of(synced.get(account_id, (None, None)), latest_transaction(transactions, end_date))
+
+        if windows_left[account_id] == 0:
+            latest = synced.pop(account_id, (None, None))
+            if account_id not in failed_accounts:
+                completed_accounts.append((account_id, latest))
+
+def iter_export_rows_streamed(jwt_token, accounts, end_date, completed_accounts):
+    """
+    Like iter_export_rows, but parses each account's responses as they download and writes rows straight through,
+    so no account's transactions are ever held in memory. Accounts are fetched one after another.
+    """
+    registry = get_registry()
+    for account_id, currency, start_date in accounts:
+        account_name = registry.name_of(account_id, account_id)
+        latest = (None, None)  # Only the newest transaction is kept, for the checkpoint's transaction ID
+        try:
+            for record in bankfrick_client.iter_transactions(jwt_token, account_id, start_date, end_date):
+                latest = later_of(latest, latest_transaction((record,), end_date))
+                if record.debitor_account == account_id:
+                    yield record.currency or currency, transaction_to_row(record, registry.names_by_number) + [account_name]
+        except bankfrick_client.FetchError as e:
+            logger.error(str(e))  # Leave the checkpoint alone so the next run tries these days again
+            continue
+        completed_accounts.append((account_id, latest))
+
+def export_streaming(jwt_token, accounts, end_date):
+    """
+    Stream every account's transactions into one consolidated file, or one file per currency.
+    Files are named after the dates they cover, and a rerun over the same dates (e.g. for the accounts that failed)
+    writes new numbered files instead of truncating the rows of accounts that were already checkpointed.
+    Returns how many accounts failed.
+    """
+    if not accounts:
+        logger.info("No transactions to save.")
+        return 0
+    completed_accounts = []
+    iter_rows = iter_export_rows_streamed if STREAM_JSON else iter_export_rows
+    start_date = min(start_date for _, _, start_date in accounts)
+    counts = write_rows_streaming(
+        iter_rows(jwt_token, accounts, end_date, completed_accounts),
+        OUTPUT_DIR,
+        f"transactions_{start_date}_{end_date}",
+        compress=COMPRESS_OUTPUT,
+        partition_by_currency=(EXPORT_MODE == "per_currency"),
+    )
+    for path, row_count in counts.items():
+        logger.info(f"Saved {row_count} transactions to {path}")
+    if not counts:
+        logger.info("No transactions to save.")
+
+    # Only move checkpoints on once the files are safely closed
+    for account_id, latest in completed_accounts:
+        record_synced_latest(SYNC_JOB, account_id, latest, end_date)
+    return len(accounts) - len(completed_accounts)
+
+def partition_transactions(transactions, start_date, end_date):
+    """
+    Split an account's TransactionRecords into (partition_start, partition_end, records) batches for the parallel export.
+    With PARALLEL_PARTITION = "month" each calendar month of the range is its own batch; transactions dated outside
+    the range go in the nearest one.
+    """
+    if PARALLEL_PARTITION != "month" or not transactions:
+        return [(start_date, end_date, transactions)]
+
+    by_month = {}
+    for record in transactions:
+        day = min(max(record.day or end_date, start_date), end_date)
+        by_month.setdefault(day[:7], []).append(record)
+
+    partitions = []
+    for month, month_transactions in sorted(by_month.items()):
+        month_start = datetime.strptime(f"{month}-01", '%Y-%m-%d')
+        month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        partitions.append((max(start_date, month_start.strftime('%Y-%m-%d')), min(end_date, month_end.strftime('%Y-%m-%d')), month_transactions))
+    return partitions
+
+def export_parallel(jwt_token, accounts, end_date):
+    """
+    Fetch every account as in the per-account export, but hand each account's (or account-month's) batch to a process pool
+    that filters, formats and writes it, so the CPU-bound part scales with cores. Files are named after the account and the
+    dates they cover rather than the run date, so the same range always gives the same files, and each run's files are
+    merged into manifest_<end_date>.json. An account's checkpoint moves on once all its files are written.
+    Returns how many accounts failed.
+    """
+    registry = get_registry()
+    start_dates = {account_id: start_date for account_id, _, start_date in accounts}
+    currencies = {account_id: currency for account_id, currency, _ in accounts}
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    futures = {}  # future -> (account_id, partition_start, partition_end)
+    parts_left = {}
+    synced = {}  # account_id -> latest, kept until the account's files are written, for the checkpoint
+    failed_accounts = set()
+    synced_accounts = []
+    entries = []
+
+    def collect(done):
+        """
+        Record finished batches, and checkpoint each account once all its files are written.
+        """
+        for future in done:
+            account_id, partition_start, partition_end = futures.pop(future)
+            try:
+                entry = future.result()
+            except Exception as e:
+                logger.error(f"Error writing transactions for account {account_id} from {partition_start} to {partition_end}: {e}")
+                failed_accounts.add(account_id)
+                entry = None
+            if entry:
+                entry.update(account=account_id, account_name=registry.name_of(account_id, account_id), currency=currencies[account_id],
+                             start_date=partition_start, end_date=partition_end)
+                entries.append(entry)
+                logger.info(f"Saved {entry['rows']} transactions to {os.path.join(OUTPUT_DIR, entry['file'])}")
+
+            parts_left[account_id] -= 1
+            if parts_left[account_id] == 0:
+                latest = synced.pop(account_id)
+                if account_id not in failed_accounts:
+                    record_synced_latest(SYNC_JOB, account_id, latest, end_date)
+                    synced_accounts.append(account_id)
+
+    # Spawned rather than forked: the fetcher threads and the HTTP pool's locks are live in this process,
+    # and a forked child can inherit a lock some other thread was holding
+    with ProcessPoolExecutor(max_workers=EXPORT_PROCESSES, mp_context=multiprocessing.get_context("spawn")) as pool:
+        # The pool starts writing the first accounts while the rest are still being fetched
+        for account_id, transactions in iter_accounts_concurrently(
+            lambda token, account_id: fetch_resumable(token, account_id, start_dates[account_id], end_date, SYNC_JOB, end_date),
+            jwt_token, list(start_dates)
+        ):
+            if transactions is None:
+                continue  # Leave the checkpoint alone so the next run tries these days again
+            account_name = registry.name_of(account_id, account_id)
+            partitions = partition_transactions(transactions, start_dates[account_id], end_date)
+            synced[account_id] = latest_transaction(transactions, end_date)
+            parts_left[account_id] = len(partitions)
+            for partition_start, partition_end, batch in partitions:
+                path = os.path.join(OUTPUT_DIR, f"{sanitize_file_name(account_name)}_{account_id}_{partition_start}_{partition_end}.csv")
+                future = pool.submit(write_account_csv, path, batch, account_id, registry.names_by_number)
+                futures[future] = (account_id, partition_start, partition_end)
+
+            # Checkpoint whatever has finished writing so far instead of holding it until every account is fetched
+            done, _ = wait(futures, timeout=0, return_when=FIRST_COMPLETED)
+            collect(done)
+
+        with telemetry.stage("write"):
+            collect(as_completed(list(futures)))
+
+    if entries:
+        manifest_path = os.path.join(OUTPUT_DIR, f"manifest_{end_date}.json")
+        update_manifest(manifest_path, entries)
+        logger.info(f"Listed {len(entries)} files in {manifest_path}")
+    else:
+        logger.info("No transactions to save.")
+    return len(accounts) - len(synced_accounts)
+
+def export_per_account(jwt_token, registry, accounts, end_date):
+    """
+    Save each account to its own file as soon as it arrives. Returns how many accounts failed.
+    """
+    start_dates = {account_id: start_date for account_id, _, start_date in accounts}
+    currencies = {account_id: currency for account_id, currency, _ in accounts}
+    failed = 0
+
+    # Fetch transactions for every account from its own checkpoint in parallel, saving and checkpointing each account
+    # as soon as it arrives so a run that stops part way through leaves only the remaining accounts for the next one
+    for account_id, transactions in iter_accounts_concurrently(
+        lambda token, account_id: fetch_resumable(token, account_id, start_dates[account_id], end_date, SYNC_JOB, end_date),
+        jwt_token, list(start_dates)
+    ):
+        if transactions is None:
+            failed += 1
+            continue  # Leave the checkpoint alone so the next run tries these days again
+        currency = currencies[account_id]
+
+        with telemetry.stage("filter"):
+            filtered_transactions = filter_transactions(transactions, account_id) # Filter and save the transactions to a CSV file
+        with telemetry.stage("write"):
+            save_transactions_to_csv(filtered_transactions, registry.name_of(account_id), currency)
+        record_synced(SYNC_JOB, account_id, transactions, end_date)
+    return failed
 
 def main():
     """
     Main script to fetch and save transactions for all accounts grouped by currency.
+    Returns None if every account was exported, otherwise what failed, for the scheduler's health check.
     """
     jwt_token = get_jwt_token() # Obtain a JWT token using my earlier Bank Frick connection script
     if not jwt_token:
-        print("Failed to retrieve JWT token. Exiting.")
-        return
+        logger.error("Failed to retrieve JWT token. Exiting.")
+        return "Failed to retrieve JWT token"
 
     end_date = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')  # Yesterday
-    start_date = (datetime.now() - timedelta(days=8)).strftime('%Y-%m-%d')  # 1 week before yesterday
-
-    accounts_endpoint = f"{BASE_URL}/accounts"  # Fetch the list of accounts available from the API
-    headers = {
-        "Authorization": f"Bearer {jwt_token}",
-        "Accept": "application/json",
-    }
-    print("Fetching account list...")
-    response = requests.get(accounts_endpoint, headers=headers)
-
-    if response.status_code != 200:
-        print(f"Failed to fetch accounts: {response.status_code} - {response.text}")
-        return
+    default_start_date = BACKFILL_START_DATE or (datetime.now() - timedelta(days=8)).strftime('%Y-%m-%d')  # 1 week before yesterday, used on the first run
 
-    response_json = response.json()
-    accounts = response_json.get("accounts", [])
+    registry = get_registry(jwt_token) # Accounts with their names, from accounts.json and the API
+    if not registry:
+        logger.error("No accounts found. Exiting.")
+        return "No accounts found"
 
-    for account in accounts: # Iterate through the accounts and fetch transactions for each one
+    valid_accounts = []
+    for account in registry: # Iterate through the accounts and keep the ones with complete data
         account_id = account.get("account")
-        account_name = account.get("customer")
+        account_name = account.get("name")
         currency = account.get("currency")
 
         if not account_id or not account_name or not currency:
             continue
 
-        transactions_response = fetch_transactions(jwt_token, account_id, start_date, end_date) # Fetch transactions for the account within the date range
-        transactions = transactions_response.get("transactions", [])
+        # Only fetch what's new since the last successful run for this account
+        start_date = incremental_start_date(SYNC_JOB, account_id, default_start_date)
+        if start_date > end_date:
+            logger.info(f"Account {account_id} is already synced up to {end_date}.")
+            continue
 
+        valid_accounts.append((account_id, currency, start_date))
 
-        filtered_transactions = filter_transactions(transactions, account_id) # Filter and save the transactions to a CSV file
-        save_transactions_to_csv(filtered_transactions, account_mapping.get(account_id, "Unknown"), currency)
+    # One /accounts call to find the accounts that haven't moved, which only need their checkpoints moving on
+    if valid_accounts:
+        changed = set(run_preflight(SYNC_JOB, jwt_token).changed_accounts([account_id for account_id, _, _ in valid_accounts], end_date))
+        valid_accounts = [account for account in valid_accounts if account[0] in changed]
+
+    if EXPORT_MODE in ("single", "per_currency"):
+        failed = export_streaming(jwt_token, valid_accounts, end_date)
+    elif EXPORT_MODE == "parallel":
+        failed = export_parallel(jwt_token, valid_accounts, end_date)
+    else:
+        failed = export_per_account(jwt_token, registry, valid_accounts, end_date)
+    if failed:
+        return f"{failed} of {len(valid_accounts)} accounts failed"
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,268 @@
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+import telemetry
+from telemetry import metrics
+
+# Configuration settings for the shared HTTP connection pool
+POOL_CONNECTIONS = 4  # Number of different hosts to keep pools for (Bank Frick + Iplicit + spare)
+POOL_MAXSIZE = 16  # Keep-alive connections kept open per host, should be >= the number of worker threads
+CONNECT_TIMEOUT = 10  # Seconds to wait for the TCP/TLS connection
+READ_TIMEOUT = 60  # Seconds to wait for the server to send a response
+
+# Retry and rate limit settings
+MAX_RETRIES = 4  # Extra attempts after the first one fails with a retryable error
+BACKOFF_BASE = 0.5  # Seconds, doubled on every attempt before jitter is applied
+BACKOFF_MAX = 30  # Longest we'll ever sleep between attempts
+RETRY_STATUSES = {429, 500, 502, 503, 504}  # Worth another go for GETs
+POST_RETRY_STATUSES = {429, 503}  # For POSTs only retry when the server clearly didn't process the request
+DEFAULT_REQUESTS_PER_SECOND = None  # Limit for hosts not in RATE_LIMITS, None leaves them unlimited
+RATE_LIMITS = {"olb.bankfrick.li": 10}  # Host -> requests per second; only Bank Frick limits its API, Iplicit isn't held back
+MAX_REPLACED_TOKENS = 16  # Rejected tokens remembered so callers still holding them get the current one
+
+_session = None
+_session_lock = threading.Lock()
+_token_refreshers = {}  # URL prefix -> function that swaps a rejected token for a fresh one
+_replaced_tokens = {}  # Rejected token -> the current token, oldest first
+_replaced_tokens_lock = threading.Lock()
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+logger = telemetry.get_logger(__name__)
+
+class RateLimiter:
+    """
+    Token bucket shared by every thread talking to one host, so more workers don't mean more 429s.
+    """
+    def __init__(self, requests_per_second):
+        self.rate = float(requests_per_second)
+        self.capacity = max(1.0, self.rate)  # Allow a short burst of up to one second's worth
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a request is allowed.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_for = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait_for)
+
+    def pause(self, seconds):
+        """
+        Hold every request to this host back for a while, e.g. when it has told us to slow down.
+        """
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+def create_session(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE):
+    """
+    Create a requests session that keeps connections alive and reuses them between calls.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def get_session():
+    """
+    Return the shared session, creating it the first time it's needed.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:  # Worker threads can race here on first use so only let one build it
+            if _session is None:
+                _session = create_session()
+    return _session
+
+def configure(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, connect_timeout=None, read_timeout=None):
+    """
+    Rebuild the shared session with a different pool size and optionally change the default timeouts.
+    """
+    global _session, CONNECT_TIMEOUT, READ_TIMEOUT
+    if connect_timeout is not None:
+        CONNECT_TIMEOUT = connect_timeout
+    if read_timeout is not None:
+        READ_TIMEOUT = read_timeout
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = create_session(pool_connections, pool_maxsize)
+    return _session
+
+def close():
+    """
+    Close the shared session and all of its pooled connections.
+    """
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+def register_token_refresher(url_prefix, refresher):
+    """
+    Register a function that is called with a rejected bearer token and returns a new one,
+    for every request whose URL starts with url_prefix.
+    """
+    _token_refreshers[url_prefix] = refresher
+
+def _find_refresher(url):
+    for url_prefix, refresher in _token_refreshers.items():
+        if url.startswith(url_prefix):
+            return refresher
+    return None
+
+def _bearer_token(headers):
+    authorization = (headers or {}).get("Authorization", "")
+    if authorization.startswith("Bearer "):
+        return authorization[len("Bearer "):]
+    return None
+
+def _latest_token(token):
+    # Every remembered token points straight at the current one, so this is a single lookup
+    return _replaced_tokens.get(token, token)
+
+def _record_replacement(token, new_token):
+    """
+    Point the rejected token, and every token it had replaced, at new_token, forgetting the oldest past MAX_REPLACED_TOKENS.
+    """
+    with _replaced_tokens_lock:
+        for old_token in list(_replaced_tokens):
+            _replaced_tokens[old_token] = new_token
+        _replaced_tokens.pop(new_token, None)
+        _replaced_tokens[token] = new_token
+        while len(_replaced_tokens) > MAX_REPLACED_TOKENS:
+            del _replaced_tokens[next(iter(_replaced_tokens))]
+
+def get_rate_limiter(url):
+    """
+    Return the rate limiter for the host of url, or None if that host isn't limited.
+    """
+    host = urlsplit(url).netloc
+    rate = RATE_LIMITS.get(host, DEFAULT_REQUESTS_PER_SECOND)
+    if not rate:
+        return None
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(host)
+        if limiter is None or limiter.rate != rate:
+            limiter = _rate_limiters[host] = RateLimiter(rate)
+        return limiter
+
+def parse_retry_after(value):
+    """
+    Turn a Retry-After header (seconds or an HTTP date) into a number of seconds, or None if it can't be read.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt):
+    """
+    Full jitter exponential backoff: a random wait between 0 and base * 2^attempt, capped at BACKOFF_MAX.
+    """
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+def send_with_retries(method, url, timeout, **kwargs):
+    """
+    Send a request, retrying transient failures with jittered backoff and honouring Retry-After.
+    The last response is returned (or the last exception raised) once retries run out.
+    """
+    retry_statuses = RETRY_STATUSES if method.upper() == "GET" else POST_RETRY_STATUSES
+    limiter = get_rate_limiter(url)
+    endpoint = telemetry.endpoint_name(method, url)
+    attempt = 0
+    while True:
+        if limiter:
+            limiter.acquire()
+        started = time.perf_counter()
+        try:
+            response = get_session().request(method, url, timeout=timeout, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            metrics.record_request(endpoint, time.perf_counter() - started)
+            # A POST that timed out while reading may already have been processed, so only retry it if we never connected
+            retryable = method.upper() == "GET" or isinstance(e, requests.exceptions.ConnectTimeout)
+            if not retryable or attempt >= MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt)
+            telemetry.log_event(logger, logging.WARNING, f"{method} {url} failed ({e}), retrying in {delay:.1f}s...",
+                                event="retry", endpoint=endpoint, attempt=attempt + 1, delay=round(delay, 3), error=str(e))
+        else:
+            # Streamed bodies haven't been read yet, so go by Content-Length rather than reading them here
+            received = int(response.headers.get("Content-Length") or 0) if kwargs.get("stream") else len(response.content)
+            metrics.record_request(endpoint, time.perf_counter() - started, response.status_code,
+                                   len(response.request.body or b""), received)
+            if response.status_code not in retry_statuses or attempt >= MAX_RETRIES:
+                return response
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            delay = min(BACKOFF_MAX, retry_after) if retry_after is not None else backoff_delay(attempt)
+            if response.status_code == 429 and limiter:
+                limiter.pause(delay)  # Slow down every thread hitting this host, not just this one
+            response.close()  # Hand the connection back to the pool, a streamed body won't be read
+            telemetry.log_event(logger, logging.WARNING, f"{method} {url} returned {response.status_code}, retrying in {delay:.1f}s...",
+                                event="retry", endpoint=endpoint, attempt=attempt + 1, delay=round(delay, 3), status=response.status_code)
+        metrics.record_retry(endpoint)
+        attempt += 1
+        time.sleep(delay)
+
+def request(method, url, timeout=None, **kwargs):
+    """
+    Send a request through the shared session, using the default timeouts unless told otherwise.
+    Transient failures are retried with backoff, and if the API rejects the bearer token with a 401,
+    the token is refreshed and the request sent once more.
+    """
+    if timeout is None:
+        timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+    refresher = _find_refresher(url)
+    token = _bearer_token(kwargs.get("headers")) if refresher else None
+    if token:
+        # Callers keep hold of the token they started with, so swap in the current one if it's been replaced
+        latest = _latest_token(token)
+        if latest != token:
+            kwargs["headers"] = dict(kwargs["headers"], Authorization=f"Bearer {latest}")
+            token = latest
+
+    response = send_with_retries(method, url, timeout, **kwargs)
+
+    if response.status_code == 401 and token:
+        new_token = refresher(token)
+        if new_token and new_token != token:
+            _record_replacement(token, new_token)
+            kwargs["headers"] = dict(kwargs["headers"], Authorization=f"Bearer {new_token}")
+            response = send_with_retries(method, url, timeout, **kwargs)
+    return response
+
+def get(url, **kwargs):
+    """
+    Send a GET request through the shared session.
+    """
+    return request("GET", url, **kwargs)
+
+def post(url, **kwargs):
+    """
+    Send a POST request through the shared session.
+    """
+    return request("POST", url, **kwargs)
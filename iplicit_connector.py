@@ -1,29 +1,108 @@
-import requests
+import http_client
 import json
+import fast_json
+import telemetry
+
+# Configuration settings for connecting to the Iplicit API
+IPLICIT_BASE_URL = "https://api.iplicit.com"
+BANK_TRANSACTION_ENDPOINT = "/BankTransaction"
+BATCH_SIZE = 50  # Number of payloads handed to the poster at a time
+MAX_IN_FLIGHT = 8  # Upper limit on POSTs waiting on Iplicit at once
+READ_PAGE_SIZE = 1000  # Bank transactions requested per page when reading them back from Iplicit
+
+logger = telemetry.get_logger(__name__)
 
 def post_transaction_to_iplicit(api_key, transaction_payload):
     """
     Post a single transaction to Iplicit.
     """
-    url = "https://api.iplicit.com/BankTransaction"  # BankTransaction endpoint
+    url = f"{IPLICIT_BASE_URL}{BANK_TRANSACTION_ENDPOINT}"  # BankTransaction endpoint
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {api_key}"
     }
 
     try:
-        response = requests.post(url, headers=headers, json=transaction_payload)
+        response = http_client.post(url, headers=headers, json=transaction_payload)
         if response.status_code in [200, 201]:
-            print(f"Successfully posted transaction: {transaction_payload['Reference']}")
+            logger.info(f"Successfully posted transaction: {transaction_payload['Reference']}")
             return response.json()
         else:
-            print(f"Failed to post transaction. Status: {response.status_code}, Response: {response.text}")
+            logger.error(f"Failed to post transaction. Status: {response.status_code}")
+            logger.debug(f"Payload: {json.dumps(transaction_payload)}, Response: {response.text}")
             return None
     except Exception as e:
-        print(f"Error posting transaction: {str(e)}")
+        logger.error(f"Error posting transaction: {str(e)}")
         return None
 
-def build_transaction_payload(legal_entity, bank_account, code, date, amount, description):
+def send_transaction(api_key, transaction_payload, url=None):
+    """
+    Post a single transaction without logging and report how it went as a dict.
+    """
+    url = url or f"{IPLICIT_BASE_URL}{BANK_TRANSACTION_ENDPOINT}"
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}"
+    }
+
+    result = {"payload": transaction_payload, "success": False, "status": None, "response": None, "error": None}
+    try:
+        response = http_client.post(url, headers=headers, json=transaction_payload)
+        result["status"] = response.status_code
+        if response.status_code in (200, 201):
+            result["success"] = True
+            try:
+                result["response"] = response.json()
+            except ValueError:
+                result["response"] = response.text
+        else:
+            result["error"] = response.text
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+def fetch_bank_transactions(api_key, bank_account, start_date, end_date, page_size=READ_PAGE_SIZE):
+    """
+    Read back the bank transactions Iplicit holds for a bank account and date range, following its paging.
+    Returns None if they couldn't be fetched.
+    """
+    url = f"{IPLICIT_BASE_URL}{BANK_TRANSACTION_ENDPOINT}"
+    headers = {
+        "Accept": "application/json",
+        "Authorization": f"Bearer {api_key}"
+    }
+
+    records = []
+    skip = 0
+    with telemetry.stage("iplicit_fetch"):
+        while True:
+            params = {"bankAccount": bank_account, "fromDate": start_date, "toDate": end_date, "skip": skip, "take": page_size}
+            try:
+                response = http_client.get(url, headers=headers, params=params)
+            except Exception as e:
+                logger.error(f"Error fetching Iplicit transactions for {bank_account}: {str(e)}")
+                return None
+            if response.status_code != 200:
+                logger.error(f"Failed to fetch Iplicit transactions for {bank_account}. Status: {response.status_code}")
+                logger.debug(f"Response: {response.text}")
+                return None
+
+            response_json = fast_json.decode_response(response)
+            page = response_json.get("items", []) if isinstance(response_json, dict) else response_json
+            records.extend(page)
+            if len(page) < page_size:
+                break
+            skip += len(page)
+    return records
+
+def summarize_post_results(results):
+    """
+    Count how many posts succeeded and failed.
+    """
+    succeeded = sum(1 for result in results if result["success"])
+    return {"total": len(results), "succeeded": succeeded, "failed": len(results) - succeeded}
+
+def build_transaction_payload(legal_entity, bank_account, code, date, amount, description, reference=None):
     """
     Build the payload required for the Iplicit API.
     """
@@ -33,6 +112,6 @@ def build_transaction_payload(legal_entity, bank_account, code, date, amount, de
         "Code": code,
         "TransactionDate": date,
         "Amount": amount,
-        "Reference": description,
+        "Reference": reference if reference is not None else description,
         "Description": description
     }
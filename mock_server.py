@@ -0,0 +1,304 @@
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Local stand-in for the Bank Frick and Iplicit APIs so the scripts can be tried out and benchmarked
+# without touching the real systems
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8089
+IPLICIT_POST_PATHS = ("/BankTransaction", "/transactions")  # Both endpoints the connectors post to
+CURRENCIES = ("EUR", "USD", "CHF", "GBP")
+COMPANIES = ("A/S", "Limited")
+
+class MockState:
+    """
+    Settings, synthetic data shape and everything the mock server has received, shared between request threads.
+    """
+    def __init__(self, latency=0.0, error_rate=0.0, seed=None, accounts=10, transactions_per_account=100, history_days=30, end_date=None):
+        self.latency = latency  # Seconds to sleep before answering each request
+        self.error_rate = error_rate  # Fraction of requests answered with a 503
+        self.random = random.Random(seed)
+        self.seed = seed or 0
+        self.accounts = accounts
+        self.transactions_per_account = transactions_per_account
+        self.history_days = max(1, history_days)
+        self.end_date = end_date or date.today()  # Synthetic history runs up to and including this day
+        self.start_date = self.end_date - timedelta(days=self.history_days - 1)
+        self.lock = threading.Lock()
+        self.posted = []  # Every payload accepted by the Iplicit endpoint
+        self.posted_by_account = {}  # BankAccount -> records Iplicit would return for it, with their IDs
+        self.extra_transactions = {}  # Account ID -> transactions served after the synthetic ones, see add_transaction
+        self.queued_failures = {}  # Endpoint -> statuses its next requests are answered with, see fail_next
+        self.request_counts = {}  # Endpoint -> requests received
+        self.bytes_sent = 0
+        self.transactions_served = 0
+
+    def fail_next(self, endpoint, count=1, status=503):
+        """
+        Answer the next count requests to an endpoint (as counted in request_counts) with status, e.g. 429 or 500.
+        """
+        with self.lock:
+            self.queued_failures.setdefault(endpoint, []).extend([status] * count)
+
+    def failure_status(self, endpoint):
+        """
+        Return the error status to answer a request with, or None to serve it normally.
+        """
+        with self.lock:
+            queued = self.queued_failures.get(endpoint)
+            if queued:
+                return queued.pop(0)
+            return 503 if self.random.random() < self.error_rate else None
+
+    def count_request(self, endpoint):
+        with self.lock:
+            self.request_counts[endpoint] = self.request_counts.get(endpoint, 0) + 1
+
+    def reset_stats(self):
+        with self.lock:
+            self.posted = []
+            self.posted_by_account = {}
+            self.request_counts = {}
+            self.bytes_sent = 0
+            self.transactions_served = 0
+
+    def add_posted(self, payload):
+        """
+        Store a payload the way the Iplicit endpoint would and return the record it answers with.
+        """
+        with self.lock:
+            self.posted.append(payload)
+            record = {"id": len(self.posted), **(payload or {})}
+            self.posted_by_account.setdefault((payload or {}).get("BankAccount"), []).append(record)
+        return record
+
+    def add_transaction(self, account_id, valuta, amount, direction, counterparty="Counterparty extra"):
+        """
+        Book an extra transaction on an account without touching its balance, e.g. one half of a pair that cancels out.
+        """
+        party = {"name": counterparty, "iban": "CH0000000000000000"}
+        own = {"name": f"Account {account_id}", "accountNumber": account_id}
+        with self.lock:
+            extra = self.extra_transactions.setdefault(account_id, [])
+            extra.append({
+                "orderId": f"{account_id}-extra-{len(extra)}",
+                "type": "SEPA",
+                "state": "BOOKED",
+                "valuta": valuta,
+                "bookingDate": valuta,
+                "amount": amount,
+                "currency": CURRENCIES[int(account_id) % len(CURRENCIES)],
+                "direction": direction,
+                "debitor": own if direction == "outgoing" else party,
+                "creditor": party if direction == "outgoing" else own,
+            })
+
+    def account_ids(self):
+        return [f"{1000000 + number}" for number in range(self.accounts)]
+
+    def account(self, number):
+        account_id = f"{1000000 + number}"
+        currency = CURRENCIES[number % len(CURRENCIES)]
+        company = COMPANIES[number % len(COMPANIES)]
+        return {
+            "account": account_id,
+            "customer": f"Mock {company} {currency}",
+            "currency": currency,
+            "iban": f"LI00088110{account_id}",
+            "balance": round(self.transactions_per_account * 10.0 + number, 2),
+        }
+
+    def index_range(self, from_date, to_date):
+        """
+        The synthetic transactions for an account are spread evenly over the history,
+        so a date range maps onto a contiguous range of transaction indexes.
+        """
+        first_day = max((from_date - self.start_date).days, 0)
+        last_day = min((to_date - self.start_date).days, self.history_days - 1)
+        if last_day < first_day:
+            return 0, 0
+        per_day = self.transactions_per_account / self.history_days
+        first = -int(-first_day * per_day // 1)  # ceil
+        last = -int(-(last_day + 1) * per_day // 1)
+        return first, min(last, self.transactions_per_account)
+
+    def transaction(self, account_id, index):
+        """
+        Build the same synthetic transaction every time for a given account and index.
+        """
+        digest = hashlib.sha256(f"{self.seed}:{account_id}:{index}".encode("utf-8")).digest()
+        per_day = self.transactions_per_account / self.history_days
+        valuta = self.start_date + timedelta(days=int(index / per_day))
+        outgoing = digest[0] % 2 == 0
+        amount = round(int.from_bytes(digest[1:4], "big") / 100.0, 2)
+        counterparty = {"name": f"Counterparty {digest[4] % 50}", "iban": f"CH00{int.from_bytes(digest[5:9], 'big'):010d}"}
+        own = {"name": f"Account {account_id}", "accountNumber": account_id}
+        return {
+            "orderId": f"{account_id}-{index}",
+            "type": "SEPA" if digest[9] % 3 else "SWIFT",
+            "state": "BOOKED",
+            "valuta": valuta.isoformat(),
+            "bookingDate": valuta.isoformat(),
+            "amount": amount,
+            "currency": CURRENCIES[int(account_id) % len(CURRENCIES)],
+            "direction": "outgoing" if outgoing else "incoming",
+            "debitor": own if outgoing else counterparty,
+            "creditor": counterparty if outgoing else own,
+        }
+
+def make_token(lifetime=3600):
+    """
+    Build an unsigned JWT-shaped token with an exp claim so the token cache can read its expiry.
+    """
+    def segment(data):
+        return base64.urlsafe_b64encode(json.dumps(data).encode("utf-8")).decode("ascii").rstrip("=")
+    return f"{segment({'alg': 'none'})}.{segment({'exp': int(time.time()) + lifetime})}.mock"
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    """
+    Answers the Bank Frick and Iplicit endpoints using the MockState attached to the server.
+    """
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real APIs
+    wbufsize = -1  # Buffer headers and body into one write, flushed once the request is handled
+    disable_nagle_algorithm = True  # Otherwise small responses wait on the client's delayed ACK (~40-50 ms each)
+
+    def log_message(self, format, *args):
+        pass  # Keep the console quiet, the stats are what matter
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        with self.server.state.lock:
+            self.server.state.bytes_sent += len(data)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        return json.loads(raw) if raw else None
+
+    def before_request(self, endpoint):
+        """
+        Count the request, apply the configured latency and decide whether to fail it.
+        Returns True if an error was sent and the handler should stop.
+        """
+        state = self.server.state
+        state.count_request(endpoint)
+        if state.latency:
+            time.sleep(state.latency)
+        status = state.failure_status(endpoint)
+        if status:
+            self.send_json(status, {"error": "Too many requests" if status == 429 else "Service temporarily unavailable"})
+            return True
+        return False
+
+    def do_GET(self):
+        state = self.server.state
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        if url.path.endswith(IPLICIT_POST_PATHS[0]):
+            if self.before_request("iplicit_read"):
+                return
+            from_date = query.get("fromDate", "")
+            to_date = query.get("toDate", "9999-12-31")
+            records = [
+                record for record in state.posted_by_account.get(query.get("bankAccount"), [])
+                if from_date <= (record.get("TransactionDate") or "")[:10] <= to_date
+            ]
+            skip = int(query.get("skip", 0))
+            take = int(query.get("take", len(records) or 1))
+            self.send_json(200, {"items": records[skip:skip + take], "totalCount": len(records)})
+        elif url.path.endswith("/accounts"):
+            if self.before_request("/accounts"):
+                return
+            self.send_json(200, {"accounts": [state.account(number) for number in range(state.accounts)]})
+        elif url.path.endswith("/transactions"):
+            if self.before_request("/transactions"):
+                return
+            account_id = query.get("accountId")
+            if account_id not in state.account_ids():
+                self.send_json(404, {"error": f"Unknown account {account_id}"})
+                return
+            try:
+                from_date = date.fromisoformat(query["fromDate"])
+                to_date = date.fromisoformat(query["toDate"])
+            except (KeyError, ValueError):
+                self.send_json(400, {"error": "fromDate and toDate are required"})
+                return
+
+            first, last = state.index_range(from_date, to_date)
+            with state.lock:
+                extra = [t for t in state.extra_transactions.get(account_id, []) if from_date.isoformat() <= t["valuta"][:10] <= to_date.isoformat()]
+            total = last - first + len(extra)
+            first_position = int(query.get("firstPosition", 0))
+            max_results = int(query.get("maxResults", total or 1))
+            page_end = min(total, first_position + max_results)
+            transactions = [
+                state.transaction(account_id, first + position) if position < last - first else extra[position - (last - first)]
+                for position in range(first_position, page_end)
+            ]
+            with state.lock:
+                state.transactions_served += len(transactions)
+            self.send_json(200, {
+                "transactions": transactions,
+                "moreResults": page_end < total,
+                "resultSetSize": total,
+            })
+        else:
+            self.send_json(404, {"error": f"Unknown endpoint {url.path}"})
+
+    def do_POST(self):
+        state = self.server.state
+        path = urlsplit(self.path).path
+        payload = self.read_json()
+
+        if path.endswith("/authorize"):
+            if self.before_request("/authorize"):
+                return
+            self.send_json(200, {"token": make_token()})
+        elif path.endswith(IPLICIT_POST_PATHS):
+            if self.before_request("iplicit"):
+                return
+            self.send_json(201, state.add_posted(payload))
+        else:
+            self.send_json(404, {"error": f"Unknown endpoint {path}"})
+
+def start_mock_server(host=DEFAULT_HOST, port=0, **state_options):
+    """
+    Start the mock server on a background thread. Port 0 picks any free port.
+    state_options are passed to MockState (latency, error_rate, seed, accounts, transactions_per_account, history_days).
+    Returns the server, with .url pointing at it and .state holding its data and what it received.
+    """
+    server = ThreadingHTTPServer((host, port), MockRequestHandler)
+    server.daemon_threads = True
+    server.state = MockState(**state_options)
+    server.url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def stop_mock_server(server):
+    """
+    Shut the mock server down and free its port.
+    """
+    server.shutdown()
+    server.server_close()
+
+if __name__ == "__main__":
+    # Run standalone so the scripts can be pointed at it by changing BASE_URL / IPLICIT_BASE_URL / IPLICIT_API_URL
+    server = start_mock_server(port=DEFAULT_PORT)
+    print(f"Mock Bank Frick and Iplicit APIs listening on {server.url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop_mock_server(server)
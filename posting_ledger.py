@@ -0,0 +1,110 @@
+import hashlib
+import json
+from datetime import datetime
+from sync_state import get_connection
+from transaction_record import normalize, normalize_all
+
+# Ledger of every transaction already posted to Iplicit, stored alongside the sync checkpoints
+
+def ensure_ledger(connection):
+    """
+    Create the ledger table and its (account, valuta) index if they aren't there yet.
+    """
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS posted_transactions (
+            fingerprint TEXT PRIMARY KEY,
+            account_id TEXT NOT NULL,
+            valuta TEXT,
+            amount REAL,
+            posted_at TEXT NOT NULL
+        )
+        """
+    )
+    connection.execute("DROP INDEX IF EXISTS posted_transactions_account")  # Superseded by the (account, valuta) index
+    connection.execute("CREATE INDEX IF NOT EXISTS posted_transactions_account_valuta ON posted_transactions (account_id, valuta)")
+
+def transaction_fingerprint(account_id, transaction, occurrence=0):
+    """
+    Build a stable hash identifying a Bank Frick transaction.
+    occurrence tells apart otherwise identical transactions on the same day (e.g. two equal payments to the same person).
+    """
+    record = normalize(transaction)
+    key = [
+        str(account_id),
+        record.valuta,
+        str(abs(float(record.amount or 0))),
+        record.direction,
+        record.counterparty_name,
+        record.counterparty_number,
+        occurrence,
+    ]
+    return hashlib.sha256(json.dumps(key).encode("utf-8")).hexdigest()
+
+def fingerprint_transactions(account_id, transactions):
+    """
+    Fingerprint every transaction in a list, numbering repeats so each one gets its own hash.
+    """
+    seen = {}
+    fingerprints = []
+    for transaction in normalize_all(transactions):
+        base = transaction_fingerprint(account_id, transaction)
+        occurrence = seen.get(base, 0)
+        seen[base] = occurrence + 1
+        fingerprints.append(base if occurrence == 0 else transaction_fingerprint(account_id, transaction, occurrence))
+    return fingerprints
+
+def load_posted_fingerprints(account_id, since=None, db_path=None):
+    """
+    Load the fingerprints already posted for an account into a set for O(1) lookups,
+    only from valuta date since onwards when given so a run doesn't read the account's whole history.
+    """
+    connection = get_connection(db_path)
+    try:
+        ensure_ledger(connection)
+        if since is None:
+            rows = connection.execute("SELECT fingerprint FROM posted_transactions WHERE account_id = ?", (account_id,))
+        else:
+            rows = connection.execute("SELECT fingerprint FROM posted_transactions WHERE account_id = ? AND valuta >= ?", (account_id, since))
+        return {row[0] for row in rows}
+    finally:
+        connection.close()
+
+def filter_unposted(account_id, transactions, db_path=None):
+    """
+    Split transactions into the ones still to post and a count of the ones skipped as already posted.
+    Returns ([(fingerprint, TransactionRecord), ...], skipped_count).
+    """
+    transactions = normalize_all(transactions)
+    valutas = [record.day for record in transactions]
+    since = min(valutas) if valutas and all(valutas) else None  # Undated transactions mean the whole history has to be checked
+    posted = load_posted_fingerprints(account_id, since, db_path)
+    pending = []
+    skipped = 0
+    for fingerprint, transaction in zip(fingerprint_transactions(account_id, transactions), transactions):
+        if fingerprint in posted:
+            skipped += 1
+        else:
+            pending.append((fingerprint, transaction))
+    return pending, skipped
+
+def mark_posted(account_id, entries, db_path=None):
+    """
+    Record (fingerprint, transaction) pairs as posted so later runs skip them.
+    """
+    if not entries:
+        return
+    posted_at = datetime.now().isoformat(timespec="seconds")
+    connection = get_connection(db_path)
+    try:
+        ensure_ledger(connection)
+        with connection:
+            connection.executemany(
+                "INSERT OR IGNORE INTO posted_transactions (fingerprint, account_id, valuta, amount, posted_at) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (fingerprint, account_id, record.valuta, record.amount, posted_at)
+                    for fingerprint, record in ((fingerprint, normalize(transaction)) for fingerprint, transaction in entries)
+                ],
+            )
+    finally:
+        connection.close()
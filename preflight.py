@@ -0,0 +1,99 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import bankfrick_client
+import telemetry
+from fetch_engine import MAX_CONCURRENT_FETCHES
+from sync_state import get_checkpoint, get_fingerprint, incremental_start_date, save_checkpoint, save_fingerprint
+
+# Pre-flight change detection: tells the export and post jobs which accounts have nothing new since their checkpoint,
+# so quiet accounts are checkpointed without fetching their transactions.
+# One /accounts call gives every balance; an account whose balance moved since the last run has certainly changed.
+# An unchanged balance proves nothing (money in and out again, reversals, sweeps), so those accounts are asked for
+# at most one transaction over the days since their checkpoint, and only skipped when the API says there are none.
+SKIP_UNCHANGED_ACCOUNTS = True  # False fetches every account every run
+
+logger = telemetry.get_logger(__name__)
+
+class Preflight:
+    """
+    The balances from one /accounts call, compared against each account's fingerprint for a job.
+    With balances None (switched off, or /accounts failed) every account counts as changed.
+    """
+    def __init__(self, job, balances, jwt_token=None):
+        self.job = job
+        self.balances = balances
+        self.jwt_token = jwt_token
+        self.skipped = []
+
+    def is_unchanged(self, account_id, closed_through):
+        """
+        Check an account against its fingerprint and take the new one. Returns True if nothing was booked
+        between its checkpoint and closed_through, so it can be skipped.
+        """
+        if self.balances is None:
+            return False
+        balance = self.balances.get(str(account_id))  # Keyed as strings, whatever type the registry's account numbers are
+        fingerprint = get_fingerprint(self.job, account_id)
+        if balance is None:
+            return False
+        if fingerprint is None or fingerprint["balance"] != balance:
+            save_fingerprint(self.job, account_id, balance)
+            return False
+
+        checkpoint = get_checkpoint(self.job, account_id)
+        if not checkpoint:
+            return False
+        start_date = incremental_start_date(self.job, account_id, closed_through)
+        if start_date > closed_through:
+            return True  # Already synced through closed_through
+        probe = bankfrick_client.probe_transactions(self.jwt_token, account_id, start_date, closed_through)
+        return probe is not None and probe[0] == 0
+
+    def skip(self, account_id, closed_through):
+        """
+        Move an unchanged account's checkpoint on to closed_through, as the API reported no transactions up to then.
+        """
+        checkpoint = get_checkpoint(self.job, account_id)
+        if checkpoint["last_valuta"] < closed_through:
+            save_checkpoint(self.job, account_id, closed_through, checkpoint["last_transaction_id"])
+        self.skipped.append(account_id)
+
+    def changed_accounts(self, account_ids, closed_through):
+        """
+        Return the account IDs that need fetching, checkpointing the rest through closed_through.
+        The accounts are checked in parallel since each one with an unchanged balance costs a request.
+        """
+        with telemetry.stage("preflight"), ThreadPoolExecutor(max_workers=max(1, min(MAX_CONCURRENT_FETCHES, len(account_ids)))) as executor:
+            unchanged = list(executor.map(lambda account_id: self.is_unchanged(account_id, closed_through), account_ids))
+
+        changed = []
+        for account_id, is_unchanged in zip(account_ids, unchanged):
+            if is_unchanged:
+                self.skip(account_id, closed_through)
+            else:
+                changed.append(account_id)
+        if self.skipped:
+            telemetry.log_event(logger, logging.INFO, f"Skipping {len(self.skipped)} of {len(account_ids)} accounts with no transactions since the last run.",
+                                event="preflight", job=self.job, skipped=len(self.skipped), changed=len(changed))
+            telemetry.metrics.increment("accounts_skipped", len(self.skipped))
+        return changed
+
+def run_preflight(job, jwt_token):
+    """
+    Fetch fresh balances from /accounts for a job's pre-flight check.
+    """
+    if not SKIP_UNCHANGED_ACCOUNTS:
+        return Preflight(job, None)
+    with telemetry.stage("preflight"):
+        accounts = bankfrick_client.fetch_accounts(jwt_token, use_cache=False)  # The balances have to be current, not this run's or the disk cache's
+    if accounts is None:
+        logger.warning("Could not fetch balances for the pre-flight check, fetching every account.")
+        return Preflight(job, None)
+    return Preflight(job, {str(account.get("account")): as_balance(account.get("balance")) for account in accounts if account.get("account")}, jwt_token)
+
+def as_balance(value):
+    # Balances are compared as numbers so "100.0" and 100 don't count as a change; anything else can't be compared
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
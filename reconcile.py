@@ -0,0 +1,208 @@
+import argparse
+import csv
+import logging
+import telemetry
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from account_registry import get_registry
+from bankfrick_connect import get_jwt_token
+from fetch_engine import MAX_CONCURRENT_FETCHES, fetch_accounts_concurrently
+from fetch_post_transactions import IPLICIT_API_KEY, build_payloads
+from iplicit_connector import fetch_bank_transactions
+import bankfrick_client
+
+# Reconciliation: pull Bank Frick transactions and what Iplicit actually holds for the same range, match them up
+# and report what's missing, posted twice or posted with different details.
+# Bank Frick transactions are turned into the payloads the post job would send, so both sides are compared in the same shape.
+COMPARED_FIELDS = ("LegalEntity", "Code", "Description")  # Checked on matched pairs; date, amount and reference are what they're matched on
+STATUSES = ("matched", "mismatched", "missing", "duplicate", "unexpected")
+
+logger = telemetry.get_logger(__name__)
+
+def match_key(payload):
+    """
+    Exact join key: transaction date, amount in cents and reference.
+    """
+    return ((payload.get("TransactionDate") or "")[:10], round(float(payload.get("Amount") or 0) * 100), payload.get("Reference"))
+
+def date_amount_key(payload):
+    # Looser join for items whose reference was changed on the Iplicit side
+    return match_key(payload)[:2]
+
+def amount_reference_key(payload):
+    # Looser join for items booked on a different date in Iplicit
+    return match_key(payload)[1:]
+
+def index_by(records, key_fn):
+    """
+    Hash-index records by key_fn, keeping every record that shares a key so repeats can be counted.
+    """
+    index = {}
+    for record in records:
+        index.setdefault(key_fn(record), []).append(record)
+    return index
+
+def differences(expected, actual, fields):
+    """
+    Return {field: (Bank Frick value, Iplicit value)} for the fields that differ.
+    """
+    changed = {}
+    for field in fields:
+        expected_value, actual_value = expected.get(field), actual.get(field)
+        if expected_value != actual_value:
+            changed[field] = (expected_value, actual_value)
+    return changed
+
+def reconcile_account(expected, actual):
+    """
+    Match the payloads Bank Frick's transactions turn into against the records Iplicit holds, with hash joins.
+    The exact key is tried first, then date + amount (reference differs) and amount + reference (date differs).
+    Returns a list of (status, expected payload or None, Iplicit record or None, details) tuples.
+    """
+    results = []
+    unmatched_actual = index_by(actual, match_key)
+    leftover_expected = []
+    matched_keys = set()
+
+    for payload in expected:
+        key = match_key(payload)
+        candidates = unmatched_actual.get(key)
+        if candidates:
+            record = candidates.pop()
+            matched_keys.add(key)
+            changed = differences(payload, record, COMPARED_FIELDS)
+            results.append(("mismatched" if changed else "matched", payload, record, changed))
+        else:
+            leftover_expected.append(payload)
+
+    # Anything still sitting under a key that did match is a second copy of a posted transaction
+    leftover_actual = []
+    for key, records in unmatched_actual.items():
+        for record in records:
+            if key in matched_keys:
+                results.append(("duplicate", None, record, {}))
+            else:
+                leftover_actual.append(record)
+
+    for key_fn, fields in ((date_amount_key, ("Reference",) + COMPARED_FIELDS), (amount_reference_key, ("TransactionDate",) + COMPARED_FIELDS)):
+        if not leftover_expected or not leftover_actual:
+            break
+        candidates_by_key = index_by(leftover_actual, key_fn)
+        still_expected = []
+        for payload in leftover_expected:
+            candidates = candidates_by_key.get(key_fn(payload))
+            if candidates:
+                record = candidates.pop()
+                results.append(("mismatched", payload, record, differences(payload, record, fields)))
+            else:
+                still_expected.append(payload)
+        leftover_expected = still_expected
+        leftover_actual = [record for records in candidates_by_key.values() for record in records]
+
+    results.extend(("missing", payload, None, {}) for payload in leftover_expected)
+    results.extend(("unexpected", None, record, {}) for record in leftover_actual)
+    return results
+
+def fetch_iplicit_side(accounts, start_date, end_date, max_workers=MAX_CONCURRENT_FETCHES):
+    """
+    Read every account's Iplicit bank transactions in parallel. Returns {account_id: records or None}.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(accounts)))) as executor:
+        records = executor.map(lambda account_info: fetch_bank_transactions(IPLICIT_API_KEY, account_info["bank_account"], start_date, end_date), accounts)
+        return {account_info["account"]: account_records for account_info, account_records in zip(accounts, records)}
+
+def write_report(rows, output_file_path):
+    """
+    Save every item that isn't a clean match as a CSV.
+    """
+    with telemetry.stage("write"), open(output_file_path, mode='w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(["Status", "Account", "Date", "Amount", "Reference", "Iplicit ID", "Details"])
+        for account_name, status, payload, record, details in rows:
+            item = payload or record
+            writer.writerow([
+                status,
+                account_name,
+                item.get("TransactionDate"),
+                item.get("Amount"),
+                item.get("Reference"),
+                (record or {}).get("id"),
+                "; ".join(f"{field}: {bank_value!r} in Bank Frick, {iplicit_value!r} in Iplicit" for field, (bank_value, iplicit_value) in details.items()),
+            ])
+    logger.info(f"Saved reconciliation report to {output_file_path}")
+
+def reconcile(jwt_token, start_date, end_date, report_path=None):
+    """
+    Reconcile every account set up for Iplicit over start_date to end_date.
+    Returns {account_id: {status: count}}; accounts where either side couldn't be fetched are left out.
+    """
+    accounts = get_registry(jwt_token).postable_accounts()
+    account_ids = [account_info["account"] for account_info in accounts]
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        # Read Iplicit while Bank Frick is being fetched
+        iplicit_future = executor.submit(fetch_iplicit_side, accounts, start_date, end_date)
+        bank_side = fetch_accounts_concurrently(bankfrick_client.fetch_transactions, jwt_token, account_ids, start_date, end_date)
+        iplicit_side = iplicit_future.result()
+
+    totals = {}
+    report_rows = []
+    with telemetry.stage("reconcile"):
+        for account_info in accounts:
+            account_id = account_info["account"]
+            transactions = bank_side.get(account_id)
+            records = iplicit_side.get(account_id)
+            if transactions is None or records is None:
+                logger.warning(f"Skipping {account_info['name']} as one side could not be fetched.")
+                continue
+
+            expected = build_payloads(account_info, [(None, transaction) for transaction in transactions])
+            results = reconcile_account(expected, records)
+            counts = {status: 0 for status in STATUSES}
+            for status, payload, record, details in results:
+                counts[status] += 1
+                if status != "matched":
+                    report_rows.append((account_info["name"], status, payload, record, details))
+            totals[account_id] = counts
+
+            level = logging.INFO if counts["matched"] == len(results) else logging.WARNING
+            telemetry.log_event(logger, level,
+                                f"{account_info['name']}: {counts['matched']} matched, {counts['missing']} missing from Iplicit, "
+                                f"{counts['duplicate']} duplicated, {counts['mismatched']} mismatched, {counts['unexpected']} not in Bank Frick.",
+                                event="reconciled", account_id=account_id, start_date=start_date, end_date=end_date, **counts)
+
+    if report_path:
+        write_report(report_rows, report_path)
+    return totals
+
+def main(start_date=None, end_date=None, report_path=None):
+    """
+    Reconcile the current month up to yesterday by default, or start_date to end_date.
+    Returns None if every account was reconciled, otherwise what failed, for the scheduler's health check.
+    Items needing attention aren't failures; they're in the log and the report.
+    """
+    jwt_token = get_jwt_token()
+    if not jwt_token:
+        logger.error("Failed to retrieve JWT token. Exiting.")
+        return "Failed to retrieve JWT token"
+
+    end_date = end_date or (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+    start_date = start_date or datetime.strptime(end_date, '%Y-%m-%d').replace(day=1).strftime('%Y-%m-%d')
+    totals = reconcile(jwt_token, start_date, end_date, report_path)
+
+    issues = sum(counts[status] for counts in totals.values() for status in STATUSES if status != "matched")
+    logger.info(f"Reconciled {len(totals)} accounts from {start_date} to {end_date}: {issues} items need attention.")
+    total = len(get_registry(jwt_token).postable_accounts())
+    if len(totals) < total:
+        return f"{total - len(totals)} of {total} accounts failed"
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Reconcile Bank Frick transactions against what Iplicit holds.")
+    parser.add_argument("--from", dest="start_date", help="First day to reconcile, YYYY-MM-DD (defaults to the start of the month)")
+    parser.add_argument("--to", dest="end_date", help="Last day to reconcile, YYYY-MM-DD (defaults to yesterday)")
+    parser.add_argument("--csv", dest="report_path", help="Save everything that isn't a clean match to this CSV file")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args.start_date, args.end_date, args.report_path)
@@ -0,0 +1,109 @@
+import argparse
+import os
+import bankfrick_client
+import fast_json
+import fetch_transactions
+import response_cache
+import telemetry
+from datetime import datetime, timedelta
+from account_registry import get_registry
+from bankfrick_connect import get_jwt_token
+from csv_export import transaction_to_row, write_rows_streaming
+from fetch_post_transactions import build_payloads
+
+# Offline reprocessing: rebuild the CSV exports and Iplicit payloads for a date range purely from the raw response cache,
+# e.g. after the CSV layout or the payload mapping changes. Nothing is sent to Bank Frick or Iplicit,
+# and checkpoints and the posting ledger are left alone.
+OUTPUT_DIR = "replay_output"  # Where rebuilt exports and payloads are written
+
+logger = telemetry.get_logger(__name__)
+
+def load_cached_accounts(jwt_token, start_date, end_date):
+    """
+    Return (account, transactions) for every account with complete data, from the cache only.
+    Accounts the cache doesn't fully cover for the range are logged and left out.
+    """
+    cached = []
+    for account in get_registry(jwt_token):
+        account_id = account.get("account")
+        if not account_id or not account.get("name"):
+            continue
+        transactions = bankfrick_client.fetch_transactions(jwt_token, account_id, start_date, end_date)
+        if transactions is None:
+            logger.warning(f"Skipping {account['name']}: the response cache doesn't cover {start_date} to {end_date}.")
+            continue
+        cached.append((account, transactions))
+    return cached
+
+def replay_export(cached_accounts, output_dir, export_mode, start_date, end_date):
+    """
+    Rebuild the transaction CSVs the same way fetch_transactions.py writes them, in the given export mode.
+    """
+    registry = get_registry()
+    if export_mode == "per_account":
+        fetch_transactions.OUTPUT_DIR = output_dir
+        for account, transactions in cached_accounts:
+            filtered_transactions = fetch_transactions.filter_transactions(transactions, account["account"])
+            fetch_transactions.save_transactions_to_csv(filtered_transactions, account["name"], account.get("currency"), overwrite=True)
+        return
+
+    def rows():
+        for account, transactions in cached_accounts:
+            for record in fetch_transactions.filter_transactions(transactions, account["account"]):
+                yield record.currency or account.get("currency"), transaction_to_row(record, registry.names_by_number) + [account["name"]]
+
+    counts = write_rows_streaming(rows(), output_dir, f"transactions_{start_date}_{end_date}",
+                                  compress=fetch_transactions.COMPRESS_OUTPUT, partition_by_currency=(export_mode == "per_currency"), overwrite=True)
+    for path, row_count in counts.items():
+        logger.info(f"Saved {row_count} transactions to {path}")
+    if not counts:
+        logger.info("No transactions to save.")
+
+def replay_payloads(cached_accounts, output_path):
+    """
+    Rebuild the Iplicit payloads for every account set up for Iplicit and save them as JSON lines,
+    one {"account": ..., "payload": ...} object per transaction.
+    """
+    postable = {account_info["account"]: account_info for account_info in get_registry().postable_accounts()}
+    written = 0
+    with open(output_path, "w", encoding="utf-8") as output_file:
+        for account, transactions in cached_accounts:
+            account_info = postable.get(account["account"])
+            if account_info is None:
+                continue
+            for payload in build_payloads(account_info, [(None, transaction) for transaction in transactions]):
+                output_file.write(fast_json.dumps({"account": account_info["account"], "payload": payload}) + "\n")
+                written += 1
+    logger.info(f"Saved {written} Iplicit payloads to {output_path}")
+
+def main(start_date, end_date=None, output_dir=OUTPUT_DIR, export_mode=None, payloads=True):
+    """
+    Rebuild exports and payloads for start_date to end_date (yesterday by default) from the response cache.
+    """
+    response_cache.REPLAY = True
+    end_date = end_date or (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+    export_mode = export_mode or fetch_transactions.EXPORT_MODE
+
+    jwt_token = get_jwt_token()
+    cached_accounts = load_cached_accounts(jwt_token, start_date, end_date)
+    if not cached_accounts:
+        logger.error("Nothing in the response cache for this range. Exiting.")
+        return
+
+    os.makedirs(output_dir, exist_ok=True)
+    replay_export(cached_accounts, output_dir, export_mode, start_date, end_date)
+    if payloads:
+        replay_payloads(cached_accounts, os.path.join(output_dir, f"iplicit_payloads_{start_date}_{end_date}.jsonl"))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild exports and Iplicit payloads from cached Bank Frick responses.")
+    parser.add_argument("--from", dest="start_date", required=True, help="First day to rebuild, YYYY-MM-DD")
+    parser.add_argument("--to", dest="end_date", help="Last day to rebuild, YYYY-MM-DD (defaults to yesterday)")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help="Where to write the rebuilt files")
+    parser.add_argument("--export-mode", choices=["per_account", "single", "per_currency"], help="Defaults to fetch_transactions.EXPORT_MODE")
+    parser.add_argument("--no-payloads", action="store_true", help="Only rebuild the CSV exports")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args.start_date, args.end_date, args.output_dir, args.export_mode, not args.no_payloads)
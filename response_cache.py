@@ -0,0 +1,252 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+import fast_json
+
+# On-disk cache of raw Bank Frick responses, so exports and Iplicit payloads can be rebuilt from data already downloaded.
+# Bodies are stored once per SHA-256 of their content under blobs/, and index.db maps each request
+# (/accounts, or /transactions for an account and date range) to its body with an expiry and a last-used time.
+RESPONSE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "response_cache")  # None switches the cache off
+MAX_CACHE_BYTES = 512 * 1024 * 1024  # Least recently used responses are evicted once the bodies take up more than this
+EVICT_TO = 0.9  # Eviction frees space down to this fraction of MAX_CACHE_BYTES, so it doesn't run again on the next store
+OPEN_RANGE_TTL = 15 * 60  # Seconds a response covering today (or later) stays valid, since those days can still change
+ACCOUNTS_TTL = 60 * 60  # Seconds the /accounts response stays valid
+REPLAY = False  # Serve everything from the cache, expired or not, and never call the API
+
+_write_lock = threading.Lock()  # Writes to the index go one at a time; reads use their thread's own connection and don't wait
+_local = threading.local()
+_total_bytes = {}  # Cache dir -> bytes of bodies the index points at, counted once and then kept up to date by each write
+
+def enabled():
+    return bool(RESPONSE_CACHE_DIR)
+
+def _connect():
+    """
+    Return this thread's connection to the index, opening it and creating the table the first time.
+    """
+    connection = getattr(_local, "connection", None)
+    if connection is not None and _local.directory == RESPONSE_CACHE_DIR:
+        return connection
+    if connection is not None:
+        connection.close()  # The cache was pointed somewhere else
+
+    os.makedirs(RESPONSE_CACHE_DIR, exist_ok=True)
+    connection = sqlite3.connect(os.path.join(RESPONSE_CACHE_DIR, "index.db"), timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")  # Readers carry on while another thread or process writes
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            account_id TEXT,
+            start_date TEXT,
+            end_date TEXT,
+            digest TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            fetched_at REAL NOT NULL,
+            expires_at REAL,
+            last_used REAL NOT NULL
+        )
+        """
+    )
+    connection.execute("CREATE INDEX IF NOT EXISTS entries_range ON entries (kind, account_id, start_date)")
+    connection.execute("CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest)")
+    _local.connection, _local.directory = connection, RESPONSE_CACHE_DIR
+    return connection
+
+def _stored_bytes(connection):
+    return connection.execute("SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, size FROM entries)").fetchone()[0]
+
+def _is_referenced(connection, digest):
+    return connection.execute("SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)).fetchone() is not None
+
+def _blob_path(digest):
+    return os.path.join(RESPONSE_CACHE_DIR, "blobs", digest[:2], f"{digest}.json")
+
+def _write_blob(data):
+    """
+    Store a body under its content hash, once however many requests returned it. Returns (digest, size).
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    path = _blob_path(digest)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as blob_file:
+            blob_file.write(data)
+        os.replace(temp_path, path)  # Swap in atomically so a reader never sees half a file
+    return digest, len(data)
+
+def _read_blob(digest):
+    try:
+        with open(_blob_path(digest), "rb") as blob_file:
+            return fast_json.loads(blob_file.read())
+    except (OSError, ValueError):
+        return None
+
+def _store(key, kind, body, expires_at, account_id=None, start_date=None, end_date=None):
+    digest, size = _write_blob(fast_json.dumps(body).encode("utf-8"))
+    now = time.time()
+    with _write_lock:
+        connection = _connect()
+        total = _total_bytes.get(RESPONSE_CACHE_DIR)
+        if total is None:
+            total = _stored_bytes(connection)
+        replaced = connection.execute("SELECT digest, size FROM entries WHERE key = ?", (key,)).fetchone()
+        if not _is_referenced(connection, digest):
+            total += size
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO entries (key, kind, account_id, start_date, end_date, digest, size, fetched_at, expires_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, kind, account_id, start_date, end_date, digest, size, now, expires_at, now),
+            )
+        if replaced and replaced[0] != digest:
+            total -= _remove_unreferenced(connection, [replaced])
+        if total > MAX_CACHE_BYTES:
+            total = _evict(connection, int(MAX_CACHE_BYTES * EVICT_TO))
+        _total_bytes[RESPONSE_CACHE_DIR] = total
+
+def _evict(connection, max_bytes):
+    """
+    Drop least recently used entries until the stored bodies fit in max_bytes, then delete bodies nothing points at.
+    Only runs once the running total says the cache is over its limit, and starts from an exact count in case
+    another process has been writing too. Returns the bytes still stored.
+    """
+    total = _stored_bytes(connection)
+    if total <= max_bytes:
+        return total
+    evicted = []
+    with connection:
+        for key, digest, size in connection.execute("SELECT key, digest, size FROM entries ORDER BY last_used").fetchall():
+            if total <= max_bytes:
+                break
+            connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+            if not _is_referenced(connection, digest):
+                evicted.append((digest, size))
+                total -= size
+    _remove_unreferenced(connection, evicted)
+    return total
+
+def _remove_unreferenced(connection, bodies):
+    """
+    Delete the (digest, size) bodies no entry points at any more. Returns the bytes freed.
+    """
+    freed = 0
+    for digest, size in bodies:
+        if not _is_referenced(connection, digest):
+            freed += size
+            try:
+                os.remove(_blob_path(digest))
+            except OSError:
+                pass
+    return freed
+
+def _touch(keys):
+    now = time.time()
+    with _write_lock:
+        connection = _connect()
+        with connection:
+            connection.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(now, key) for key in keys])
+
+def _is_valid(expires_at, allow_expired):
+    return allow_expired or expires_at is None or expires_at > time.time()
+
+def transactions_key(account_id, start_date, end_date):
+    return f"transactions:{account_id}:{start_date}:{end_date}"
+
+def put_transactions(account_id, start_date, end_date, transactions):
+    """
+    Cache the transactions fetched for an account and range. Ranges that are entirely in the past never expire.
+    """
+    if not enabled():
+        return
+    expires_at = None if end_date < date.today().isoformat() else time.time() + OPEN_RANGE_TTL
+    _store(transactions_key(account_id, start_date, end_date), "transactions", transactions, expires_at, account_id, start_date, end_date)
+
+def get_transactions(account_id, start_date, end_date, allow_expired=False):
+    """
+    Return cached transactions for an account and range, or None if the cache doesn't fully cover it.
+    An exact match is returned as fetched; otherwise the range is pieced together from cached ranges
+    that cover it between them, cut by valuta date.
+    """
+    if not enabled():
+        return None
+    rows = _connect().execute(
+        "SELECT key, start_date, end_date, digest, expires_at FROM entries "
+        "WHERE kind = 'transactions' AND account_id = ? AND start_date <= ? AND end_date >= ? ORDER BY start_date",
+        (str(account_id), end_date, start_date),
+    ).fetchall()
+    rows = [row for row in rows if _is_valid(row[4], allow_expired)]
+
+    exact = [row for row in rows if row[1] == start_date and row[2] == end_date]
+    pieces = exact[:1] or _cover(rows, start_date, end_date)
+    if not pieces:
+        return None
+    _touch([row[0] for row in pieces])
+
+    if exact:
+        return _read_blob(exact[0][3])
+
+    transactions = []
+    cursor = start_date
+    for _, piece_start, piece_end, digest, _ in pieces:
+        body = _read_blob(digest)
+        if body is None:
+            return None
+        last_day = min(piece_end, end_date)
+        transactions.extend(t for t in body if cursor <= (t.get("valuta") or "")[:10] <= last_day)
+        cursor = _next_day(last_day)
+    return transactions
+
+def _next_day(day):
+    return (datetime.strptime(day, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+
+def _cover(rows, start_date, end_date):
+    """
+    Pick cached ranges that cover start_date..end_date with no gaps, always taking the one reaching furthest.
+    """
+    pieces = []
+    cursor = start_date
+    while cursor <= end_date:
+        candidates = [row for row in rows if row[1] <= cursor <= row[2]]
+        if not candidates:
+            return []
+        best = max(candidates, key=lambda row: row[2])
+        pieces.append(best)
+        cursor = _next_day(best[2])
+    return pieces
+
+def put_accounts(accounts):
+    if enabled():
+        _store("accounts", "accounts", accounts, time.time() + ACCOUNTS_TTL)
+
+def get_accounts(allow_expired=False):
+    """
+    Return the cached /accounts list, or None if there isn't a valid one.
+    """
+    if not enabled():
+        return None
+    row = _connect().execute("SELECT digest, expires_at FROM entries WHERE key = 'accounts'").fetchone()
+    if row is None or not _is_valid(row[1], allow_expired):
+        return None
+    _touch(["accounts"])
+    return _read_blob(row[0])
+
+def clear():
+    """
+    Remove every cached response.
+    """
+    if not enabled() or not os.path.isdir(RESPONSE_CACHE_DIR):
+        return
+    with _write_lock:
+        connection = _connect()
+        with connection:
+            connection.execute("DELETE FROM entries")
+        for root, _, files in os.walk(os.path.join(RESPONSE_CACHE_DIR, "blobs")):
+            for name in files:
+                os.remove(os.path.join(root, name))
+        _total_bytes[RESPONSE_CACHE_DIR] = 0
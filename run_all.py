@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+import bankfrick_client
+import fetch_daily_summary
+import fetch_transactions
+import fetch_post_transactions
+import telemetry
+from account_registry import get_registry
+from bankfrick_connect import get_jwt_token
+from fetch_engine import fetch_accounts_concurrently
+from sync_state import incremental_start_date
+
+logger = telemetry.get_logger(__name__)
+
+def prefetch_for_all_jobs(jwt_token):
+    """
+    Fetch, once per account, the widest date range any of the jobs below will ask for.
+    Each job then cuts its own range out of the in-run cache instead of calling the API again.
+    """
+    registry = get_registry(jwt_token)
+    if not registry:
+        logger.error("No accounts found. Exiting.")
+        return False
+
+    yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+    today = datetime.now().strftime('%Y-%m-%d')
+    export_default = fetch_transactions.BACKFILL_START_DATE or (datetime.now() - timedelta(days=8)).strftime('%Y-%m-%d')
+    post_default = datetime.now().replace(day=1).strftime('%Y-%m-%d')
+
+    account_ids = [account["account"] for account in registry]
+
+    start_dates = {}
+    for account_id in account_ids:
+        start_dates[account_id] = min(
+            yesterday,  # The daily summary
+            incremental_start_date(fetch_transactions.SYNC_JOB, account_id, export_default),
+            incremental_start_date(fetch_post_transactions.SYNC_JOB, account_id, post_default),
+        )
+
+    logger.info(f"Prefetching transactions for {len(start_dates)} accounts...")
+    fetch_accounts_concurrently(
+        lambda token, account_id: bankfrick_client.fetch_transactions(token, account_id, start_dates[account_id], today),
+        jwt_token, list(start_dates)
+    )
+    return True
+
+def main():
+    """
+    Run the daily summary, the CSV export and the Iplicit post back-to-back, hitting the API once per account.
+    """
+    jwt_token = get_jwt_token()
+    if not jwt_token:
+        logger.error("Failed to retrieve JWT token. Exiting.")
+        return
+
+    if not prefetch_for_all_jobs(jwt_token):
+        return
+
+    # The jobs reuse the cached token, account list and transactions
+    fetch_daily_summary.main()
+    fetch_transactions.main()
+    fetch_post_transactions.main()
+
+if __name__ == "__main__":
+    main()
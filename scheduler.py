@@ -0,0 +1,213 @@
+import argparse
+import json
+import signal
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import account_registry
+import bankfrick_client
+import fetch_daily
+import fetch_daily_summary
+import fetch_post_transactions
+import fetch_transactions
+import http_client
+import reconcile
+import telemetry
+
+# Daemon mode: run every job on its own interval in one long-lived process, so the HTTP pool, the JWT,
+# the parsed private key and the account registry stay warm between runs instead of every cron job starting cold.
+# Each job returns None when it worked, or a short description of what failed (no token, accounts that failed),
+# which counts as a failed run in /health just like an exception
+JOBS = {
+    "fetch_daily_summary": fetch_daily_summary.main,
+    "fetch_daily": fetch_daily.main,
+    "fetch_transactions": fetch_transactions.main,
+    "fetch_post_transactions": fetch_post_transactions.main,
+    "reconcile": reconcile.main,
+}
+JOB_INTERVALS = {  # Seconds between runs of each job
+    "fetch_daily_summary": 24 * 60 * 60,
+    "fetch_daily": 24 * 60 * 60,
+    "fetch_transactions": 24 * 60 * 60,
+    "fetch_post_transactions": 6 * 60 * 60,
+    "reconcile": 24 * 60 * 60,
+}
+REGISTRY_REFRESH_INTERVAL = 24 * 60 * 60  # Seconds before the account registry is reloaded from accounts.json and /accounts
+HEALTH_HOST = "127.0.0.1"  # Only reachable from this machine
+HEALTH_PORT = 8090  # None switches the health/metrics endpoint off
+
+logger = telemetry.get_logger(__name__)
+
+class ScheduledJob:
+    """
+    One job, when it's next due and how its runs have gone.
+    """
+    def __init__(self, name, run, interval):
+        self.name = name
+        self.run = run
+        self.interval = interval
+        self.next_run = time.time()  # Everything runs once at startup
+        self.runs = 0
+        self.failures = 0
+        self.last_started = None
+        self.last_duration = None
+        self.last_error = None
+
+    def status(self):
+        return {
+            "interval_seconds": self.interval,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_started": datetime.fromtimestamp(self.last_started).isoformat(timespec="seconds") if self.last_started else None,
+            "last_duration_seconds": round(self.last_duration, 3) if self.last_duration is not None else None,
+            "last_error": self.last_error,
+            "next_run": datetime.fromtimestamp(self.next_run).isoformat(timespec="seconds"),
+        }
+
+class Scheduler:
+    """
+    Runs due jobs one after another on a single thread. Jobs that fall due together share the in-run
+    transaction cache, which is cleared before each round so every round sees fresh data.
+    """
+    def __init__(self, jobs, intervals=None):
+        intervals = intervals or JOB_INTERVALS
+        self.jobs = [ScheduledJob(name, run, intervals[name]) for name, run in jobs.items()]
+        self.started = time.time()
+        self.registry_loaded = time.time()
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+
+    def due_jobs(self, now):
+        return [job for job in self.jobs if job.next_run <= now]
+
+    def run_job(self, job):
+        logger.info(f"Running {job.name}...")
+        started = time.time()
+        with self.lock:
+            job.last_started = started
+        error = None
+        try:
+            problem = job.run()
+            if problem:
+                # Jobs log what went wrong themselves and return a short description, so the health check sees it too
+                logger.error(f"{job.name} finished with failures: {problem}")
+                error = str(problem)
+        except Exception as e:
+            # One failing job mustn't stop the daemon, so log it and try again at the next interval
+            logger.exception(f"{job.name} failed: {e}")
+            error = str(e)
+        finished = time.time()
+        with self.lock:
+            job.runs += 1
+            job.failures += 1 if error else 0
+            job.last_error = error
+            job.last_duration = finished - started
+            job.next_run = started + job.interval
+        telemetry.metrics.record_stage(f"job:{job.name}", finished - started)
+
+    def run_due(self):
+        """
+        Run every job that's due now. Returns how many ran.
+        """
+        due = self.due_jobs(time.time())
+        if not due:
+            return 0
+        bankfrick_client.clear_cache()  # Yesterday's transactions may have changed, but the token and registry are still good
+        if time.time() - self.registry_loaded > REGISTRY_REFRESH_INTERVAL:
+            account_registry.clear_registry()
+            self.registry_loaded = time.time()
+        for job in due:
+            if self.stop_event.is_set():
+                break
+            self.run_job(job)
+        return len(due)
+
+    def run_forever(self):
+        logger.info(f"Scheduler started with {len(self.jobs)} jobs.")
+        while not self.stop_event.is_set():
+            self.run_due()
+            next_run = min(job.next_run for job in self.jobs)
+            self.stop_event.wait(max(0.0, next_run - time.time()))
+        logger.info("Scheduler stopped.")
+
+    def stop(self):
+        self.stop_event.set()
+
+    def status(self):
+        with self.lock:
+            jobs = {job.name: job.status() for job in self.jobs}
+        healthy = all(status["last_error"] is None for status in jobs.values())
+        return {
+            "status": "ok" if healthy else "degraded",
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "jobs": jobs,
+        }
+
+class HealthRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET /health for job statuses (503 if the last run of any job failed) and GET /metrics for the run metrics.
+    """
+    def log_message(self, format, *args):
+        pass  # Health checks would drown out the job logs
+
+    def send_json(self, status, body):
+        data = json.dumps(body, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path == "/health":
+            status = self.server.scheduler.status()
+            self.send_json(200 if status["status"] == "ok" else 503, status)
+        elif path == "/metrics":
+            self.send_json(200, telemetry.metrics.summary())
+        else:
+            self.send_json(404, {"error": f"Unknown endpoint {path}"})
+
+def start_health_server(scheduler, host=HEALTH_HOST, port=HEALTH_PORT):
+    """
+    Serve /health and /metrics on a background thread.
+    """
+    server = ThreadingHTTPServer((host, port), HealthRequestHandler)
+    server.daemon_threads = True
+    server.scheduler = scheduler
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"Health and metrics endpoint listening on http://{host}:{server.server_address[1]}")
+    return server
+
+def main(argv=None):
+    """
+    Run the jobs on their intervals until stopped with Ctrl+C or SIGTERM.
+    """
+    parser = argparse.ArgumentParser(description="Run the Bank Frick / Iplicit jobs on a schedule in one process.")
+    parser.add_argument("--jobs", nargs="*", choices=sorted(JOBS), help="Only schedule these jobs")
+    parser.add_argument("--port", type=int, default=HEALTH_PORT, help="Port for the health/metrics endpoint, 0 picks a free one")
+    parser.add_argument("--no-health", action="store_true", help="Don't serve the health/metrics endpoint")
+    parser.add_argument("--once", action="store_true", help="Run every job once and exit")
+    args = parser.parse_args(argv)
+
+    scheduler = Scheduler({name: JOBS[name] for name in args.jobs or JOBS})
+    if args.once:
+        scheduler.run_due()
+        http_client.close()
+        return
+
+    health_server = start_health_server(scheduler, port=args.port) if args.port is not None and not args.no_health else None
+    signal.signal(signal.SIGTERM, lambda signum, frame: scheduler.stop())
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        scheduler.stop()
+    finally:
+        if health_server:
+            health_server.shutdown()
+            health_server.server_close()
+        http_client.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import os
+import sqlite3
+from datetime import datetime, timedelta
+import fast_json
+from transaction_record import normalize, normalize_all, to_raw
+
+# Local SQLite file remembering how far each account has been synced, so runs only fetch what's new,
+# plus the windows fetched by a run that hasn't finished yet, so a rerun after a crash picks up where it stopped,
+# and each account's fingerprint (its last seen balance), so a run can tell from /accounts which accounts have certainly changed
+STATE_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sync_state.db")
+
+def get_connection(db_path=None):
+    """
+    Open the state database, creating the tables the first time.
+    """
+    connection = sqlite3.connect(db_path or STATE_DB_PATH, timeout=30)
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sync_checkpoints (
+            job TEXT NOT NULL,
+            account_id TEXT NOT NULL,
+            last_valuta TEXT NOT NULL,
+            last_transaction_id TEXT,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (job, account_id)
+        )
+        """
+    )
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS fetched_windows (
+            job TEXT NOT NULL,
+            account_id TEXT NOT NULL,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            transactions TEXT NOT NULL,
+            fetched_at TEXT NOT NULL,
+            PRIMARY KEY (job, account_id, start_date, end_date)
+        )
+        """
+    )
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS account_fingerprints (
+            job TEXT NOT NULL,
+            account_id TEXT NOT NULL,
+            balance REAL,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (job, account_id)
+        )
+        """
+    )
+    return connection
+
+def get_checkpoint(job, account_id, db_path=None):
+    """
+    Return the checkpoint for an account as a dict, or None if it has never been synced.
+    """
+    connection = get_connection(db_path)
+    try:
+        row = connection.execute(
+            "SELECT last_valuta, last_transaction_id, updated_at FROM sync_checkpoints WHERE job = ? AND account_id = ?",
+            (job, account_id),
+        ).fetchone()
+    finally:
+        connection.close()
+    if row is None:
+        return None
+    return {"last_valuta": row[0], "last_transaction_id": row[1], "updated_at": row[2]}
+
+def save_checkpoint(job, account_id, last_valuta, last_transaction_id=None, db_path=None):
+    """
+    Record that an account has been synced up to and including last_valuta.
+    """
+    connection = get_connection(db_path)
+    try:
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO sync_checkpoints (job, account_id, last_valuta, last_transaction_id, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (job, account_id, last_valuta, last_transaction_id, datetime.now().isoformat(timespec="seconds")),
+            )
+    finally:
+        connection.close()
+
+def incremental_start_date(job, account_id, default_start, db_path=None):
+    """
+    Work out where the next fetch should start: the day after the checkpoint, or default_start on the first run.
+    """
+    checkpoint = get_checkpoint(job, account_id, db_path)
+    if checkpoint is None:
+        return default_start
+    next_day = datetime.strptime(checkpoint["last_valuta"], '%Y-%m-%d') + timedelta(days=1)
+    return next_day.strftime('%Y-%m-%d')
+
+def latest_transaction(transactions, closed_through=None):
+    """
+    Find the latest valuta date in a list of transactions and the ID of the transaction on it,
+    only looking at days up to closed_through when given.
+    """
+    latest_valuta, latest_id = None, None
+    for transaction in transactions:
+        record = normalize(transaction)
+        valuta = record.valuta
+        if valuta and (latest_valuta is None or valuta >= latest_valuta) and (closed_through is None or record.day <= closed_through):
+            latest_valuta = valuta
+            latest_id = record.transaction_id
+    return latest_valuta, latest_id
+
+def later_of(first, second):
+    """
+    Pick the later of two (valuta, id) pairs from latest_transaction, so a latest can be kept across batches.
+    """
+    if second[0] and (first[0] is None or second[0] >= first[0]):
+        return second
+    return first
+
+def record_synced(job, account_id, transactions, closed_through, db_path=None):
+    """
+    Move an account's checkpoint forward to closed_through after a successful sync.
+    Days after closed_through (like today) are left for the next run since they can still change.
+    """
+    record_synced_latest(job, account_id, latest_transaction(transactions, closed_through), closed_through, db_path)
+
+def record_synced_latest(job, account_id, latest, closed_through, db_path=None):
+    """
+    Same as record_synced, from latest_transaction(transactions, closed_through),
+    for callers that don't keep every transaction until the account is done.
+    """
+    checkpoint = get_checkpoint(job, account_id, db_path)
+    if not checkpoint or checkpoint["last_valuta"] < closed_through:  # Never move a checkpoint backwards
+        save_checkpoint(job, account_id, closed_through, latest[1], db_path)
+    clear_fetched_windows(job, account_id, closed_through, db_path)  # The checkpoint covers them now
+
+def get_fingerprint(job, account_id, db_path=None):
+    """
+    Return an account's fingerprint as a dict, or None if it has never been taken.
+    """
+    connection = get_connection(db_path)
+    try:
+        row = connection.execute(
+            "SELECT balance, updated_at FROM account_fingerprints WHERE job = ? AND account_id = ?",
+            (job, account_id),
+        ).fetchone()
+    finally:
+        connection.close()
+    if row is None:
+        return None
+    return {"balance": row[0], "updated_at": row[1]}
+
+def save_fingerprint(job, account_id, balance, db_path=None):
+    """
+    Record the balance an account was last seen at.
+    """
+    connection = get_connection(db_path)
+    try:
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO account_fingerprints (job, account_id, balance, updated_at) VALUES (?, ?, ?, ?)",
+                (job, account_id, balance, datetime.now().isoformat(timespec="seconds")),
+            )
+    finally:
+        connection.close()
+
+def save_fetched_window(job, account_id, start_date, end_date, transactions, db_path=None):
+    """
+    Keep a fetched window of closed days until the account's checkpoint moves past it,
+    so a run that dies part way through doesn't have to fetch it again.
+    """
+    connection = get_connection(db_path)
+    try:
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO fetched_windows (job, account_id, start_date, end_date, transactions, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job, account_id, start_date, end_date, fast_json.dumps(to_raw(transactions)), datetime.now().isoformat(timespec="seconds")),
+            )
+    finally:
+        connection.close()
+
+def load_fetched_windows(job, account_id, db_path=None):
+    """
+    Return the windows an earlier, unfinished run fetched for an account as {(start_date, end_date): TransactionRecords}.
+    """
+    connection = get_connection(db_path)
+    try:
+        rows = connection.execute(
+            "SELECT start_date, end_date, transactions FROM fetched_windows WHERE job = ? AND account_id = ?",
+            (job, account_id),
+        ).fetchall()
+    finally:
+        connection.close()
+    return {(start_date, end_date): normalize_all(fast_json.loads(transactions)) for start_date, end_date, transactions in rows}
+
+def clear_fetched_windows(job, account_id, through=None, db_path=None):
+    """
+    Drop an account's kept windows, or only those ending on or before through.
+    """
+    connection = get_connection(db_path)
+    try:
+        with connection:
+            if through is None:
+                connection.execute("DELETE FROM fetched_windows WHERE job = ? AND account_id = ?", (job, account_id))
+            else:
+                connection.execute("DELETE FROM fetched_windows WHERE job = ? AND account_id = ? AND end_date <= ?", (job, account_id, through))
+    finally:
+        connection.close()
@@ -0,0 +1,258 @@
+import atexit
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+# Structured logging and run metrics shared by every script.
+# Progress goes to the console as plain text; every log record and the end-of-run summary also go to LOG_JSON_PATH as JSON lines.
+LOG_LEVEL = os.environ.get("BANKFRICK_LOG_LEVEL", "INFO")  # DEBUG also logs request/response payloads
+LOG_JSON_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "run_log.jsonl")  # None switches the JSON log off
+LOG_SUMMARY = True  # Log the run summary (requests, latencies, stage timings) when the process exits
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)  # Upper bounds of the latency histogram buckets
+LOGGER_NAME = "bankfrick"
+
+RUN_ID = uuid.uuid4().hex[:12]  # Ties together every JSON line written by one run
+
+_configure_lock = threading.Lock()
+_configured = False
+
+class JsonLineFormatter(logging.Formatter):
+    """
+    Format a log record as one JSON object per line, including any fields passed with extra={"fields": {...}}.
+    """
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "run_id": RUN_ID,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class ConsoleHandler(logging.StreamHandler):
+    """
+    Write to whatever sys.stdout is at the time, so redirect_stdout() (as the benchmark uses) still captures progress.
+    """
+    def __init__(self):
+        super().__init__(sys.stdout)
+
+    def emit(self, record):
+        if not getattr(record, "console", True):
+            return  # JSON log only
+        self.setStream(sys.stdout)
+        super().emit(record)
+
+def configure(level=None, json_path=None):
+    """
+    Set up the console and JSON line handlers. Called automatically the first time a logger is asked for;
+    call it again to change the level or the JSON log file.
+    """
+    global _configured
+    with _configure_lock:
+        root = logging.getLogger(LOGGER_NAME)
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+            handler.close()
+
+        root.setLevel(logging.DEBUG)
+        root.propagate = False
+
+        console = ConsoleHandler()
+        console.setLevel(str(level or LOG_LEVEL).upper())
+        console.setFormatter(logging.Formatter("%(message)s"))
+        root.addHandler(console)
+
+        json_path = json_path if json_path is not None else LOG_JSON_PATH
+        if json_path:
+            json_handler = logging.FileHandler(json_path, encoding="utf-8", delay=True)  # Only create the file once something is logged
+            json_handler.setLevel(str(level or LOG_LEVEL).upper())
+            json_handler.setFormatter(JsonLineFormatter())
+            root.addHandler(json_handler)
+
+        if not _configured:
+            atexit.register(log_run_summary)
+        _configured = True
+
+def get_logger(name):
+    """
+    Logger for a module, e.g. get_logger(__name__).
+    """
+    if not _configured:
+        configure()
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+def log_event(logger, level, message, console=True, **fields):
+    """
+    Log a message with structured fields that end up as keys in the JSON line.
+    console=False keeps it out of the console output.
+    """
+    logger.log(level, message, extra={"fields": fields, "console": console})
+
+def endpoint_name(method, url):
+    """
+    Short label for a request, e.g. "GET /transactions", used to group request metrics.
+    """
+    path = urlsplit(url).path.rstrip("/")
+    return f"{method.upper()} /{path.rsplit('/', 1)[-1]}"
+
+class LatencyHistogram:
+    """
+    Request latencies counted into fixed buckets, plus count, total and maximum.
+    """
+    def __init__(self, buckets_ms=LATENCY_BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self.counts = [0] * (len(self.buckets_ms) + 1)  # Last slot is everything slower than the largest bucket
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        milliseconds = seconds * 1000
+        for index, bound in enumerate(self.buckets_ms):
+            if milliseconds <= bound:
+                self.counts[index] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, fraction):
+        """
+        Upper bound (ms) of the bucket holding the given percentile, None if it's in the overflow bucket.
+        """
+        if not self.count:
+            return 0
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets_ms[index] if index < len(self.buckets_ms) else None
+        return None
+
+    def to_dict(self):
+        labels = [f"<={bound}ms" for bound in self.buckets_ms] + [f">{self.buckets_ms[-1]}ms"]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 2) if self.count else 0,
+            "max_ms": round(self.max * 1000, 2),
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "buckets": {label: count for label, count in zip(labels, self.counts) if count},
+        }
+
+class RunMetrics:
+    """
+    Counters for one run: per-endpoint requests, statuses, latencies, bytes and retries, and time spent per stage.
+    Safe to update from the fetch and post worker threads.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.endpoints = {}
+            self.stages = {}
+            self.counters = {}
+
+    def _endpoint(self, endpoint):
+        stats = self.endpoints.get(endpoint)
+        if stats is None:
+            stats = self.endpoints[endpoint] = {
+                "requests": 0, "errors": 0, "retries": 0, "bytes_sent": 0, "bytes_received": 0,
+                "statuses": {}, "latency": LatencyHistogram(),
+            }
+        return stats
+
+    def record_request(self, endpoint, seconds, status=None, bytes_sent=0, bytes_received=0):
+        """
+        Count one HTTP attempt. status is None when no response came back.
+        """
+        with self.lock:
+            stats = self._endpoint(endpoint)
+            stats["requests"] += 1
+            stats["bytes_sent"] += bytes_sent
+            stats["bytes_received"] += bytes_received
+            stats["latency"].add(seconds)
+            key = str(status) if status is not None else "no_response"
+            stats["statuses"][key] = stats["statuses"].get(key, 0) + 1
+            if status is None or status >= 400:
+                stats["errors"] += 1
+
+    def record_retry(self, endpoint):
+        with self.lock:
+            self._endpoint(endpoint)["retries"] += 1
+
+    def record_stage(self, stage, seconds):
+        with self.lock:
+            stats = self.stages.setdefault(stage, {"calls": 0, "seconds": 0.0})
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+
+    def increment(self, counter, amount=1):
+        """
+        Bump a named counter, e.g. transactions fetched or posted.
+        """
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def summary(self):
+        with self.lock:
+            return {
+                "elapsed_seconds": round(time.time() - self.started, 3),
+                "endpoints": {
+                    endpoint: dict(stats, latency=stats["latency"].to_dict(), statuses=dict(stats["statuses"]))
+                    for endpoint, stats in sorted(self.endpoints.items())
+                },
+                # Stages running on worker threads overlap, so their seconds can add up to more than the elapsed time
+                "stages": {stage: {"calls": stats["calls"], "seconds": round(stats["seconds"], 3)} for stage, stats in self.stages.items()},
+                "counters": dict(self.counters),
+            }
+
+metrics = RunMetrics()
+
+@contextmanager
+def stage(name):
+    """
+    Time a block of work (auth, accounts, fetch, filter, write, post) into the run metrics.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.record_stage(name, time.perf_counter() - started)
+
+def log_run_summary(logger=None):
+    """
+    Log the run's metrics: the whole summary as one JSON line, and a short per-endpoint overview on the console.
+    Nothing is logged if the run made no requests and timed no stages.
+    """
+    summary = metrics.summary()
+    if not LOG_SUMMARY or (not summary["endpoints"] and not summary["stages"]):
+        return
+    logger = logger or get_logger("summary")
+    log_event(logger, logging.INFO, "Run summary", console=False, event="run_summary", **summary)
+
+    logger.info(f"Run finished in {summary['elapsed_seconds']:.1f}s.")
+    for endpoint, stats in summary["endpoints"].items():
+        latency = stats["latency"]
+        logger.info(f"  {endpoint}: {stats['requests']} requests, {stats['errors']} errors, {stats['retries']} retries, "
+                    f"mean {latency['mean_ms']}ms, max {latency['max_ms']}ms, {stats['bytes_received'] / 1024:.1f} KiB received")
+    for stage_name, stats in summary["stages"].items():
+        logger.info(f"  {stage_name}: {stats['seconds']:.2f}s over {stats['calls']} calls")
@@ -0,0 +1,45 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import account_registry
+import bankfrick_client
+import bankfrick_connect
+import benchmark
+import http_client
+import mock_server
+import sync_state
+import telemetry
+
+@pytest.fixture
+def mock_api(tmp_path, monkeypatch):
+    """
+    Start the mock Bank Frick / Iplicit server with every module pointed at it and at scratch files under tmp_path.
+    Call it with MockState options, e.g. mock_api(accounts=2, transactions_per_account=50).
+    Every module setting is changed through monkeypatch, so it's all put back when the test ends.
+    """
+    servers = []
+
+    def start(**state_options):
+        server = mock_server.start_mock_server(**{"accounts": 2, "transactions_per_account": 60, "seed": 1, "history_days": 30, **state_options})
+        servers.append(server)
+        monkeypatch.setattr(http_client, "_token_refreshers", dict(http_client._token_refreshers))  # Drops the mock's refresher afterwards
+        monkeypatch.setattr(telemetry, "LOG_LEVEL", "WARNING")
+        benchmark.point_at_mock(server, str(tmp_path), monkeypatch.setattr)
+        monkeypatch.setattr(sync_state, "STATE_DB_PATH", str(tmp_path / "state.db"))
+        monkeypatch.setattr(http_client, "BACKOFF_BASE", 0.01)  # Keep retries quick
+        clear_caches()
+        return server
+
+    yield start
+    for server in servers:
+        mock_server.stop_mock_server(server)
+    clear_caches()
+
+def clear_caches():
+    # Nothing fetched from one mock server may leak into another test
+    bankfrick_client.clear_cache()
+    account_registry.clear_registry()
+    bankfrick_connect.clear_token_cache()
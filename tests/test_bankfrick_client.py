@@ -0,0 +1,37 @@
+import bankfrick_client
+import bankfrick_connect
+import response_cache
+from transaction_record import TransactionRecord
+
+def test_request_transactions_follows_the_paging(mock_api):
+    server = mock_api()
+    token = bankfrick_connect.get_jwt_token()
+    start, end = server.state.start_date.isoformat(), server.state.end_date.isoformat()
+
+    records = bankfrick_client.request_transactions(token, "1000000", start, end, page_size=7)
+    assert [record.transaction_id for record in records] == [f"1000000-{index}" for index in range(60)]
+    assert server.state.request_counts["/transactions"] == 9
+
+def test_streamed_transactions_are_records(mock_api):
+    server = mock_api()
+    token = bankfrick_connect.get_jwt_token()
+    start, end = server.state.start_date.isoformat(), server.state.end_date.isoformat()
+
+    streamed = list(bankfrick_client.iter_transactions(token, "1000000", start, end, page_size=25))
+    assert all(isinstance(record, TransactionRecord) for record in streamed)
+    assert [record.raw for record in streamed] == [record.raw for record in bankfrick_client.request_transactions(token, "1000000", start, end)]
+
+def test_replayed_transactions_are_records_too(mock_api, monkeypatch, tmp_path):
+    server = mock_api()
+    monkeypatch.setattr(response_cache, "RESPONSE_CACHE_DIR", str(tmp_path / "response_cache"))
+    token = bankfrick_connect.get_jwt_token()
+    start, end = server.state.start_date.isoformat(), server.state.end_date.isoformat()
+    live = bankfrick_client.request_transactions(token, "1000000", start, end)
+
+    monkeypatch.setattr(response_cache, "REPLAY", True)
+    server.state.reset_stats()
+    replayed = list(bankfrick_client.iter_transactions(token, "1000000", start, end))
+    assert all(isinstance(record, TransactionRecord) for record in replayed)
+    assert [record.raw for record in replayed] == [record.raw for record in live]
+    assert server.state.request_counts == {}
+    response_cache.clear()
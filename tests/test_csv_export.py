@@ -0,0 +1,39 @@
+import csv
+import gzip
+import os
+import csv_export
+
+def rows(*currencies):
+    return [(currency, [f"2024-05-0{number}", "Payment", number, currency, "Own", "Shop", "Shop", "Account"]) for number, currency in enumerate(currencies, 1)]
+
+def read_rows(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", newline="", encoding="utf-8") as csv_file:
+        return list(csv.reader(csv_file))
+
+def test_one_file_with_a_header(tmp_path):
+    counts = csv_export.write_rows_streaming(rows("EUR", "USD"), str(tmp_path), "transactions_2024-05-01_2024-05-31")
+
+    path = str(tmp_path / "transactions_2024-05-01_2024-05-31.csv")
+    assert counts == {path: 2}
+    assert read_rows(path)[0] == csv_export.CONSOLIDATED_HEADER
+
+def test_one_file_per_currency(tmp_path):
+    counts = csv_export.write_rows_streaming(rows("EUR", "USD", "EUR", None), str(tmp_path), "export", compress=True, partition_by_currency=True)
+
+    assert {os.path.basename(path): count for path, count in counts.items()} == {"export_EUR.csv.gz": 2, "export_USD.csv.gz": 1, "export_UNKNOWN.csv.gz": 1}
+    assert len(read_rows(str(tmp_path / "export_EUR.csv.gz"))) == 3
+
+def test_a_rerun_never_truncates_an_earlier_export(tmp_path):
+    csv_export.write_rows_streaming(rows("EUR", "CHF"), str(tmp_path), "export")
+    counts = csv_export.write_rows_streaming(rows("USD"), str(tmp_path), "export")
+
+    assert list(counts) == [str(tmp_path / "export_2.csv")]
+    assert len(read_rows(str(tmp_path / "export.csv"))) == 3  # The first run's rows are still there
+
+def test_overwrite_replaces_the_file(tmp_path):
+    csv_export.write_rows_streaming(rows("EUR", "CHF"), str(tmp_path), "export")
+    csv_export.write_rows_streaming(rows("USD"), str(tmp_path), "export", overwrite=True)
+
+    assert sorted(os.listdir(tmp_path)) == ["export.csv"]
+    assert len(read_rows(str(tmp_path / "export.csv"))) == 2
@@ -0,0 +1,53 @@
+import logging
+import pytest
+import currency_summary
+
+def transaction(amount, direction, currency=None):
+    return {"amount": amount, "direction": direction, "currency": currency, "valuta": "2024-05-01"}
+
+def test_totals_per_entity_and_currency():
+    summary = currency_summary.CurrencySummary()
+    summary.add_account("Company A", "EUR", [transaction(100.0, "incoming"), transaction(40.0, "outgoing"), transaction(5.0, "incoming", "USD")])
+    summary.add_account("Company A", "EUR", [transaction(10.0, "outgoing")])
+    summary.add_account(None, "CHF", [transaction(7.0, "incoming")])
+
+    totals = {(entity, currency): (row.count, row.incoming, row.outgoing, row.net) for entity, currency, row in summary.rows()}
+    assert totals == {
+        ("Company A", "EUR"): (3, 100.0, 50.0, 50.0),
+        ("Company A", "USD"): (1, 5.0, 0.0, 5.0),
+        (currency_summary.NO_ENTITY, "CHF"): (1, 7.0, 0.0, 7.0),
+    }
+
+def test_entity_totals_in_the_base_currency(tmp_path):
+    rates_path = tmp_path / "fx_rates.json"
+    rates_path.write_text('{"base": "eur", "rates": {"USD": 0.5}}')
+    summary = currency_summary.CurrencySummary(currency_summary.load_fx_table(str(rates_path)))
+    summary.add_account("Company A", "EUR", [transaction(100.0, "incoming"), transaction(20.0, "outgoing", "USD")])
+
+    assert [(entity, currency) for entity, currency, _ in summary.rows()] == [("Company A", "EUR"), ("Company A", "USD"), ("Company A", "Total in EUR")]
+    base = summary.in_base["Company A"]
+    assert (base.count, base.incoming, base.outgoing) == (2, 100.0, pytest.approx(10.0))
+
+def test_missing_rate_is_left_out_with_a_warning():
+    records = []
+    handler = logging.Handler(logging.WARNING)
+    handler.emit = records.append
+    currency_summary.logger.addHandler(handler)
+    try:
+        summary = currency_summary.CurrencySummary(currency_summary.FxTable("EUR", {"USD": 0.9}))
+        summary.add_account("Company A", "EUR", [transaction(10.0, "incoming"), transaction(99.0, "incoming", "GBP")])
+        summary.log("May 2024")
+    finally:
+        currency_summary.logger.removeHandler(handler)
+
+    assert summary.missing_rates == {"GBP"}
+    assert summary.in_base["Company A"].incoming == 10.0  # The GBP payment isn't converted at some made-up rate
+    assert summary.by_currency[("Company A", "GBP")].incoming == 99.0  # but it's still in its own currency's totals
+    assert [record.getMessage() for record in records] == ["No FX rate for GBP, left out of the base-currency totals."]
+
+def test_no_table_means_no_base_totals(tmp_path):
+    assert currency_summary.load_fx_table(str(tmp_path / "missing.json")) is None
+    summary = currency_summary.CurrencySummary()
+    summary.add_account("Company A", "EUR", [transaction(1.0, "incoming")])
+    assert summary.in_base == {}
+    assert all(not currency.startswith("Total") for _, currency, _ in summary.rows())
@@ -0,0 +1,49 @@
+import json
+import pytest
+import fast_json
+
+class StreamedResponse:
+    """
+    Just enough of a streamed requests.Response for iter_json_array: the body handed out in small chunks.
+    """
+    def __init__(self, body, chunk_size=7, encoding="utf-8"):
+        self.data = body.encode(encoding)
+        self.chunk_size = chunk_size
+        self.encoding = encoding
+
+    def iter_content(self, chunk_size=1):
+        return iter([self.data[i:i + self.chunk_size] for i in range(0, len(self.data), self.chunk_size)])
+
+TRANSACTIONS = [{"orderId": "1", "amount": 12.5, "debitor": {"name": "Zürich AG"}}, {"orderId": "2", "amount": 3, "tags": [1, [2]]}]
+
+@pytest.fixture(params=["ijson", "stdlib"])
+def parser(request, monkeypatch):
+    if request.param == "ijson":
+        if fast_json.ijson is None:
+            pytest.skip("ijson isn't installed")
+    else:
+        monkeypatch.setattr(fast_json, "ijson", None)
+    return request.param
+
+def test_loads_and_dumps_roundtrip():
+    assert fast_json.loads(fast_json.dumps(TRANSACTIONS)) == TRANSACTIONS
+    assert fast_json.loads(b'{"a": [1, 2.5, null]}') == {"a": [1, 2.5, None]}
+
+def test_streams_the_array_and_keeps_the_top_level_values(parser):
+    body = json.dumps({"resultSetSize": 2, "transactions": TRANSACTIONS, "moreResults": False}, ensure_ascii=False)
+    meta = {}
+    assert list(fast_json.iter_json_array(StreamedResponse(body), "transactions", meta)) == TRANSACTIONS
+    assert meta == {"resultSetSize": 2, "moreResults": False}
+
+def test_streams_a_plain_list(parser):
+    assert list(fast_json.iter_json_array(StreamedResponse(json.dumps(TRANSACTIONS)), "transactions")) == TRANSACTIONS
+
+def test_empty_array(parser):
+    meta = {}
+    assert list(fast_json.iter_json_array(StreamedResponse('{"transactions": [], "moreResults": true}', chunk_size=1), "transactions", meta)) == []
+    assert meta == {"moreResults": True}
+
+def test_truncated_body_raises(parser):
+    body = json.dumps({"transactions": TRANSACTIONS})[:-20]
+    with pytest.raises(ValueError):
+        list(fast_json.iter_json_array(StreamedResponse(body), "transactions"))
@@ -0,0 +1,63 @@
+from datetime import date, timedelta
+import threading
+import fetch_post_transactions
+import sync_state
+
+def expected_posts(server):
+    # Everything the mock holds from the start of the month through today
+    first, last = server.state.index_range(date.today().replace(day=1), date.today())
+    return (last - first) * server.state.accounts
+
+def test_posts_the_month_and_advances_the_checkpoint(mock_api):
+    server = mock_api()
+    fetch_post_transactions.main()
+
+    assert len(server.state.posted) == expected_posts(server)
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+    for account_id in server.state.account_ids():
+        checkpoint = sync_state.get_checkpoint(fetch_post_transactions.SYNC_JOB, account_id)
+        assert checkpoint["last_valuta"] == yesterday
+
+def test_rerun_posts_nothing_twice(mock_api):
+    server = mock_api()
+    fetch_post_transactions.main()
+    server.state.reset_stats()
+
+    fetch_post_transactions.main()
+    assert server.state.posted == []
+
+def test_failed_posts_are_retried_on_the_next_run(mock_api):
+    server = mock_api()
+    server.state.fail_next("iplicit", 3, status=429)  # Retried by the client within the run
+    server.state.fail_next("iplicit", 2, status=500)  # Not retried, so left for the next run
+    fetch_post_transactions.main()
+    assert len(server.state.posted) == expected_posts(server) - 2
+
+    fetch_post_transactions.main()
+    amounts = [(payload["BankAccount"], payload["TransactionDate"], payload["Amount"], payload["Description"]) for payload in server.state.posted]
+    assert len(amounts) == expected_posts(server)
+    assert len(set(amounts)) == len(amounts)
+
+def test_transform_failure_stops_the_fetch_workers(mock_api, monkeypatch):
+    mock_api(accounts=6)
+    monkeypatch.setattr(fetch_post_transactions, "QUEUE_SIZE", 1)
+    monkeypatch.setattr(fetch_post_transactions, "FETCH_WORKERS", 3)
+
+    def fail(account_info, transactions):
+        raise KeyError("code")
+    monkeypatch.setattr(fetch_post_transactions, "build_payloads", fail)
+
+    outcome = []
+    def run():
+        try:
+            fetch_post_transactions.main()
+        except KeyError as e:
+            outcome.append(e)
+    runner = threading.Thread(target=run, daemon=True)
+    runner.start()
+    runner.join(timeout=30)
+
+    assert not runner.is_alive()
+    assert len(outcome) == 1
+    workers = [thread for thread in threading.enumerate() if "fetch_worker" in thread.name or "post_worker" in thread.name]
+    assert workers == []
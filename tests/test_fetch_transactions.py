@@ -0,0 +1,33 @@
+import csv
+import hashlib
+import json
+import os
+from datetime import date, timedelta
+import fetch_transactions
+import sync_state
+
+def test_parallel_export_writes_the_files_and_manifest(mock_api, monkeypatch):
+    server = mock_api()
+    monkeypatch.setattr(fetch_transactions, "EXPORT_MODE", "parallel")
+    monkeypatch.setattr(fetch_transactions, "EXPORT_PROCESSES", 2)
+    assert fetch_transactions.main() is None
+
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+    output_dir = fetch_transactions.OUTPUT_DIR
+    with open(os.path.join(output_dir, f"manifest_{yesterday}.json"), encoding="utf-8") as manifest_file:
+        entries = json.load(manifest_file)["files"]
+    assert sorted(entry["account"] for entry in entries) == sorted(server.state.account_ids())
+    for entry in entries:
+        path = os.path.join(output_dir, entry["file"])
+        with open(path, newline="", encoding="utf-8") as csv_file:
+            assert len(list(csv.reader(csv_file))) == entry["rows"] + 1  # Plus the header
+        with open(path, "rb") as csv_file:
+            assert hashlib.sha256(csv_file.read()).hexdigest() == entry["sha256"]
+        assert entry["end_date"] == yesterday
+        checkpoint = sync_state.get_checkpoint(fetch_transactions.SYNC_JOB, entry["account"])
+        assert checkpoint["last_valuta"] == yesterday
+
+    # Every account is checkpointed, so a rerun writes nothing new
+    files = sorted(os.listdir(output_dir))
+    assert fetch_transactions.main() is None
+    assert sorted(os.listdir(output_dir)) == files
@@ -0,0 +1,16 @@
+import http_client
+
+def test_only_listed_hosts_are_rate_limited():
+    assert http_client.get_rate_limiter("https://api.iplicit.com/BankTransaction") is None
+    limiter = http_client.get_rate_limiter("https://olb.bankfrick.li/webapi/v2/transactions")
+    assert limiter.rate == http_client.RATE_LIMITS["olb.bankfrick.li"]
+
+def test_default_limit_applies_to_unlisted_hosts(monkeypatch):
+    monkeypatch.setattr(http_client, "DEFAULT_REQUESTS_PER_SECOND", 5)
+    assert http_client.get_rate_limiter("https://api.iplicit.com/BankTransaction").rate == 5
+
+def test_retry_after_and_backoff(monkeypatch):
+    assert http_client.parse_retry_after("3") == 3
+    assert http_client.parse_retry_after("soon") is None
+    monkeypatch.setattr(http_client, "BACKOFF_MAX", 1)
+    assert all(0 <= http_client.backoff_delay(attempt) <= 1 for attempt in range(10))
@@ -0,0 +1,37 @@
+import iplicit_connector
+
+def payload(number):
+    return iplicit_connector.build_transaction_payload("LE1", "LI00088110", "1000000", "2024-05-01", number, f"Payment {number}")
+
+def test_send_transaction_retries_429_and_503(mock_api):
+    server = mock_api()
+    server.state.fail_next("iplicit", 1, status=429)
+    server.state.fail_next("iplicit", 1, status=503)
+
+    result = iplicit_connector.send_transaction("key", payload(1))
+    assert result["success"]
+    assert server.state.request_counts["iplicit"] == 3
+    assert len(server.state.posted) == 1
+
+def test_send_transaction_does_not_retry_500(mock_api):
+    # A 500 on a POST may mean Iplicit stored it anyway, so it's reported rather than sent again
+    server = mock_api()
+    server.state.fail_next("iplicit", 1, status=500)
+
+    result = iplicit_connector.send_transaction("key", payload(1))
+    assert not result["success"]
+    assert result["status"] == 500
+    assert server.state.request_counts["iplicit"] == 1
+
+def test_send_transaction_gives_up_after_max_retries(mock_api, monkeypatch):
+    server = mock_api()
+    monkeypatch.setattr(iplicit_connector.http_client, "MAX_RETRIES", 2)
+    server.state.fail_next("iplicit", 5, status=503)
+
+    result = iplicit_connector.send_transaction("key", payload(1))
+    assert not result["success"]
+    assert server.state.request_counts["iplicit"] == 3
+
+def test_summarize_post_results():
+    results = [{"success": True}, {"success": False}, {"success": True}]
+    assert iplicit_connector.summarize_post_results(results) == {"total": 3, "succeeded": 2, "failed": 1}
@@ -0,0 +1,48 @@
+import posting_ledger
+
+def transaction(valuta, amount, direction="outgoing", name="Supplier"):
+    party = {"name": name, "iban": "CH0000000000000001"}
+    own = {"name": "Own", "accountNumber": "1000000"}
+    return {"valuta": valuta, "amount": amount, "direction": direction,
+            "debitor": own if direction == "outgoing" else party, "creditor": party if direction == "outgoing" else own}
+
+def test_already_posted_transactions_are_skipped(tmp_path):
+    db_path = str(tmp_path / "state.db")
+    transactions = [transaction("2024-05-01", 10.0), transaction("2024-05-02", 20.0)]
+
+    pending, skipped = posting_ledger.filter_unposted("1000000", transactions, db_path)
+    assert (len(pending), skipped) == (2, 0)
+    posting_ledger.mark_posted("1000000", pending[:1], db_path)
+
+    pending, skipped = posting_ledger.filter_unposted("1000000", transactions + [transaction("2024-05-03", 30.0)], db_path)
+    assert skipped == 1
+    assert [record.amount for _, record in pending] == [20.0, 30.0]
+
+def test_identical_transactions_get_their_own_fingerprints(tmp_path):
+    db_path = str(tmp_path / "state.db")
+    twins = [transaction("2024-05-01", 10.0), transaction("2024-05-01", 10.0)]
+
+    fingerprints = posting_ledger.fingerprint_transactions("1000000", twins)
+    assert len(set(fingerprints)) == 2
+    pending, _ = posting_ledger.filter_unposted("1000000", twins, db_path)
+    posting_ledger.mark_posted("1000000", pending[:1], db_path)
+
+    # Only the second of the two is still to post
+    pending, skipped = posting_ledger.filter_unposted("1000000", twins, db_path)
+    assert skipped == 1
+    assert [fingerprint for fingerprint, _ in pending] == fingerprints[1:]
+
+def test_ledger_is_per_account(tmp_path):
+    db_path = str(tmp_path / "state.db")
+    transactions = [transaction("2024-05-01", 10.0)]
+    posting_ledger.mark_posted("1000000", posting_ledger.filter_unposted("1000000", transactions, db_path)[0], db_path)
+
+    assert posting_ledger.filter_unposted("1000001", transactions, db_path)[1] == 0
+
+def test_only_fingerprints_from_the_range_are_loaded(tmp_path):
+    db_path = str(tmp_path / "state.db")
+    old, new = transaction("2024-04-01", 10.0), transaction("2024-05-01T09:30:00", 20.0)
+    posting_ledger.mark_posted("1000000", posting_ledger.filter_unposted("1000000", [old, new], db_path)[0], db_path)
+
+    assert len(posting_ledger.load_posted_fingerprints("1000000", db_path=db_path)) == 2
+    assert posting_ledger.load_posted_fingerprints("1000000", "2024-05-01", db_path) == set(posting_ledger.fingerprint_transactions("1000000", [new]))
@@ -0,0 +1,62 @@
+from datetime import date, timedelta
+import preflight
+from bankfrick_connect import get_jwt_token
+from sync_state import get_checkpoint, save_checkpoint, save_fingerprint
+
+JOB = "post"
+
+def days_ago(days):
+    return (date.today() - timedelta(days=days)).isoformat()
+
+def quiet_account(server):
+    """
+    One account with no transactions, synced up to five days ago at its current balance.
+    """
+    account_id = server.state.account_ids()[0]
+    save_checkpoint(JOB, account_id, days_ago(5))
+    save_fingerprint(JOB, account_id, server.state.account(0)["balance"])
+    return account_id
+
+def test_offsetting_transactions_are_fetched(mock_api):
+    server = mock_api(accounts=1, transactions_per_account=0)
+    account_id = quiet_account(server)
+    # Money in and straight back out again leaves the balance where it was
+    server.state.add_transaction(account_id, days_ago(3), 250.0, "incoming")
+    server.state.add_transaction(account_id, days_ago(3), 250.0, "outgoing")
+
+    check = preflight.run_preflight(JOB, get_jwt_token())
+    assert check.changed_accounts([account_id], days_ago(1)) == [account_id]
+    assert get_checkpoint(JOB, account_id)["last_valuta"] == days_ago(5)  # Left for the fetch to move on
+
+def test_quiet_account_is_skipped_and_checkpointed(mock_api):
+    server = mock_api(accounts=1, transactions_per_account=0)
+    account_id = quiet_account(server)
+
+    check = preflight.run_preflight(JOB, get_jwt_token())
+    assert check.changed_accounts([account_id], days_ago(1)) == []
+    assert get_checkpoint(JOB, account_id)["last_valuta"] == days_ago(1)
+    assert server.state.request_counts.get("/transactions") == 1  # Just the one-transaction probe
+
+def test_numeric_account_ids_find_their_balance(mock_api):
+    server = mock_api(accounts=1, transactions_per_account=0)
+    account_id = quiet_account(server)
+
+    check = preflight.run_preflight(JOB, get_jwt_token())
+    assert check.is_unchanged(int(account_id), days_ago(1))
+
+def test_changed_balance_is_fetched_without_probing(mock_api):
+    server = mock_api(accounts=1, transactions_per_account=0)
+    account_id = server.state.account_ids()[0]
+    save_checkpoint(JOB, account_id, days_ago(5))
+    save_fingerprint(JOB, account_id, server.state.account(0)["balance"] + 1)
+
+    check = preflight.run_preflight(JOB, get_jwt_token())
+    assert check.changed_accounts([account_id], days_ago(1)) == [account_id]
+    assert "/transactions" not in server.state.request_counts
+
+def test_switched_off_fetches_everything(mock_api, monkeypatch):
+    server = mock_api(accounts=1, transactions_per_account=0)
+    account_id = quiet_account(server)
+    monkeypatch.setattr(preflight, "SKIP_UNCHANGED_ACCOUNTS", False)
+
+    assert preflight.run_preflight(JOB, get_jwt_token()).changed_accounts([account_id], days_ago(1)) == [account_id]
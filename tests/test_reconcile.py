@@ -0,0 +1,27 @@
+import reconcile
+
+def payload(day, amount, reference, description="Payment"):
+    return {"TransactionDate": day, "Amount": amount, "Reference": reference, "LegalEntity": "LE1", "Code": "100", "Description": description}
+
+def statuses(results):
+    return sorted(status for status, _, _, _ in results)
+
+def test_exact_matches():
+    expected = [payload("2024-05-01", 10.0, "a"), payload("2024-05-02", 20.0, "b")]
+    actual = [{"id": 1, **payload("2024-05-01T00:00:00", 10.00, "a")}, {"id": 2, **payload("2024-05-02", 20.0, "b")}]
+    assert statuses(reconcile.reconcile_account(expected, actual)) == ["matched", "matched"]
+
+def test_changed_fields_are_mismatched():
+    results = reconcile.reconcile_account([payload("2024-05-01", 10.0, "a")], [payload("2024-05-01", 10.0, "a", "Edited")])
+    assert [(status, details) for status, _, _, details in results] == [("mismatched", {"Description": ("Payment", "Edited")})]
+
+def test_looser_joins_find_a_changed_reference_or_date():
+    expected = [payload("2024-05-01", 10.0, "a"), payload("2024-05-02", 20.0, "b")]
+    actual = [payload("2024-05-01", 10.0, "edited"), payload("2024-05-09", 20.0, "b")]
+    details = {status_details for status_details in ((status, tuple(details)) for status, _, _, details in reconcile.reconcile_account(expected, actual))}
+    assert details == {("mismatched", ("Reference",)), ("mismatched", ("TransactionDate",))}
+
+def test_missing_duplicate_and_unexpected():
+    expected = [payload("2024-05-01", 10.0, "a"), payload("2024-05-02", 20.0, "b")]
+    actual = [payload("2024-05-01", 10.0, "a"), payload("2024-05-01", 10.0, "a"), payload("2024-06-01", 99.0, "z")]
+    assert statuses(reconcile.reconcile_account(expected, actual)) == ["duplicate", "matched", "missing", "unexpected"]
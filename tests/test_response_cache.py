@@ -0,0 +1,46 @@
+import pytest
+import response_cache
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(response_cache, "RESPONSE_CACHE_DIR", str(tmp_path / "response_cache"))
+    yield response_cache
+    response_cache.clear()
+
+def transactions(*days):
+    return [{"orderId": day, "valuta": day} for day in days]
+
+def row(start_date, end_date):
+    return (f"{start_date}:{end_date}", start_date, end_date, "digest", None)
+
+def test_cover_takes_the_range_reaching_furthest():
+    rows = [row("2024-05-01", "2024-05-10"), row("2024-05-03", "2024-05-05"), row("2024-05-05", "2024-05-20")]
+    assert [piece[0] for piece in response_cache._cover(rows, "2024-05-02", "2024-05-15")] == ["2024-05-01:2024-05-10", "2024-05-05:2024-05-20"]
+
+def test_cover_steps_over_month_ends():
+    rows = [row("2024-04-20", "2024-04-30"), row("2024-05-01", "2024-05-10")]
+    assert len(response_cache._cover(rows, "2024-04-25", "2024-05-02")) == 2
+
+def test_cover_gives_up_on_a_gap():
+    rows = [row("2024-05-01", "2024-05-04"), row("2024-05-06", "2024-05-10")]
+    assert response_cache._cover(rows, "2024-05-01", "2024-05-10") == []
+
+def test_range_is_pieced_together_from_cached_ranges(cache):
+    cache.put_transactions("1", "2024-05-01", "2024-05-10", transactions("2024-05-02", "2024-05-09"))
+    cache.put_transactions("1", "2024-05-08", "2024-05-20", transactions("2024-05-09", "2024-05-15", "2024-05-20"))
+
+    assert cache.get_transactions("1", "2024-05-01", "2024-05-10") == transactions("2024-05-02", "2024-05-09")
+    # The overlapping day comes from the first range only, so it isn't returned twice
+    assert cache.get_transactions("1", "2024-05-05", "2024-05-16") == transactions("2024-05-09", "2024-05-15")
+    assert cache.get_transactions("1", "2024-04-30", "2024-05-05") is None
+    assert cache.get_transactions("2", "2024-05-01", "2024-05-10") is None
+
+def test_eviction_keeps_the_cache_under_its_limit(cache, monkeypatch):
+    monkeypatch.setattr(response_cache, "MAX_CACHE_BYTES", 2000)
+    for month in range(1, 13):
+        cache.put_transactions("1", f"2023-{month:02d}-01", f"2023-{month:02d}-28", transactions(*(f"2023-{month:02d}-{day:02d}" for day in range(1, 15))))
+        assert response_cache._stored_bytes(response_cache._connect()) <= 2000
+
+    # The most recently stored range survives, the oldest was evicted
+    assert cache.get_transactions("1", "2023-12-01", "2023-12-28") is not None
+    assert cache.get_transactions("1", "2023-01-01", "2023-01-28") is None
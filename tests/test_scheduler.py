@@ -0,0 +1,44 @@
+import json
+import urllib.error
+import urllib.request
+import fetch_transactions
+import scheduler
+
+def health(server):
+    url = f"http://127.0.0.1:{server.server_address[1]}/health"
+    try:
+        with urllib.request.urlopen(url) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+def test_returned_failure_counts_as_a_failed_run():
+    jobs = scheduler.Scheduler({"quiet": lambda: None, "partial": lambda: "1 of 2 accounts failed"}, intervals={"quiet": 60, "partial": 60})
+    jobs.run_due()
+
+    status = jobs.status()
+    assert status["status"] == "degraded"
+    assert status["jobs"]["quiet"]["last_error"] is None
+    assert status["jobs"]["partial"]["last_error"] == "1 of 2 accounts failed"
+    assert status["jobs"]["partial"]["failures"] == 1
+
+def test_health_reports_accounts_that_failed(mock_api):
+    server = mock_api()
+    jobs = scheduler.Scheduler({"fetch_transactions": fetch_transactions.main})
+    health_server = scheduler.start_health_server(jobs, port=0)
+    try:
+        server.state.fail_next("/transactions", 100, status=500)  # More than every account's retries
+        jobs.run_due()
+        status, body = health(health_server)
+        assert status == 503
+        assert body["jobs"]["fetch_transactions"]["last_error"] == "2 of 2 accounts failed"
+
+        # The failed accounts kept their checkpoints, so the next run picks them up and the job is healthy again
+        server.state.queued_failures.clear()
+        jobs.run_job(jobs.jobs[0])
+        status, body = health(health_server)
+        assert status == 200
+        assert body["jobs"]["fetch_transactions"]["last_error"] is None
+    finally:
+        health_server.shutdown()
+        health_server.server_close()
@@ -0,0 +1,43 @@
+import sync_state
+
+JOB = "export"
+
+def transaction(valuta, order_id):
+    return {"valuta": valuta, "orderId": order_id, "amount": 1.0, "direction": "incoming"}
+
+def test_record_synced_moves_the_checkpoint_to_closed_through(tmp_path):
+    db_path = str(tmp_path / "state.db")
+    sync_state.record_synced(JOB, "1", [transaction("2024-05-02", "a"), transaction("2024-05-03", "b"), transaction("2024-05-04", "today")],
+                             "2024-05-03", db_path)
+
+    checkpoint = sync_state.get_checkpoint(JOB, "1", db_path)
+    assert checkpoint["last_valuta"] == "2024-05-03"
+    assert checkpoint["last_transaction_id"] == "b"  # The open day's transaction isn't taken as synced
+    assert sync_state.incremental_start_date(JOB, "1", "2024-01-01", db_path) == "2024-05-04"
+
+def test_checkpoint_never_moves_backwards(tmp_path):
+    db_path = str(tmp_path / "state.db")
+    sync_state.record_synced(JOB, "1", [], "2024-05-10", db_path)
+    sync_state.record_synced(JOB, "1", [], "2024-05-03", db_path)
+
+    assert sync_state.get_checkpoint(JOB, "1", db_path)["last_valuta"] == "2024-05-10"
+
+def test_first_run_starts_from_the_default(tmp_path):
+    assert sync_state.incremental_start_date(JOB, "1", "2024-01-01", str(tmp_path / "state.db")) == "2024-01-01"
+
+def test_checkpoint_clears_the_windows_it_covers(tmp_path):
+    db_path = str(tmp_path / "state.db")
+    sync_state.save_fetched_window(JOB, "1", "2024-05-01", "2024-05-07", [transaction("2024-05-02", "a")], db_path)
+    sync_state.save_fetched_window(JOB, "1", "2024-05-08", "2024-05-14", [transaction("2024-05-09", "b")], db_path)
+
+    windows = sync_state.load_fetched_windows(JOB, "1", db_path)
+    assert windows[("2024-05-01", "2024-05-07")][0].transaction_id == "a"
+
+    sync_state.record_synced(JOB, "1", [], "2024-05-07", db_path)
+    assert list(sync_state.load_fetched_windows(JOB, "1", db_path)) == [("2024-05-08", "2024-05-14")]
+
+def test_latest_is_kept_across_batches():
+    first = sync_state.latest_transaction([transaction("2024-05-02", "a")])
+    second = sync_state.latest_transaction([transaction("2024-05-05", "b"), transaction("2024-05-09", "c")], "2024-05-06")
+    assert sync_state.later_of(first, second) == ("2024-05-05", "b")
+    assert sync_state.later_of(second, (None, None)) == second
@@ -0,0 +1,55 @@
+import os
+import pytest
+
+pytest.importorskip("pandas")
+pytest.importorskip("pyarrow")
+
+import transaction_archive
+
+def transaction(order_id, valuta, amount, direction, currency="EUR"):
+    return {"orderId": order_id, "valuta": valuta, "amount": amount, "direction": direction, "currency": currency,
+            "creditor": {"name": "Shop"}, "debitor": {"name": "Customer"}}
+
+TRANSACTIONS = [
+    transaction("a", "2024-04-30", 100.0, "incoming"),
+    transaction("b", "2024-05-01", 40.0, "outgoing"),
+    transaction("c", "2024-05-02T10:00:00", 10.0, "incoming", "USD"),
+]
+
+def test_partitioned_by_month_account_and_currency(tmp_path):
+    archive_dir = str(tmp_path)
+    assert transaction_archive.append_to_archive("1000000", TRANSACTIONS, archive_dir) == 3
+
+    files = sorted(os.path.relpath(os.path.join(root, name), archive_dir) for root, _, names in os.walk(archive_dir) for name in names)
+    assert files == [
+        os.path.join("month=2024-04", "account_id=1000000", "currency=EUR", "part.parquet"),
+        os.path.join("month=2024-05", "account_id=1000000", "currency=EUR", "part.parquet"),
+        os.path.join("month=2024-05", "account_id=1000000", "currency=USD", "part.parquet"),
+    ]
+
+def test_archiving_again_replaces_rows_by_transaction_key(tmp_path):
+    archive_dir = str(tmp_path)
+    transaction_archive.append_to_archive("1000000", TRANSACTIONS, archive_dir)
+    transaction_archive.append_to_archive("1000000", [transaction("b", "2024-05-01", 45.0, "outgoing"), transaction("d", "2024-05-03", 5.0, "incoming")], archive_dir)
+
+    frame = transaction_archive.load_archive("2024-05-01", "2024-05-31", archive_dir=archive_dir)
+    assert sorted(frame["transaction_key"]) == ["b", "c", "d"]
+    assert frame.set_index("transaction_key").loc["b", "signed_amount"] == -45.0
+
+def test_load_filters_by_date_account_and_currency(tmp_path):
+    archive_dir = str(tmp_path)
+    transaction_archive.append_to_archive("1000000", TRANSACTIONS, archive_dir)
+    transaction_archive.append_to_archive("1000001", [transaction("e", "2024-05-01", 1.0, "incoming")], archive_dir)
+
+    assert sorted(transaction_archive.load_archive("2024-05-01", "2024-05-01", archive_dir=archive_dir)["transaction_key"]) == ["b", "e"]
+    assert list(transaction_archive.load_archive("2024-04-01", "2024-05-31", ["1000000"], ["USD"], archive_dir)["transaction_key"]) == ["c"]
+    assert transaction_archive.load_archive("2024-01-01", "2024-12-31", archive_dir=str(tmp_path / "missing")).empty
+
+def test_summarize_frame(tmp_path):
+    archive_dir = str(tmp_path)
+    transaction_archive.append_to_archive("1000000", TRANSACTIONS, archive_dir)
+
+    summary = transaction_archive.summarize_archive("2024-04-01", "2024-05-31", archive_dir=archive_dir)
+    rows = {row["currency"]: (row["transactions"], row["inflow"], row["outflow"], row["net"]) for row in summary.to_dict("records")}
+    assert rows == {"EUR": (2, 100.0, 40.0, 60.0), "USD": (1, 10.0, 0.0, 10.0)}
+    assert transaction_archive.summarize_frame(transaction_archive.load_archive("2025-01-01", "2025-01-31", archive_dir=archive_dir)).empty
@@ -0,0 +1,150 @@
+import argparse
+import os
+import threading
+from posting_ledger import fingerprint_transactions
+from transaction_record import normalize_all
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:  # Optional, only needed if the archive is switched on
+    np = None
+    pd = None
+
+# Local columnar archive of every fetched transaction, so history can be summarized without calling the API again.
+# Stored as Parquet files partitioned by valuta month, account and currency (needs pandas + pyarrow).
+ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive")
+PARTITION_FILE = "part.parquet"
+
+_archive_lock = threading.Lock()  # Fetch workers archive in parallel and can touch the same partition
+
+def require_pandas():
+    """
+    Fail with a clear message if the optional archive dependencies aren't installed.
+    """
+    if pd is None:
+        raise RuntimeError("The transaction archive needs pandas and pyarrow: pip install pandas pyarrow")
+
+def transactions_to_frame(account_id, transactions):
+    """
+    Flatten Bank Frick transactions into a DataFrame with one row per transaction.
+    """
+    require_pandas()
+    records = normalize_all(transactions)
+    keys = fingerprint_transactions(account_id, records)
+    rows = []
+    for key, record in zip(keys, records):
+        rows.append({
+            "transaction_key": record.raw.get("orderId") or key,  # Stable ID used to drop repeats when re-archiving
+            "account_id": str(account_id),
+            "valuta": record.day,
+            "currency": record.currency or "UNKNOWN",
+            "direction": record.direction,
+            "amount": abs(float(record.amount or 0)),
+            "counterparty": record.counterparty_name,
+            "type": record.type,
+        })
+    frame = pd.DataFrame(rows, columns=["transaction_key", "account_id", "valuta", "currency", "direction", "amount", "counterparty", "type"])
+    frame["signed_amount"] = np.where(frame["direction"] == "outgoing", -frame["amount"], frame["amount"])
+    frame["month"] = frame["valuta"].str[:7]
+    return frame
+
+def partition_path(archive_dir, month, account_id, currency):
+    return os.path.join(archive_dir, f"month={month}", f"account_id={account_id}", f"currency={currency}", PARTITION_FILE)
+
+def append_to_archive(account_id, transactions, archive_dir=None):
+    """
+    Add transactions to the archive, replacing any copies already stored so re-runs don't double count.
+    Returns the number of rows written.
+    """
+    if not transactions:
+        return 0
+    archive_dir = archive_dir or ARCHIVE_DIR
+    frame = transactions_to_frame(account_id, transactions)
+
+    with _archive_lock:
+        for (month, currency), group in frame.groupby(["month", "currency"], sort=False):
+            path = partition_path(archive_dir, month, account_id, currency)
+            group = group.drop(columns=["month", "account_id", "currency"])  # These live in the directory names
+            if os.path.exists(path):
+                group = pd.concat([pd.read_parquet(path), group], ignore_index=True)
+                group = group.drop_duplicates(subset="transaction_key", keep="last")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.tmp"
+            group.sort_values("valuta").to_parquet(temp_path, index=False)
+            os.replace(temp_path, path)  # Swap in atomically so a crash never leaves half a file
+    return len(frame)
+
+def load_archive(start_date, end_date, account_ids=None, currencies=None, archive_dir=None):
+    """
+    Load archived transactions with a valuta date in the inclusive range, only reading the partitions needed.
+    """
+    require_pandas()
+    archive_dir = archive_dir or ARCHIVE_DIR
+    columns = ["transaction_key", "valuta", "direction", "amount", "signed_amount", "counterparty", "type", "month", "account_id", "currency"]
+    if not os.path.isdir(archive_dir):
+        return pd.DataFrame(columns=columns)
+
+    filters = [("month", ">=", start_date[:7]), ("month", "<=", end_date[:7])]
+    if account_ids:
+        filters.append(("account_id", "in", [str(account_id) for account_id in account_ids]))
+    if currencies:
+        filters.append(("currency", "in", list(currencies)))
+
+    frame = pd.read_parquet(archive_dir, filters=filters)
+    if frame.empty:
+        return pd.DataFrame(columns=columns)
+    for column in ("month", "account_id", "currency"):
+        frame[column] = frame[column].astype(str)  # Partition columns come back as categoricals
+    return frame[(frame["valuta"] >= start_date) & (frame["valuta"] <= end_date)].reset_index(drop=True)
+
+def summarize_frame(frame, by=("account_id", "currency")):
+    """
+    Count transactions and total inflow, outflow and net per group using vectorized operations.
+    """
+    require_pandas()
+    by = list(by)
+    columns = by + ["transactions", "inflow", "outflow", "net"]
+    if frame.empty:
+        return pd.DataFrame(columns=columns)
+
+    signed = frame["signed_amount"].to_numpy()
+    work = frame[by].copy()
+    work["inflow"] = np.where(signed > 0, signed, 0.0)
+    work["outflow"] = np.where(signed < 0, -signed, 0.0)
+    work["net"] = signed
+    summary = work.groupby(by, sort=True).agg(
+        transactions=("net", "size"),
+        inflow=("inflow", "sum"),
+        outflow=("outflow", "sum"),
+        net=("net", "sum"),
+    ).reset_index()
+    return summary[columns]
+
+def summarize_archive(start_date, end_date, by=("account_id", "currency"), account_ids=None, currencies=None, archive_dir=None):
+    """
+    Summarize any date range straight from the archive without calling the API.
+    """
+    return summarize_frame(load_archive(start_date, end_date, account_ids, currencies, archive_dir), by)
+
+def main(argv=None):
+    """
+    Print a summary of archived transactions for a date range.
+    """
+    parser = argparse.ArgumentParser(description="Summarize archived Bank Frick transactions.")
+    parser.add_argument("--from", dest="start_date", required=True, help="First valuta date, YYYY-MM-DD")
+    parser.add_argument("--to", dest="end_date", required=True, help="Last valuta date, YYYY-MM-DD")
+    parser.add_argument("--by", nargs="+", default=["account_id", "currency"], choices=["account_id", "currency", "valuta", "month", "direction"],
+                        help="Columns to group the summary by")
+    parser.add_argument("--account", nargs="*", help="Only include these account IDs")
+    parser.add_argument("--currency", nargs="*", help="Only include these currencies")
+    args = parser.parse_args(argv)
+
+    summary = summarize_archive(args.start_date, args.end_date, args.by, args.account, args.currency)
+    if summary.empty:
+        print(f"No archived transactions between {args.start_date} and {args.end_date}.")
+        return
+    print(summary.to_string(index=False, float_format=lambda value: f"{value:,.2f}"))
+
+if __name__ == "__main__":
+    main()
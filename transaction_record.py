@@ -0,0 +1,74 @@
+from datetime import date
+
+# Compact, normalized view of a Bank Frick transaction, parsed once from the API JSON so the CSV export,
+# filters, summaries and Iplicit payloads don't each re-dig through the nested dicts and re-sign the amount
+
+class TransactionRecord:
+    """
+    One transaction with its commonly used fields pulled out of the API JSON.
+    amount is as Bank Frick sent it; signed_amount is negative for outgoing payments, positive for incoming ones
+    and the amount as sent when the direction is anything else.
+    The original dict is kept as raw for anything that needs the full response (the response cache, staged windows).
+    """
+    __slots__ = (
+        "raw", "transaction_id", "valuta", "day", "date", "amount", "signed_amount", "currency", "direction", "outgoing",
+        "type", "debitor_name", "debitor_account", "creditor_name", "creditor_account", "counterparty_number",
+    )
+
+    def __init__(self, transaction):
+        debitor = transaction.get("debitor") or {}
+        creditor = transaction.get("creditor") or {}
+        direction = transaction.get("direction")
+        amount = transaction.get("amount")
+
+        self.raw = transaction
+        self.transaction_id = transaction.get("orderId") or transaction.get("id")
+        self.valuta = transaction.get("valuta")
+        self.day = (self.valuta or "")[:10]  # YYYY-MM-DD, valuta can carry a time as well
+        try:
+            self.date = date.fromisoformat(self.day)
+        except ValueError:
+            self.date = None
+        self.amount = amount
+        self.outgoing = direction == "outgoing"
+        if amount is None or direction not in ("incoming", "outgoing"):
+            self.signed_amount = amount
+        else:
+            self.signed_amount = -abs(amount) if self.outgoing else abs(amount)
+        self.currency = transaction.get("currency")
+        self.direction = direction
+        self.type = transaction.get("type")
+        self.debitor_name = debitor.get("name")
+        self.debitor_account = debitor.get("accountNumber")
+        self.creditor_name = creditor.get("name")
+        self.creditor_account = creditor.get("accountNumber")
+        counterparty = creditor if self.outgoing else debitor
+        self.counterparty_number = counterparty.get("iban") or counterparty.get("accountNumber")
+
+    @property
+    def counterparty_name(self):
+        """
+        The other side of the transaction: the creditor for payments out, the debitor for money in.
+        """
+        return self.creditor_name if self.outgoing else self.debitor_name
+
+    def __repr__(self):
+        return f"TransactionRecord({self.transaction_id!r}, {self.day!r}, {self.signed_amount!r} {self.currency})"
+
+def normalize(transaction):
+    """
+    Return a TransactionRecord for an API transaction, passing records through unchanged.
+    """
+    return transaction if isinstance(transaction, TransactionRecord) else TransactionRecord(transaction)
+
+def normalize_all(transactions):
+    """
+    Parse a list of API transactions into TransactionRecords in one pass.
+    """
+    return [normalize(transaction) for transaction in transactions]
+
+def to_raw(transactions):
+    """
+    Turn TransactionRecords back into the API dicts they were parsed from, e.g. to store them as JSON.
+    """
+    return [transaction.raw if isinstance(transaction, TransactionRecord) else transaction for transaction in transactions]